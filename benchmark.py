@@ -0,0 +1,554 @@
+"""NyanRSS 오프라인 벤치마크.
+
+로컬 aiohttp 서버가 가짜 RSS/Atom 피드와 OpenRouter 응답을 흉내 내고, 가짜 Discord 채널이 전송을 받습니다.
+Discord/OpenRouter 키 없이 시나리오별 처리량(기사/초), 단계별 지연 백분위수, 최대 메모리, 이벤트 루프 지연을 잽니다.
+
+    python benchmark.py                        # 모든 시나리오
+    python benchmark.py many_feeds slow_hosts  # 일부만
+    python benchmark.py --json result.json     # 결과를 JSON으로도 저장
+    python benchmark.py --extraction           # 본문 추출만: 항목당 CPU 시간과 요약 프롬프트 토큰을 예전 방식과 비교
+"""
+import argparse
+import asyncio
+import base64
+import collections
+import hashlib
+import hmac
+import html
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import aiohttp
+from aiohttp import web
+
+import main
+
+BENCH_HOST = '127.0.0.1'
+BENCH_PORT = 8790
+BENCH_WEBSUB_PORT = 8791
+VOCABULARY = [f"w{index}" for index in range(5000)]
+PNG_1X1 = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=='
+)
+
+# feeds: 피드 수, items: 피드당 항목 수, change: 주기마다 새로 올라오는 항목 수, channels: 채널 수,
+# cycles: 전체 피드를 도는 횟수, slow_every/host_delay: N번째 피드마다 응답을 늦추는 초,
+# openrouter_latency/discord_latency: 가짜 API 응답 지연 초, images: 이미지 첨부 여부,
+# websub: 피드가 가짜 허브를 알리고, 첫 주기 뒤로는 폴링 대신 허브가 push (구독 확인 포함),
+# stream_edit_interval: SUMMARY_STREAM_EDIT_INTERVAL (0이면 요약이 끝난 뒤 전송, 양수면 Embed를 먼저 보내고 스트리밍으로 수정)
+# stall_every/stall_seconds: 기본 모델 요청 N번마다 한 번 응답을 늦추는 초,
+# fallback_models/hedge_delay: OPENROUTER_FALLBACK_MODELS / SUMMARY_HEDGE_DELAY
+SCENARIOS = collections.OrderedDict([
+    ('many_feeds', dict(feeds=100, items=5, change=1, channels=1, cycles=2)),
+    ('many_channels', dict(feeds=10, items=5, change=1, channels=50, cycles=2)),
+    ('big_backlog', dict(feeds=2, items=300, change=0, channels=2, cycles=1)),
+    ('slow_hosts', dict(feeds=40, items=5, change=1, channels=2, cycles=2, slow_every=4, host_delay=2.0)),
+    ('images', dict(feeds=20, items=5, change=1, channels=2, cycles=2, images=True)),
+    ('websub', dict(feeds=50, items=5, change=1, channels=2, cycles=3, websub=True)),
+    ('slow_summary', dict(feeds=10, items=3, change=0, channels=2, cycles=1, openrouter_latency=1.5)),
+    ('streaming', dict(feeds=10, items=3, change=0, channels=2, cycles=1, openrouter_latency=1.5, stream_edit_interval=0.5)),
+    ('model_stalls', dict(feeds=20, items=5, change=0, channels=1, cycles=1, openrouter_latency=0.3,
+                          stall_every=10, stall_seconds=5.0)),
+    ('hedged', dict(feeds=20, items=5, change=0, channels=1, cycles=1, openrouter_latency=0.3,
+                    stall_every=10, stall_seconds=5.0, fallback_models=['benchmark/fast'], hedge_delay=1.0)),
+])
+SCENARIO_DEFAULTS = dict(slow_every=0, host_delay=0.0, openrouter_latency=0.05, discord_latency=0.02, images=False,
+                         websub=False, stream_edit_interval=0.0, stall_every=0, stall_seconds=0.0,
+                         fallback_models=[], hedge_delay=0.0)
+
+
+def words(seed, count):
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(count))
+
+
+class FakeUpstream:
+    """가짜 피드 / OpenRouter / 이미지 / WebSub 허브 서버."""
+
+    def __init__(self):
+        self.spec = dict(SCENARIO_DEFAULTS)
+        self.cycle = 0
+        self.openrouter_requests = 0
+        self.model_requests = collections.Counter()
+        self.subscribers = {}  # 토픽 URL -> (콜백 URL, secret)
+        self.app = web.Application()
+        self.app.router.add_get('/feed/{index}', self.feed)
+        self.app.router.add_get('/img/{index}', self.image)
+        self.app.router.add_post('/openrouter', self.openrouter)
+        self.app.router.add_post('/hub', self.hub)
+        self._runner = None
+        self._session = None
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, BENCH_HOST, BENCH_PORT).start()
+
+    async def stop(self):
+        if self._session is not None:
+            await self._session.close()
+        await self._runner.cleanup()
+
+    def hub_links(self, feed_index, element):
+        if not self.spec['websub']:
+            return ''
+        return (f'<{element} rel="hub" href="http://{BENCH_HOST}:{BENCH_PORT}/hub"/>'
+                f'<{element} rel="self" href="http://{BENCH_HOST}:{BENCH_PORT}/feed/{feed_index}"/>')
+
+    def feed_items(self, feed_index):
+        """최신 항목부터. 주기마다 change개씩 새 항목이 위에 올라옵니다."""
+        newest = self.spec['items'] + self.cycle * self.spec['change']
+        for item_index in range(newest - 1, newest - 1 - self.spec['items'], -1):
+            seed = feed_index * 1000003 + item_index
+            yield {
+                'title': words(seed, 7),
+                'link': f"http://{BENCH_HOST}:{BENCH_PORT}/article/{feed_index}/{item_index}",
+                'body': words(seed + 7, 80),
+                'published': time.strftime('%a, %d %b %Y %H:%M:%S +0000', time.gmtime(1700000000 + item_index * 600)),
+                'image': f"http://{BENCH_HOST}:{BENCH_PORT}/img/{seed % 20}" if self.spec['images'] else None,
+            }
+
+    def render_rss(self, feed_index):
+        items = []
+        for item in self.feed_items(feed_index):
+            enclosure = f'<enclosure url="{item["image"]}" type="image/png"/>' if item['image'] else ''
+            items.append(
+                f"<item><title>{item['title']}</title><link>{item['link']}</link>"
+                f"<description>{item['body']}</description><pubDate>{item['published']}</pubDate>{enclosure}</item>"
+            )
+        return (f'<?xml version="1.0"?><rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom"><channel>'
+                f'<title>Bench {feed_index}</title>{self.hub_links(feed_index, "atom:link")}{"".join(items)}</channel></rss>')
+
+    def render_atom(self, feed_index):
+        entries = []
+        for item in self.feed_items(feed_index):
+            published = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.strptime(item['published'], '%a, %d %b %Y %H:%M:%S +0000'))
+            enclosure = f'<link rel="enclosure" href="{item["image"]}" type="image/png"/>' if item['image'] else ''
+            entries.append(
+                f"<entry><title>{item['title']}</title><id>{item['link']}</id><link href=\"{item['link']}\"/>"
+                f"<summary>{item['body']}</summary><updated>{published}</updated>{enclosure}</entry>"
+            )
+        return (f'<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom"><title>Bench {feed_index}</title>'
+                f'{self.hub_links(feed_index, "link")}{"".join(entries)}</feed>')
+
+    def render(self, feed_index):
+        if feed_index % 2:
+            return self.render_atom(feed_index), 'application/atom+xml'
+        return self.render_rss(feed_index), 'application/rss+xml'
+
+    async def feed(self, request):
+        feed_index = int(request.match_info['index'])
+        if self.spec['slow_every'] and feed_index % self.spec['slow_every'] == 0:
+            await asyncio.sleep(self.spec['host_delay'])
+        text, content_type = self.render(feed_index)
+        return web.Response(text=text, content_type=content_type)
+
+    async def hub(self, request):
+        """구독 요청을 받으면 202로 답한 뒤, 콜백에 확인 요청(challenge)을 보내 통과하면 구독자로 등록합니다."""
+        form = await request.post()
+        asyncio.ensure_future(self.verify_intent(form['hub.mode'], form['hub.topic'], form['hub.callback'],
+                                                 form.get('hub.secret', ''), form.get('hub.lease_seconds', '3600')))
+        return web.Response(status=202)
+
+    async def verify_intent(self, mode, topic, callback, secret, lease_seconds):
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        challenge = base64.urlsafe_b64encode(os.urandom(12)).decode()
+        params = {'hub.mode': mode, 'hub.topic': topic, 'hub.challenge': challenge, 'hub.lease_seconds': lease_seconds}
+        async with self._session.get(callback, params=params) as response:
+            if response.status != 200 or await response.text() != challenge:
+                return
+        if mode == 'subscribe':
+            self.subscribers[topic] = (callback, secret)
+        else:
+            self.subscribers.pop(topic, None)
+
+    async def push_all(self):
+        """구독된 모든 피드의 현재 내용을 서명해 콜백으로 보냅니다."""
+        async def push(topic, callback, secret):
+            body, content_type = self.render(int(topic.rsplit('/', 1)[1]))
+            body = body.encode('utf-8')
+            signature = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+            headers = {'Content-Type': content_type, 'X-Hub-Signature': f"sha256={signature}"}
+            async with self._session.post(callback, data=body, headers=headers) as response:
+                await response.read()
+        await asyncio.gather(*(push(topic, callback, secret) for topic, (callback, secret) in list(self.subscribers.items())))
+
+    async def image(self, request):
+        return web.Response(body=PNG_1X1, content_type='image/png')
+
+    async def openrouter(self, request):
+        self.openrouter_requests += 1
+        payload = await request.json()
+        self.model_requests[payload.get('model')] += 1
+        latency = self.spec['openrouter_latency']
+        stall_every = self.spec['stall_every']
+        if (stall_every and payload.get('model') == main.OPENROUTER_MODEL
+                and self.model_requests[payload.get('model')] % stall_every == 0):
+            latency += self.spec['stall_seconds']
+        summary = "냐옹! 벤치마크용 요약이다냥 😺 냥냥!"
+        if 'response_format' in payload:
+            prompt = payload['messages'][0]['content'][0]['text']
+            numbers = [int(number) for number in re.findall(r'\[기사 (\d+)\]', prompt)]
+            content = json.dumps({'summaries': [{'id': number, 'summary': summary} for number in numbers]}, ensure_ascii=False)
+        else:
+            content = summary
+        if payload.get('stream'):
+            return await self.openrouter_stream(request, content, latency)
+        await asyncio.sleep(latency)
+        return web.json_response({
+            'choices': [{'message': {'content': content}}],
+            'usage': {'prompt_tokens': 500, 'completion_tokens': 100, 'total_tokens': 600},
+        })
+
+    async def openrouter_stream(self, request, content, latency):
+        """SSE로 응답합니다. 지연 시간 동안 요약을 단어 단위로 나눠 보냅니다."""
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        await response.write(b': OPENROUTER PROCESSING\n\n')
+        pieces = [word + ' ' for word in content.split(' ')]
+        for piece in pieces:
+            await asyncio.sleep(latency / len(pieces))
+            chunk = {'choices': [{'delta': {'content': piece}}]}
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+        usage = {'choices': [], 'usage': {'prompt_tokens': 500, 'completion_tokens': 100, 'total_tokens': 600}}
+        await response.write(f"data: {json.dumps(usage)}\n\ndata: [DONE]\n\n".encode())
+        await response.write_eof()
+        return response
+
+
+ORIGINAL_RESOLVE_CHANNELS = main.resolve_channels
+
+
+class FakeMessage:
+    def __init__(self, channel, message_id):
+        self.channel = channel
+        self.id = message_id
+
+    async def edit(self, **kwargs):
+        await asyncio.sleep(self.channel.latency)
+        self.channel.edits += 1
+
+
+class FakeChannel:
+    """Discord 텍스트 채널 대신 전송된 Embed 수만 셉니다."""
+
+    def __init__(self, channel_id, latency):
+        self.id = channel_id
+        self.name = f"bench-{channel_id}"
+        self.latency = latency
+        self.messages = 0
+        self.embeds = 0
+        self.edits = 0
+
+    async def send(self, content=None, embed=None, embeds=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.messages += 1
+        self.embeds += len(embeds) if embeds else 1
+        return FakeMessage(self, self.messages)
+
+
+class UnlimitedBucket(main.RateLimitBucket):
+    """가짜 채널에는 Discord 레이트 리밋이 없으므로 처리량 측정을 위해 한도를 풀어 둡니다 (--discord-limits로 끌 수 있음)."""
+
+    def __init__(self, limit=1000000, per=1.0):
+        super().__init__(limit, per)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+async def monitor_loop_lag(samples, interval=0.01):
+    """interval초마다 깨어나 예정보다 늦어진 시간을 이벤트 루프 지연으로 기록합니다."""
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(time.perf_counter() - expected, 0.0))
+
+
+def reset_main_state():
+    """시나리오마다 빈 작업 폴더와 새 저장소/파이프라인으로 시작합니다."""
+    for store in (main.sent_store, main.feed_state_store, main.summary_cache, main.image_cache,
+                  main.pipeline_journal, main.title_index, main.body_index, main.delivery_outbox,
+                  main.websub_subscriptions):
+        if store is not None:
+            store.close()
+    main.sent_store = main.feed_state_store = main.summary_cache = main.image_cache = None
+    main.pipeline_journal = main.title_index = main.body_index = main.delivery_outbox = None
+    main.websub_subscriptions = None
+    os.chdir(tempfile.mkdtemp(prefix='nyanrss-bench-'))
+    main.recent_processed.clear()
+    main.image_downloads.clear()
+    for delivery in main.channel_deliveries.values():
+        delivery._task.cancel()
+    main.channel_deliveries.clear()
+    for worker in main.article_pipeline._workers:
+        worker.cancel()
+    main.article_pipeline = main.ArticlePipeline(
+        main.PIPELINE_QUEUE_SIZE, main.ENRICH_WORKERS, main.SUMMARIZE_WORKERS, main.DELIVER_WORKERS
+    )
+
+
+async def wait_until(condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("벤치마크 대기 시간 초과")
+        await asyncio.sleep(0.01)
+
+
+async def start_websub(upstream, channels, feed_urls):
+    """WebSub 콜백 서버를 띄우고, push 처리 경로가 가짜 채널과 피드 목록을 쓰도록 설정합니다."""
+    upstream.subscribers.clear()
+    channels_by_id = {channel.id: channel for channel in channels}
+    main.resolve_channels = lambda channel_ids: [channels_by_id[i] for i in channel_ids if i in channels_by_id]
+    main.DISCORD_CHANNEL_IDS = list(channels_by_id)
+    main.RSS_FEED_URLS = list(feed_urls)
+    main.WEBSUB_CALLBACK_URL = f"http://{BENCH_HOST}:{BENCH_WEBSUB_PORT}/websub"
+    return await main.start_websub_server(BENCH_HOST, BENCH_WEBSUB_PORT)
+
+
+async def stop_websub(runner):
+    await runner.cleanup()
+    main.WEBSUB_CALLBACK_URL = ''
+    main.resolve_channels = ORIGINAL_RESOLVE_CHANNELS
+
+
+async def run_scenario(upstream, name, spec, trace_memory):
+    reset_main_state()
+    upstream.spec = dict(SCENARIO_DEFAULTS, **spec)
+    upstream.openrouter_requests = 0
+    upstream.model_requests = collections.Counter()
+    main.SUMMARY_STREAM_EDIT_INTERVAL = upstream.spec['stream_edit_interval']
+    main.OPENROUTER_FALLBACK_MODELS = list(upstream.spec['fallback_models'])
+    main.SUMMARY_HEDGE_DELAY = upstream.spec['hedge_delay']
+    channels = [FakeChannel(900000 + index, upstream.spec['discord_latency']) for index in range(spec['channels'])]
+    feed_urls = [f"http://{BENCH_HOST}:{BENCH_PORT}/feed/{index}" for index in range(spec['feeds'])]
+
+    stage_latencies = collections.defaultdict(list)
+    hook = lambda stage, seconds: stage_latencies[stage].append(seconds)
+    main.stage_latency_hooks.append(hook)
+    lag_samples = []
+    lag_task = asyncio.ensure_future(monitor_loop_lag(lag_samples))
+    if trace_memory:
+        tracemalloc.start()
+    websub_runner = await start_websub(upstream, channels, feed_urls) if upstream.spec['websub'] else None
+    started = time.perf_counter()
+    try:
+        for cycle in range(spec['cycles']):
+            upstream.cycle = cycle
+            if websub_runner is not None and cycle > 0:
+                # 폴링하지 않고 허브 push만으로 새 항목이 전달될 때까지 기다림
+                expected = spec['feeds'] * (spec['items'] + cycle * spec['change'])
+                await upstream.push_all()
+                await wait_until(lambda: len(stage_latencies['total']) >= expected)
+            else:
+                await main.fetch_feed(channels, main.SiteColors({}), feed_urls)
+                if websub_runner is not None:
+                    await wait_until(lambda: len(upstream.subscribers) >= len(feed_urls))
+    finally:
+        elapsed = time.perf_counter() - started
+        peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+        lag_task.cancel()
+        main.stage_latency_hooks.remove(hook)
+        if websub_runner is not None:
+            await stop_websub(websub_runner)
+
+    articles = len(stage_latencies['total'])
+    return {
+        'scenario': name,
+        'spec': upstream.spec,
+        'seconds': elapsed,
+        'articles': articles,
+        'embeds': sum(channel.embeds for channel in channels),
+        'messages': sum(channel.messages for channel in channels),
+        'edits': sum(channel.edits for channel in channels),
+        'openrouter_requests': upstream.openrouter_requests,
+        'model_requests': dict(upstream.model_requests),
+        'articles_per_second': articles / elapsed if elapsed else 0.0,
+        'peak_memory_bytes': peak_memory,
+        'loop_lag': {
+            'p50': percentile(lag_samples, 0.5),
+            'p99': percentile(lag_samples, 0.99),
+            'max': max(lag_samples, default=0.0),
+        },
+        'stages': {
+            stage: {
+                'count': len(values),
+                'p50': percentile(values, 0.5),
+                'p90': percentile(values, 0.9),
+                'p99': percentile(values, 0.99),
+                'max': max(values),
+            }
+            for stage, values in sorted(stage_latencies.items())
+        },
+    }
+
+
+def print_result(result):
+    memory = f"{result['peak_memory_bytes'] / 1048576:.1f}MB" if result['peak_memory_bytes'] is not None else '-'
+    lag = result['loop_lag']
+    print(f"== {result['scenario']}: 기사 {result['articles']}개 / {result['seconds']:.2f}초 "
+          f"= {result['articles_per_second']:.1f}개/초, Embed {result['embeds']}개 (메시지 {result['messages']}개, 수정 {result['edits']}회), "
+          f"OpenRouter 요청 {result['openrouter_requests']}회, 최대 메모리 {memory}")
+    if len(result['model_requests']) > 1:
+        print("   모델별 요청 " + ", ".join(f"{model} {count}회" for model, count in sorted(result['model_requests'].items())))
+    print(f"   이벤트 루프 지연 p50 {lag['p50'] * 1000:.1f}ms / p99 {lag['p99'] * 1000:.1f}ms / 최대 {lag['max'] * 1000:.1f}ms")
+    for stage, stats in result['stages'].items():
+        print(f"   {stage:<10} {stats['count']:>6}회  p50 {stats['p50'] * 1000:8.1f}ms  p90 {stats['p90'] * 1000:8.1f}ms  "
+              f"p99 {stats['p99'] * 1000:8.1f}ms  최대 {stats['max'] * 1000:8.1f}ms")
+
+
+async def run_benchmarks(names, trace_memory):
+    # 모든 피드가 같은 로컬 호스트에 있으므로 호스트별 연결 제한을 전체 제한과 같게 둠 (실제로는 호스트가 제각각)
+    main.fetch_pool = main.FetchPool(main.FETCH_CONCURRENCY, main.FETCH_CONCURRENCY)
+    main.openrouter_limiter = main.RateLimiter(0, 0)
+    main.OPENROUTER_API_KEY = 'benchmark'
+    main.OPENROUTER_MODEL = 'benchmark/model'
+    main.OPENROUTER_API_URL = f"http://{BENCH_HOST}:{BENCH_PORT}/openrouter"
+
+    upstream = FakeUpstream()
+    await upstream.start()
+    results = []
+    try:
+        for name in names:
+            result = await run_scenario(upstream, name, SCENARIOS[name], trace_memory)
+            print_result(result)
+            results.append(result)
+    finally:
+        await main.close_http_sessions()
+        await upstream.stop()
+    return results
+
+
+def legacy_content_text(raw_html):
+    """예전 본문 경로: 정규식 세 번으로 태그를 지운 뒤 요약 프롬프트에는 앞 1500자를 잘라 보냄 (이벤트 루프에서 실행)."""
+    processed_html = re.sub(r'<br\s*/?>', '\n', raw_html, flags=re.IGNORECASE)
+    text = ' '.join(re.sub(r'<.*?>', '', processed_html).split())
+    return text, text[:1500]
+
+
+async def legacy_content_texts(feed_entries):
+    return [legacy_content_text(raw) for entries in feed_entries.values() for _, raw in entries]
+
+
+async def extracted_content_texts(feed_entries):
+    """지금 본문 경로: process_feed_document처럼 피드마다 EXTRACT_BATCH_SIZE개씩 모아 파싱 워커 풀에서 추출하고 예산 안에서 자름."""
+    loop = asyncio.get_running_loop()
+
+    async def extract_feed(feed_url, entries):
+        texts = []
+        for start in range(0, len(entries), main.EXTRACT_BATCH_SIZE):
+            texts += await loop.run_in_executor(main.get_parse_executor(), main.extract_entry_texts, feed_url,
+                                                entries[start:start + main.EXTRACT_BATCH_SIZE])
+        return texts
+
+    results = await asyncio.gather(*(extract_feed(feed_url, entries) for feed_url, entries in feed_entries.items()))
+    return [texts for feed_texts in results for texts in feed_texts]
+
+
+def html_entry(feed_index, item_index):
+    """실제 피드처럼 메뉴, 공유 링크, 스크립트, 본문 문단, 원문 링크 안내, 피드 공통 꼬리말이 섞인 본문 HTML."""
+    rng = random.Random(feed_index * 1000003 + item_index)
+    sentence = lambda: words(rng.random(), rng.randint(8, 22)).capitalize() + '.'
+    parts = ['<nav><a href="/">Home</a> | <a href="/news">News</a> | <a href="/sports">Sports</a></nav>']
+    if rng.random() < 0.5:
+        parts.append('<p><a href="#">Share on Facebook</a> <a href="#">Tweet</a> <a href="#">Email</a></p>')
+    parts.append('<script>window.dataLayer = window.dataLayer || []; if (a < b) { track("view"); }</script>')
+    for _ in range(rng.randint(3, 14)):
+        paragraph = ' '.join(sentence() for _ in range(rng.randint(1, 4)))
+        if rng.random() < 0.3:
+            paragraph += f' <a href="/tag/{rng.randint(0, 99)}">{html.escape(words(rng.random(), 2))}</a> &amp; more.'
+        parts.append(f'<p>{paragraph}</p>')
+    if rng.random() < 0.3:
+        parts.append(f'<figure><img src="/img.jpg"/><figcaption>{words(rng.random(), 6)}</figcaption></figure>')
+    parts.append(f'<p>The post {words(rng.random(), 5)} appeared first on Feed {feed_index} News.</p>')
+    parts.append(f'<p>Feed {feed_index} News is an independent newsroom covering local politics, culture and sports since 1998.</p>')
+    return '\n'.join(parts)
+
+
+def run_extraction_benchmark(feeds=20, items=100, repeats=5):
+    """본문 추출 경로별 항목당 전체 CPU 시간과 요약 프롬프트 토큰 수(4글자당 1토큰)를 비교합니다.
+
+    CPU 시간은 이벤트 루프 스레드와 파싱 워커 풀을 합친 process_time입니다. 워커 스레드도 GIL을 잡는 동안은 루프를 멈추므로
+    루프 스레드 시간만 따로 보지 않습니다. 두 경로를 번갈아 repeats번 돌려 가장 짧은 시간을 씁니다.
+    """
+    feed_entries = {f"feed-{feed_index}": [(f"article-{feed_index}-{item_index}", html_entry(feed_index, item_index))
+                                           for item_index in range(items)]
+                    for feed_index in range(feeds)}
+    entry_count = feeds * items
+    paths = {'legacy': legacy_content_texts, 'extracted': extracted_content_texts}
+    cpu_seconds = dict.fromkeys(paths, float('inf'))
+    outputs = {}
+
+    main.get_parse_executor()
+    for _ in range(repeats):
+        for path, extract in paths.items():
+            main.feed_boilerplate = main.FeedBoilerplate()
+            started = time.process_time()
+            outputs[path] = asyncio.run(extract(feed_entries))
+            cpu_seconds[path] = min(cpu_seconds[path], time.process_time() - started)
+    results = {}
+    for path, texts in outputs.items():
+        prompts = [prompt for _, prompt in texts]
+        results[path] = {
+            'cpu_us_per_entry': cpu_seconds[path] / entry_count * 1e6,
+            'prompt_tokens_avg': sum(len(prompt) // 4 for prompt in prompts) / len(prompts),
+            'boilerplate_ratio': sum(1 for prompt in prompts if 'appeared first on' in prompt or 'independent newsroom' in prompt
+                                     or prompt.startswith('Home')) / len(prompts),
+            'cut_mid_sentence_ratio': sum(1 for prompt in prompts if prompt and not prompt.endswith(('.', '…'))) / len(prompts),
+        }
+    saved = 1 - results['extracted']['prompt_tokens_avg'] / results['legacy']['prompt_tokens_avg']
+    cpu_ratio = results['extracted']['cpu_us_per_entry'] / results['legacy']['cpu_us_per_entry']
+    print(f"== extraction: 항목 {entry_count}개, 토큰 예산 {main.SUMMARY_TOKEN_BUDGET}, "
+          f"전체 CPU 예전 대비 {cpu_ratio:.2f}배, 프롬프트 토큰 {saved * 100:.1f}% 절감")
+    for path, stats in results.items():
+        print(f"   {path:<10} 전체 CPU {stats['cpu_us_per_entry']:6.1f}us/항목  "
+              f"프롬프트 평균 {stats['prompt_tokens_avg']:6.1f}토큰  상용구 포함 {stats['boilerplate_ratio'] * 100:5.1f}%  "
+              f"문장 중간 잘림 {stats['cut_mid_sentence_ratio'] * 100:5.1f}%")
+    return {'scenario': 'extraction', 'entries': entry_count, 'cpu_ratio': cpu_ratio, 'prompt_tokens_saved_ratio': saved,
+            'paths': results}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="NyanRSS 오프라인 벤치마크")
+    parser.add_argument('scenarios', nargs='*', help=f"실행할 시나리오 (기본값: 전부, {', '.join(SCENARIOS)})")
+    parser.add_argument('--json', help="결과를 저장할 JSON 파일 경로")
+    parser.add_argument('--no-memory', action='store_true', help="tracemalloc 메모리 측정 끄기 (측정 오버헤드 제거)")
+    parser.add_argument('--log-level', default='WARNING', help="NyanRSS 로그 레벨 (기본값 WARNING)")
+    parser.add_argument('--discord-limits', action='store_true', help="가짜 채널에도 Discord 기본 레이트 리밋(5회/5초) 적용")
+    parser.add_argument('--extraction', action='store_true', help="파이프라인 대신 본문 추출 경로만 비교 (예전 방식 대비 CPU/토큰)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"알 수 없는 시나리오: {', '.join(unknown)}")
+        sys.exit(1)
+    main.setup_logging(args.log_level)
+    if not args.discord_limits:
+        main.RateLimitBucket = UnlimitedBucket
+    json_path = os.path.abspath(args.json) if args.json else None
+    if args.extraction:
+        benchmark_results = [run_extraction_benchmark()]
+    else:
+        benchmark_results = asyncio.run(run_benchmarks(names, not args.no_memory))
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(benchmark_results, f, ensure_ascii=False, indent=2)
+        print(f"결과 저장: {json_path}")
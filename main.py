@@ -7,14 +7,47 @@ import base64
 import re
 import time
 import datetime
-import requests
-from dotenv import load_dotenv
+import functools
+import heapq
+import itertools
+import bisect
+import socket
+import random
+import struct
+import io
+import xml.etree.ElementTree as ET
+import calendar
+import collections
+import email.utils
+import hashlib
+import hmac
+import secrets
+import json
+import sqlite3
+import threading
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import aiohttp
+from aiohttp import web
+from dotenv import load_dotenv, dotenv_values, find_dotenv
 from discord import Embed, Color, utils
 from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None  # Pillow가 없으면 이미지를 줄이지 않고 원본 그대로 보냄
 
 load_dotenv()
-intents = discord.Intents.all()
-client = discord.Client(intents=intents)
+# 채널을 찾아 메시지를 보내기만 하므로 길드/채널 정보만 받고, 멤버·프레즌스·메시지 캐시는 두지 않음
+intents = discord.Intents.none()
+intents.guilds = True
+client = discord.Client(intents=intents, member_cache_flags=discord.MemberCacheFlags.none(),
+                        chunk_guilds_at_startup=False, max_messages=None)
 
 DISCORD_CHANNEL_IDS = []
 DISCORD_BOT_TOKEN = ""
@@ -22,67 +55,1038 @@ RSS_FEED_URLS = []
 OPENROUTER_API_KEY = ""
 OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
 OPENROUTER_MODEL = ""
-site_color_map = {}
+OPENROUTER_FALLBACK_MODELS = []
+SENT_STORE_BACKEND = "sqlite"
+DISCORD_WEBHOOK_URLS = []
+DELIVERY_MODE = os.getenv('DELIVERY_MODE', 'gateway').strip().lower()  # gateway: 봇 계정으로 전송, webhook: 웹훅으로 전송 (게이트웨이 연결 없음)
+FETCH_CONCURRENCY = int(os.getenv('FETCH_CONCURRENCY', '32'))
+FETCH_PER_HOST_LIMIT = int(os.getenv('FETCH_PER_HOST_LIMIT', '4'))
+FEED_FETCH_TIMEOUT = float(os.getenv('FEED_FETCH_TIMEOUT', '20'))
+IMAGE_FETCH_TIMEOUT = float(os.getenv('IMAGE_FETCH_TIMEOUT', '10'))
+IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', str(5 * 1024 * 1024)))
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', '1024'))
+IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', '80'))
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', 'image_cache')
+IMAGE_CACHE_MAX_BYTES = int(os.getenv('IMAGE_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+IMAGE_CACHE_TTL = float(os.getenv('IMAGE_CACHE_TTL', str(86400)))
+FEED_PARSE_WORKERS = int(os.getenv('FEED_PARSE_WORKERS', '4'))
+STREAM_PARSE_MIN_BYTES = int(os.getenv('STREAM_PARSE_MIN_BYTES', str(512 * 1024)))
+STREAM_PARSE_CHUNK = int(os.getenv('STREAM_PARSE_CHUNK', '20'))
+EXTRACT_BATCH_SIZE = int(os.getenv('EXTRACT_BATCH_SIZE', '32'))
+INCREMENTAL_SAFETY_WINDOW = int(os.getenv('INCREMENTAL_SAFETY_WINDOW', '5'))
+INCREMENTAL_SEEN_IDS = int(os.getenv('INCREMENTAL_SEEN_IDS', '200'))
+DEFAULT_POLL_INTERVAL = float(os.getenv('DEFAULT_POLL_INTERVAL', '600'))
+MIN_POLL_INTERVAL = float(os.getenv('MIN_POLL_INTERVAL', '120'))
+MAX_POLL_INTERVAL = float(os.getenv('MAX_POLL_INTERVAL', '21600'))
+POLL_CONCURRENCY = int(os.getenv('POLL_CONCURRENCY', '8'))
+CONFIG_WATCH_INTERVAL = float(os.getenv('CONFIG_WATCH_INTERVAL', '5'))
+RECENT_ARTICLE_WINDOW = float(os.getenv('RECENT_ARTICLE_WINDOW', '3600'))
+TITLE_SIMILARITY_THRESHOLD = float(os.getenv('TITLE_SIMILARITY_THRESHOLD', '0.8'))
+BODY_SIMILARITY_THRESHOLD = float(os.getenv('BODY_SIMILARITY_THRESHOLD', '0.7'))
+NEAR_DUPLICATE_WINDOW = float(os.getenv('NEAR_DUPLICATE_WINDOW', str(3 * 86400)))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv('SUMMARY_CACHE_MAX_ENTRIES', '20000'))
+SUMMARY_CACHE_TTL = float(os.getenv('SUMMARY_CACHE_TTL', str(7 * 86400)))
+SUMMARY_BATCH_SIZE = int(os.getenv('SUMMARY_BATCH_SIZE', '0'))
+SUMMARY_CONCURRENCY = int(os.getenv('SUMMARY_CONCURRENCY', '4'))
+SUMMARY_TOKEN_BUDGET = int(os.getenv('SUMMARY_TOKEN_BUDGET', '350'))
+SUMMARY_HEDGE_DELAY = float(os.getenv('SUMMARY_HEDGE_DELAY', '0'))  # 0이면 겹쳐 보내지 않고 실패할 때만 다음 모델로
+SUMMARY_SHORT_ARTICLE_CHARS = int(os.getenv('SUMMARY_SHORT_ARTICLE_CHARS', '0'))  # 0이면 짧은 기사도 기본 모델부터
+SUMMARY_STREAM_EDIT_INTERVAL = float(os.getenv('SUMMARY_STREAM_EDIT_INTERVAL', '0'))  # 0이면 요약이 끝난 뒤에 보냄
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '32'))
+ENRICH_WORKERS = int(os.getenv('ENRICH_WORKERS', '4'))
+SUMMARIZE_WORKERS = int(os.getenv('SUMMARIZE_WORKERS', '4'))
+DELIVER_WORKERS = int(os.getenv('DELIVER_WORKERS', '1'))
+CHANNEL_QUEUE_SIZE = int(os.getenv('CHANNEL_QUEUE_SIZE', '50'))
+DELIVERY_MAX_RETRIES = int(os.getenv('DELIVERY_MAX_RETRIES', '5'))
+DELIVERY_FORBIDDEN_BACKOFF = float(os.getenv('DELIVERY_FORBIDDEN_BACKOFF', '600'))
+OPENROUTER_REQUESTS_PER_MINUTE = float(os.getenv('OPENROUTER_REQUESTS_PER_MINUTE', '60'))
+OPENROUTER_TOKENS_PER_MINUTE = float(os.getenv('OPENROUTER_TOKENS_PER_MINUTE', '0'))
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+OPENROUTER_MAX_RETRIES = int(os.getenv('OPENROUTER_MAX_RETRIES', '3'))
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FEED_SAMPLE_BURST = int(os.getenv('LOG_FEED_SAMPLE_BURST', '20'))
+LOG_FEED_SAMPLE_WINDOW = float(os.getenv('LOG_FEED_SAMPLE_WINDOW', '60'))
+SHARD_ROLE = os.getenv('SHARD_ROLE', '').strip().lower()  # 비우면 샤딩 없이 한 프로세스가 모두 처리
+SHARD_WORKER_ID = os.getenv('SHARD_WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+SHARD_LEASE_TTL = float(os.getenv('SHARD_LEASE_TTL', '60'))
+SHARD_VIRTUAL_NODES = int(os.getenv('SHARD_VIRTUAL_NODES', '64'))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '2'))
+WEBSUB_CALLBACK_URL = os.getenv('WEBSUB_CALLBACK_URL', '').rstrip('/')  # 허브가 접근할 수 있는 외부 주소. 비우면 WebSub 사용 안 함
+WEBSUB_HOST = os.getenv('WEBSUB_HOST', '0.0.0.0')
+WEBSUB_PORT = int(os.getenv('WEBSUB_PORT', '8081'))
+WEBSUB_LEASE_SECONDS = int(os.getenv('WEBSUB_LEASE_SECONDS', str(7 * 86400)))
+WEBSUB_POLL_INTERVAL = float(os.getenv('WEBSUB_POLL_INTERVAL', '21600'))
+WEBSUB_PUSH_BACKLOG = int(os.getenv('WEBSUB_PUSH_BACKLOG', '100'))
+HOST_FAILURE_THRESHOLD = int(os.getenv('HOST_FAILURE_THRESHOLD', '5'))
+HOST_ERROR_RATE_THRESHOLD = float(os.getenv('HOST_ERROR_RATE_THRESHOLD', '0.5'))
+HOST_OPEN_SECONDS = float(os.getenv('HOST_OPEN_SECONDS', '30'))
+HOST_MAX_OPEN_SECONDS = float(os.getenv('HOST_MAX_OPEN_SECONDS', '600'))
+
+logger = logging.getLogger('nyanrss')
+log_listener = None
+
+
+class FeedLogSampler(logging.Filter):
+    """피드별 로그 샘플링. extra={'feed': URL}이 붙은 INFO 이하 로그는 피드마다 window초에 burst건까지만 남깁니다.
+
+    경고/오류는 항상 남기고, 버린 건수는 다음 구간의 첫 로그에 덧붙입니다.
+    """
+
+    def __init__(self, burst, window):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._feeds = {}  # 피드 URL -> [구간 시작 시각, 남긴 건수, 버린 건수]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        feed_url = getattr(record, 'feed', None)
+        if feed_url is None or self.burst <= 0 or record.levelno > logging.INFO:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            state = self._feeds.get(feed_url)
+            if state is None or now - state[0] >= self.window:
+                dropped = state[2] if state else 0
+                state = self._feeds[feed_url] = [now, 0, 0]
+                if dropped:
+                    record.msg = f"(이전 {dropped}건 생략) {record.msg}"
+            if state[1] >= self.burst:
+                state[2] += 1
+                return False
+            state[1] += 1
+            return True
+
+
+def setup_logging(level=None):
+    """로그를 큐에 넣고 별도 스레드에서 출력하도록 설정합니다. 이벤트 루프는 stdout 쓰기를 기다리지 않습니다."""
+    global log_listener
+    logger.setLevel(level or LOG_LEVEL)
+    if log_listener is not None:
+        return
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(FeedLogSampler(LOG_FEED_SAMPLE_BURST, LOG_FEED_SAMPLE_WINDOW))
+    output_handler = logging.StreamHandler(sys.stdout)
+    output_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)-7s %(message)s'))
+    log_listener = logging.handlers.QueueListener(log_queue, output_handler)
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+    log_listener.start()
+    atexit.register(log_listener.stop)
+
+def config_url_key(url):
+    """설정의 URL을 비교용 키로 정규화합니다 (scheme/host 소문자, 끝의 / 제거)."""
+    parsed = urlparse(url.strip())
+    key = f"{parsed.scheme.lower()}://{parsed.netloc.lower()}{parsed.path.rstrip('/')}"
+    return f"{key}?{parsed.query}" if parsed.query else key
+
+def site_key(url):
+    parsed = urlparse(url.strip())
+    return f"{parsed.scheme.lower()}://{parsed.netloc.lower()}"
+
+
+class SiteColors:
+    """SITE_COLORS를 미리 Discord 색상으로 바꿔 둔 읽기 전용 표. 피드 URL, 없으면 사이트 주소(scheme://host)로 찾습니다."""
+
+    def __init__(self, colors):
+        self._colors = dict(colors)  # 정규화된 URL 키 -> Color
+        self._by_feed = {}  # 피드 URL -> Color (찾은 결과 기억)
+
+    def color_for(self, feed_url):
+        color = self._by_feed.get(feed_url)
+        if color is None:
+            color = self._colors.get(config_url_key(feed_url)) or self._colors.get(site_key(feed_url)) or Color.blue()
+            self._by_feed[feed_url] = color
+        return color
+
+    def __len__(self):
+        return len(self._colors)
+
+    def __eq__(self, other):
+        return isinstance(other, SiteColors) and self._colors == other._colors
+
+
+ConfigSnapshot = collections.namedtuple('ConfigSnapshot', 'channel_ids feed_urls site_colors')
+ConfigSnapshot.__doc__ = "한 시점의 채널/피드/색상 설정. 바뀌지 않으므로 처리 중인 기사와 그대로 공유합니다."
+config_snapshot = None
+site_color_map = SiteColors({})
+
+def parse_site_colors(value):
+    colors = {}
+    for pair in value.split(','):
+        pair = pair.strip()
+        if not pair:
+            continue
+        if ':' not in pair:
+            logger.warning(".env의 SITE_COLORS 형식 오류 (콜론 없음) - '%s' 건너뜁니다.", pair)
+            continue
+        url, hex_color = pair.rsplit(':', 1)
+        hex_color = hex_color.strip()
+        if not re.match(r'^#[0-9a-fA-F]{6}$', hex_color):
+            logger.warning(".env의 SITE_COLORS에 잘못된 HEX 코드 형식 발견 - '%s' 건너뜁니다.", pair)
+            continue
+        colors[config_url_key(url)] = Color(int(hex_color[1:], 16))
+    return SiteColors(colors)
+
+def build_config_snapshot(values, previous=None):
+    """설정 값(dict)으로 채널 ID, 피드 URL, 사이트 색상 스냅샷을 만듭니다.
+
+    채널 ID 형식이 잘못되면 previous의 채널 ID를 유지하고, previous가 없으면 ValueError를 냅니다.
+    """
+    channel_ids_str = values.get('DISCORD_CHANNEL_IDS', '')
+    try:
+        channel_ids = tuple(int(channel_id) for channel_id in channel_ids_str.split(',') if channel_id.strip())
+    except ValueError:
+        if previous is None:
+            raise ValueError("DISCORD_CHANNEL_IDS 형식이 잘못되었습니다 (숫자 목록이어야 함)")
+        logger.error(".env의 DISCORD_CHANNEL_IDS 형식이 잘못되었습니다 (숫자 목록이어야 함). 채널 ID 업데이트 실패.")
+        channel_ids = previous.channel_ids
+    feed_urls = tuple(dict.fromkeys(url.strip() for url in values.get('RSS_FEED_URLS', '').split(',') if url.strip()))
+    site_colors = parse_site_colors(values.get('SITE_COLORS', ''))
+    # 설정된 피드의 색상은 미리 찾아 두어 기사마다 URL을 파싱하지 않음
+    for feed_url in feed_urls:
+        site_colors.color_for(feed_url)
+    return ConfigSnapshot(channel_ids, feed_urls, site_colors)
+
+def apply_config_snapshot(snapshot):
+    """새 설정 스냅샷을 적용하고 바뀐 항목을 기록합니다. 바뀐 것이 있으면 True."""
+    global config_snapshot, DISCORD_CHANNEL_IDS, RSS_FEED_URLS, site_color_map
+    previous = config_snapshot
+    config_snapshot = snapshot
+    DISCORD_CHANNEL_IDS = list(snapshot.channel_ids)
+    RSS_FEED_URLS = list(snapshot.feed_urls)
+    site_color_map = snapshot.site_colors
+    if previous is None:
+        return True
+    if snapshot == previous:
+        logger.info("설정 변경 없음.")
+        return False
+    if snapshot.channel_ids != previous.channel_ids:
+        logger.info("DISCORD_CHANNEL_IDS 업데이트됨: %s", DISCORD_CHANNEL_IDS)
+    if snapshot.feed_urls != previous.feed_urls:
+        added = len(set(snapshot.feed_urls) - set(previous.feed_urls))
+        removed = len(set(previous.feed_urls) - set(snapshot.feed_urls))
+        logger.info("RSS_FEED_URLS 업데이트됨 (총 %s개, 추가 %s개, 제거 %s개)", len(snapshot.feed_urls), added, removed)
+    if snapshot.site_colors != previous.site_colors:
+        logger.info("SITE_COLORS 업데이트됨 (총 %s개)", len(snapshot.site_colors))
+    return True
 
 def load_initial_config():
-    global DISCORD_CHANNEL_IDS, DISCORD_BOT_TOKEN, RSS_FEED_URLS, OPENROUTER_API_KEY, OPENROUTER_MODEL, site_color_map
+    global DISCORD_BOT_TOKEN, DISCORD_WEBHOOK_URLS, OPENROUTER_API_KEY, OPENROUTER_MODEL, OPENROUTER_FALLBACK_MODELS, SENT_STORE_BACKEND
     try:
-        channel_ids_str = os.getenv('DISCORD_CHANNEL_IDS', '')
-        if channel_ids_str:
-            DISCORD_CHANNEL_IDS = list(map(int, channel_ids_str.split(',')))
-        else:
-            DISCORD_CHANNEL_IDS = []
+        apply_config_snapshot(build_config_snapshot(os.environ))
 
         DISCORD_BOT_TOKEN = os.getenv('DISCORD_BOT_TOKEN')
-        RSS_FEED_URLS = os.getenv('RSS_FEED_URLS', '').split(",")
+        DISCORD_WEBHOOK_URLS = [url.strip() for url in os.getenv('DISCORD_WEBHOOK_URLS', '').split(',') if url.strip()]
+        if DELIVERY_MODE not in ('gateway', 'webhook'):
+            raise ValueError(f"DELIVERY_MODE는 gateway 또는 webhook이어야 합니다 (현재: '{DELIVERY_MODE}')")
+        if DELIVERY_MODE == 'webhook' and SHARD_ROLE != 'ingest' and not DISCORD_WEBHOOK_URLS:
+            raise ValueError("웹훅 모드에는 DISCORD_WEBHOOK_URLS가 필요합니다")
         OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
         OPENROUTER_MODEL = os.getenv('OPENROUTER_MODEL', 'google/gemini-2.5-flash')
+        OPENROUTER_FALLBACK_MODELS = [model.strip() for model in os.getenv('OPENROUTER_FALLBACK_MODELS', '').split(',')
+                                      if model.strip() and model.strip() != OPENROUTER_MODEL]
+        SENT_STORE_BACKEND = os.getenv('SENT_STORE_BACKEND', 'sqlite').strip().lower()
+        if SENT_STORE_BACKEND not in ('sqlite', 'log'):
+            logger.warning("알 수 없는 SENT_STORE_BACKEND '%s'. sqlite를 사용합니다.", SENT_STORE_BACKEND)
+            SENT_STORE_BACKEND = 'sqlite'
+        if SHARD_ROLE not in ('', 'all', 'ingest', 'deliver'):
+            raise ValueError(f"SHARD_ROLE은 all, ingest, deliver 중 하나여야 합니다 (현재: '{SHARD_ROLE}')")
+        if SHARD_ROLE and SENT_STORE_BACKEND != 'sqlite':
+            logger.warning("샤딩 모드에서는 프로세스 간에 공유되는 sqlite 전송 기록 저장소를 사용합니다.")
+            SENT_STORE_BACKEND = 'sqlite'
+        logger.info("사이트별 색상 설정 로드: %s개", len(site_color_map))
 
-        SITE_COLORS_STR = os.getenv('SITE_COLORS', '')
-        site_color_map = {}
-        if SITE_COLORS_STR:
-            pairs = SITE_COLORS_STR.split(',')
-            for pair in pairs:
-                if ':' in pair:
-                    try:
-                        url, hex_color = pair.strip().rsplit(':', 1)
-                        if re.match(r'^#[0-9a-fA-F]{6}$', hex_color):
-                            site_color_map[url.strip()] = hex_color.strip()
-                        else:
-                            print(f"경고: .env의 SITE_COLORS에 잘못된 HEX 코드 형식 발견 - '{pair.strip()}' 건너뜁니다.")
-                    except ValueError:
-                        print(f"경고: .env의 SITE_COLORS 형식 오류 - '{pair.strip()}' 건너뜁니다.")
-                else:
-                    print(f"경고: .env의 SITE_COLORS 형식 오류 (콜론 없음) - '{pair.strip()}' 건너뜁니다.")
-        print(f"사이트별 색상 설정 로드: {len(site_color_map)}개")
-
-        if not all([DISCORD_BOT_TOKEN, RSS_FEED_URLS, OPENROUTER_API_KEY, OPENROUTER_MODEL]):
+        # 수집 전용 워커와 웹훅 모드는 게이트웨이에 연결하지 않으므로 봇 토큰이 없어도 됨
+        needs_token = SHARD_ROLE != 'ingest' and DELIVERY_MODE == 'gateway'
+        if not all([DISCORD_BOT_TOKEN or not needs_token, RSS_FEED_URLS, OPENROUTER_API_KEY, OPENROUTER_MODEL]):
             raise ValueError("필수 환경 변수 중 일부가 설정되지 않았습니다 (DISCORD_BOT_TOKEN, RSS_FEED_URLS, OPENROUTER_API_KEY, OPENROUTER_MODEL 확인)")
 
-        print(f"초기 채널 ID 로드: {DISCORD_CHANNEL_IDS}")
+        logger.info("초기 채널 ID 로드: %s", DISCORD_CHANNEL_IDS)
         return True
 
     except ValueError as e:
-        print(f"환경 변수 로드 오류: {e}")
+        logger.error("환경 변수 로드 오류: %s", e)
         return False
     except Exception as e:
-        print(f"설정 로드 중 예상치 못한 오류: {e}")
+        logger.error("설정 로드 중 예상치 못한 오류: %s", e)
         return False
 
 EMOJI = "\U0001F4F0"
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36 NyanRSS/1.0'
 sent_articles_file = "sent_articles.yaml"
-yaml_lock = asyncio.Lock()
+sent_log_file = "sent_articles.log"
+state_db_file = os.getenv('STATE_DB_FILE', 'nyanrss.db')
 max_keep = 5000
+sent_store = None
+feed_state_store = None
+summary_cache = None
+image_cache = None
+pipeline_journal = None
+shard_coordinator = None
+delivery_outbox = None
+websub_subscriptions = None
+recent_processed = {}  # URL/정규화 URL -> 처리 시각
+title_index = None
+body_index = None
+
+SUMMARY_CONTENT_LIMIT = SUMMARY_TOKEN_BUDGET * 4  # 본문은 발견 단계에서 예산에 맞춰 고르므로, 재시작 전 기록 등에 대한 안전 상한
+SUMMARY_PROMPT_TEMPLATE = """너는 이제부터 기사 요약하는 고양이다냥! 다음 뉴스기사 내용과 이미지를 보고 한국어로 간결하게 5~7문장 이내로, 최대한 줄바꿈 없이, 반말(중요)로 요약해달라냥! 무조건 말 끝에 냥을 붙이고 고양이 이모티콘도 자주 쓰고 고양이답게 말투도 엄청 귀여워야 한다냥! 가능하다면 배경지식도 넣어서 요약해달라냥! 항상 요약은 냐옹!으로 시작하고 마지막에는 냥냥!으로 끝나야 한다냥!:
+
+        ---
+        {content}
+        ---
+
+        요약:"""
+SUMMARY_BATCH_PROMPT = """너는 이제부터 기사 요약하는 고양이다냥! 아래 번호가 붙은 뉴스기사들을 각각 한국어로 간결하게 5~7문장 이내로, 최대한 줄바꿈 없이, 반말(중요)로 요약해달라냥! 무조건 말 끝에 냥을 붙이고 고양이 이모티콘도 자주 쓰고 고양이답게 말투도 엄청 귀여워야 한다냥! 가능하다면 배경지식도 넣어서 요약해달라냥! 항상 요약은 냐옹!으로 시작하고 마지막에는 냥냥!으로 끝나야 한다냥!
+반드시 다음 JSON 형식으로만 답해야 한다냥: {{"summaries": [{{"id": 기사 번호, "summary": "요약"}}]}}
+
+{articles}"""
+IMAGE_ONLY_PROMPT = "이 이미지를 보고 한국어로 간결하게 5~7문장 이내로, 최대한 줄바꿈 없이, 반말(중요)로 설명해달라냥! 무조건 말 끝에 냥을 붙이고 고양이 이모티콘도 자주 쓰고 고양이답게 말투도 엄청 귀여워야 한다냥! 항상 설명은 냐옹!으로 시작하고 마지막에는 냥냥!으로 끝나야 한다냥! 설명:"
+SUMMARY_STREAM_PLACEHOLDER = "냐옹... 요약하는 중이다냥 🐾"  # 스트리밍 요약이 시작되기 전 Embed에 보이는 문구
+
+# 문단을 나누는 태그 이름 (p, pre, div, dd, dt, br, blockquote, li, ul, ol, h1~h6, hr, header, tr, table, section, article, footer, figure)
+# 태그 이름마다 대소문자를 비교하면 토큰 정규식이 눈에 띄게 느려져 소문자 태그만 봄 (대문자 태그는 태그만 지우는 예전 동작)
+HTML_BLOCK_TAG = r'(?:p(?:re)?|d(?:iv|d|t)|b(?:r|lockquote)|li|[uo]l|h(?:[1-6r]|eader)|t(?:r|able)|section|article|footer|figure)\b'
+# 내용째 지우는 비본문 요소
+HTML_SKIP_TAGS = ('script', 'style', 'noscript', 'nav', 'aside', 'form', 'button', 'iframe', 'svg', 'template', 'figcaption')
+# 문단 안의 글자 하나 (인라인 태그는 지나가고 다음 문단 태그 앞에서 멈춤)
+HTML_BLOCK_CHAR = r'(?:[^<]|<(?!/?' + HTML_BLOCK_TAG + r'))'
+HTML_BLOCK_END = r'\s*(?=</?' + HTML_BLOCK_TAG + r'|\Z)'
+# 링크뿐인 문단 (메뉴, 공유 링크). 링크 사이에는 짧은 글자와 구분 기호만 허용
+HTML_LINK_ONLY_BLOCK = (
+    r'(?=[^<]{0,30}<a\b)(?:[^<]{0,30}<a\b[^>]*>[^<]*(?:<(?!/a\s*>)[^<]*)*</a\s*>)+[^<\w]*' + HTML_BLOCK_END
+)
+# 어느 피드에서나 나오는 상용구 문단 (원문 링크 안내, 공유/구독 안내, 저작권 표기, 기자 이메일, 말줄임표)
+# 엔티티를 풀기 전의 글자에 맞추므로 &copy; 같은 엔티티 표기도 함께 봄. 맨 앞 글자로 먼저 걸러 대부분의 문단은 바로 지나감
+HTML_BOILERPLATE_BLOCK = (
+    r'(?=[tcrsefTCRSEFⓒ©&저무\[….가-힣])(?i:'
+    r'the post (?:[^<]*<(?!/?' + HTML_BLOCK_TAG + r'))*?[^<]*? appeared first on [^<]*(?:<(?!/?' + HTML_BLOCK_TAG + r')[^<]*)*'
+    r'|(?:continue reading|read more|read the full (?:story|article)|the rest of this entry)' + HTML_BLOCK_CHAR + r'{0,200}'
+    r'|(?:share|share this|click to share|tweet|email this|subscribe|follow us|related(?: posts| articles)?)\b' + HTML_BLOCK_CHAR + r'{0,200}'
+    r'|this (?:article|post|entry) (?:was )?(?:originally )?(?:appeared|published|posted) ' + HTML_BLOCK_CHAR + r'{0,300}'
+    r'|(?:ⓒ|©|&copy;|&#169;|copyright|저작권자|무단\s?전재)' + HTML_BLOCK_CHAR + r'{0,200}'
+    r'|[가-힣 ]{0,30}?기자\s*[\w.+-]+@[\w-]+(?:\.[\w-]+)+'
+    r'|\[?(?:…|&hellip;|&#8230;|\.\.\.)\]?'
+    r')' + HTML_BLOCK_END
+)
+# 본문 HTML을 한 번에 훑는 토큰 정규식. 매치마다 (문단 경계면 '<', 태그 뒤의 글자)를 돌려줌
+# 이어지는 문단 태그, 그 뒤의 링크뿐인 문단과 상용구 문단, 비본문 요소는 내용째 한 매치에서 삼킴
+HTML_TOKEN_RE = re.compile(
+    r'(?:(<)(?:/?' + HTML_BLOCK_TAG + r'[^>]*>(?:\s*</?' + HTML_BLOCK_TAG + r'[^>]*>)*'
+    r'(?:' + HTML_LINK_ONLY_BLOCK + '|' + HTML_BOILERPLATE_BLOCK + r')?'
+    r'|' + '|'.join(tag + r'\b[^>]*>[^<]*(?:<(?!/' + tag + r'\s*>)[^<]*)*</' + tag + r'\s*>' for tag in HTML_SKIP_TAGS) + r')\s*'
+    r'|<(?:!--.*?-->|/?[a-zA-Z][^>]*>|[!?][^>]*>)|)([^<]*)',
+    re.DOTALL,
+)
+HTML_TAG_RE = re.compile(r'</?[a-zA-Z][^>]*>|<[!?][^>]*>')
+SENTENCE_ENDINGS = '.!?。！？…'
+
+
+def html_text_blocks(raw_html):
+    """HTML을 문단 단위 텍스트 목록으로 바꿉니다. HTML_TOKEN_RE로 한 번만 훑고, 태그마다 파이썬 코드를 돌지 않습니다.
+
+    문단 경계를 '<'로 표시해 이어 붙인 뒤 나눕니다 (태그를 지운 글자에는 '<'가 남지 않음).
+    모두 링크뿐이면 (링크 모음 피드) 태그만 지운 글자를 한 문단으로 돌려줍니다.
+    """
+    text = ''.join(itertools.chain.from_iterable(HTML_TOKEN_RE.findall(raw_html)))
+    if '\n' in text or '\t' in text:
+        text = ' '.join(text.split())
+    blocks = list(filter(None, map(str.strip, text.split('<'))))
+    if not blocks and '<a' in raw_html:
+        text = ' '.join(HTML_TAG_RE.sub(' ', raw_html).split())
+        blocks = [text] if text else []
+    return blocks
+
+
+class FeedBoilerplate:
+    """피드마다 여러 기사에 되풀이되는 문단(서명, 구독 안내, 매체 소개 등)을 익혀 본문에서 뺍니다.
+
+    서로 다른 기사 min_entries개에서 같은 문단이 나오면 그 피드의 상용구로 봅니다. 같은 기사를 다시 읽어도 세지 않습니다.
+    상용구는 본문 앞뒤에 붙으므로 앞뒤 edge_blocks개 문단만 셉니다 (긴 본문 문단마다 해시를 구하지 않음).
+    본문 추출은 파싱 워커 풀에서 돌기 때문에 잠금으로 보호합니다.
+    """
+
+    min_entries = 3
+    max_blocks_per_feed = 2000
+    edge_blocks = 2
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._feeds = {}  # 피드 URL -> {문단: 나온 기사 ID 튜플} (처음 나온 순서)
+
+    def filter(self, feed_url, article_id, blocks):
+        edge = self.edge_blocks
+        candidates = blocks if len(blocks) <= edge * 2 else blocks[:edge] + blocks[-edge:]
+        repeated = []
+        with self._lock:
+            seen = self._feeds.get(feed_url)
+            if seen is None:
+                seen = self._feeds[feed_url] = {}
+            for block in candidates:
+                article_ids = seen.get(block)
+                if article_ids is None:
+                    seen[block] = (article_id,)
+                elif len(article_ids) >= self.min_entries:
+                    repeated.append(block)
+                elif article_id not in article_ids:
+                    article_ids += (article_id,)
+                    seen[block] = article_ids
+                    if len(article_ids) >= self.min_entries:
+                        repeated.append(block)
+            if len(seen) > self.max_blocks_per_feed:
+                for block in list(itertools.islice(seen, len(seen) - self.max_blocks_per_feed)):
+                    del seen[block]
+        # 전부 상용구로 보이면 (본문이 늘 같은 피드) 그대로 둠
+        if not repeated or len(repeated) >= len(blocks):
+            return blocks
+        return [block for block in blocks if block not in repeated]
+
+feed_boilerplate = FeedBoilerplate()
+
+def select_summary_text(text, token_budget):
+    """요약에 보낼 본문을 토큰 예산 안으로 줄입니다 (estimate_payload_tokens와 같은 4글자당 1토큰 기준).
+
+    예산을 넘으면 앞에서부터(리드 순서) 예산 안의 마지막 문장 끝에서 자릅니다.
+    문장 끝이 없으면 단어 경계에서 자르고 '…'을 붙입니다.
+    """
+    char_budget = token_budget * 4
+    if len(text) <= char_budget:
+        return text
+    cut = 0
+    for mark in ('.!?' if text.isascii() else SENTENCE_ENDINGS):
+        end = text.rfind(mark, cut, char_budget)
+        # 소수점, 약어 등 뒤에 공백이 없는 문장 부호는 건너뜀
+        while end >= cut and text[end + 1] != ' ':
+            end = text.rfind(mark, cut, end)
+        if end >= cut:
+            cut = end + 1
+    if cut:
+        return text[:cut]
+    return text[:char_budget - 1].rsplit(' ', 1)[0] + '…'
+
+class Metric:
+    """Prometheus 형식으로 내보낼 지표 하나. 레이블 조합별로 값을 따로 둡니다."""
+
+    metric_type = 'untyped'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted(labels.items()))
+
+    @staticmethod
+    def _format_labels(key, extra=()):
+        pairs = list(key) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        for sample_name, key, value in self.samples():
+            lines.append(f"{sample_name}{self._format_labels(key)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """값을 직접 set하거나, 내보낼 때마다 callback()이 돌려주는 {레이블 dict 튜플: 값}을 씁니다."""
+
+    metric_type = 'gauge'
+
+    def __init__(self, name, help_text, callback=None):
+        super().__init__(name, help_text)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        if self.callback is None:
+            return super().samples()
+        return [(self.name, self._key(labels), value) for labels, value in self.callback()]
+
+
+class Histogram(Metric):
+    metric_type = 'histogram'
+    default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name, help_text, buckets=default_buckets):
+        super().__init__(name, help_text)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][index] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            states = [(key, dict(state, counts=list(state['counts']))) for key, state in self._values.items()]
+        for key, state in states:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['counts']):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', '+Inf')])} {state['count']}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {state['sum']}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {state['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """지표 모음. render()는 Prometheus 텍스트 형식(0.0.4)을 반환합니다."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text):
+        return self.register(Counter(name, help_text))
+
+    def gauge(self, name, help_text, callback=None):
+        return self.register(Gauge(name, help_text, callback))
+
+    def histogram(self, name, help_text, buckets=Histogram.default_buckets):
+        return self.register(Histogram(name, help_text, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logger.warning("지표 '%s' 출력 실패: %s", metric.name, e)
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+STAGE_SECONDS = metrics.histogram('nyanrss_stage_seconds', "처리 단계별 소요 시간 (fetch, parse, dedup, enrich, summarize, deliver, persist, first_post, total)")
+FEED_FETCHES = metrics.counter('nyanrss_feed_fetches_total', "피드 가져오기 결과별 횟수 (ok, not_modified, unchanged, error, skipped, push)")
+ARTICLES_SKIPPED = metrics.counter('nyanrss_articles_skipped_total', "중복으로 건너뛴 항목 수 (사유별)")
+ARTICLES_DISCOVERED = metrics.counter('nyanrss_articles_discovered_total', "파이프라인에 넣은 새 기사 수")
+ARTICLES_FINISHED = metrics.counter('nyanrss_articles_finished_total', "파이프라인을 마친 기사 수 (delivered, failed, deferred)")
+OPENROUTER_REQUESTS = metrics.counter('nyanrss_openrouter_requests_total', "OpenRouter 요청 수 (HTTP 상태별)")
+OPENROUTER_TOKENS = metrics.counter('nyanrss_openrouter_tokens_total', "OpenRouter 응답 usage 기준 토큰 사용량 (prompt/completion)")
+IMAGE_CACHE_LOOKUPS = metrics.counter('nyanrss_image_cache_lookups_total', "이미지 캐시 조회 결과 (url, content, miss)")
+DISCORD_MESSAGES = metrics.counter('nyanrss_discord_messages_total', "Discord로 보낸 메시지 수 (결과별)")
+WEBSUB_NOTIFICATIONS = metrics.counter('nyanrss_websub_notifications_total', "WebSub push 알림 수 (accepted, handed_off, busy, bad_signature, inactive, unknown)")
+SUMMARY_MODEL_REQUESTS = metrics.counter('nyanrss_summary_model_requests_total', "요약 모델별 요청 결과 (won, empty, failed, cancelled)")
+SUMMARY_MODEL_SECONDS = metrics.histogram('nyanrss_summary_model_seconds', "요약 모델별 응답 시간 (응답을 받은 요청만)")
+DISCORD_MESSAGE_EDITS = metrics.counter('nyanrss_discord_message_edits_total', "스트리밍 요약으로 고친 메시지 수 (결과별)")
+DISCORD_RATE_LIMITED = metrics.counter('nyanrss_discord_rate_limited_total', "Discord 429 응답 수")
+
+def queue_depth_samples():
+    samples = [({'queue': stage}, depth) for stage, depth in article_pipeline.depths().items()]
+    samples.append(({'queue': 'channel'}, sum(delivery.depth() for delivery in channel_deliveries.values())))
+    return samples
+
+def summary_cache_samples():
+    if summary_cache is None:
+        return []
+    return [({'result': 'hit'}, summary_cache.hits), ({'result': 'miss'}, summary_cache.misses)]
+
+metrics.gauge('nyanrss_queue_depth', "단계별 대기 중인 기사 수 (enrich, summarize, deliver, channel)", queue_depth_samples)
+metrics.gauge('nyanrss_summary_cache_lookups', "요약 캐시 조회 결과 누적 (hit, miss)", summary_cache_samples)
+metrics.gauge('nyanrss_summary_cache_hit_ratio', "요약 캐시 적중률",
+              lambda: [({}, summary_cache.hit_rate())] if summary_cache is not None else [])
+metrics.gauge('nyanrss_recent_articles', "처리 중 중복 판단 창에 있는 URL 수", lambda: [({}, len(recent_processed))])
+metrics.gauge('nyanrss_scheduled_feeds', "스케줄러가 관리하는 피드 수",
+              lambda: [({}, len(feed_scheduler))] if feed_scheduler is not None else [])
+
+stage_latency_hooks = [lambda stage, seconds: STAGE_SECONDS.observe(seconds, stage=stage)]  # (단계 이름, 소요 초)를 받는 콜백 목록
+
+def record_stage_latency(stage, seconds):
+    """처리 단계 하나에 걸린 시간을 등록된 콜백에 알립니다."""
+    for hook in stage_latency_hooks:
+        hook(stage, seconds)
+
+async def start_metrics_server(host, port):
+    """/metrics에서 Prometheus 형식 지표를 내보내는 HTTP 서버를 띄웁니다."""
+    async def handle_metrics(request):
+        return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8',
+                            headers={'X-Content-Type-Options': 'nosniff'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("지표 서버 시작: http://%s:%s/metrics", host, port)
+    return runner
+
+class OpenRouterHTTPError(Exception):
+    """OpenRouter가 오류 상태 코드를 반환했을 때 발생합니다."""
+
+    def __init__(self, status, text):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.text = text
+
+
+class HostUnavailable(Exception):
+    """회로가 열린 호스트로 요청하려 할 때 실제 요청 없이 바로 올리는 예외."""
+
+    def __init__(self, host, retry_in):
+        super().__init__(f"{host} 회로 열림 ({retry_in:.0f}초 뒤 재시도)")
+        self.host = host
+        self.retry_in = retry_in
+
+
+def is_host_failure_status(status):
+    """호스트 장애로 셀 HTTP 상태 코드인지 판단합니다 (5xx/408/429)."""
+    return status >= 500 or status in (408, 429)
+
+def is_host_failure(error):
+    """호스트 장애로 셀 예외인지 판단합니다. 연결 실패, 시간 초과, 5xx/408/429만 세고 그 밖의 4xx는 호스트가 멀쩡한 것으로 봅니다."""
+    if isinstance(error, (aiohttp.ClientResponseError, OpenRouterHTTPError)):
+        return is_host_failure_status(error.status)
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, OSError))
+
+
+class HostHealthTracker:
+    """호스트별 상태(오류율/지연 EWMA, 연속 실패 수)와 회로 차단기.
+
+    연속 실패가 failure_threshold번이거나 오류율 EWMA가 error_rate_threshold 이상이면 회로를 열고, open_seconds 동안은 요청을 보내지 않고 HostUnavailable을 올립니다.
+    그 뒤 요청 하나만 시험 삼아 보내(half-open) 성공하면 닫고, 실패하면 열린 시간을 두 배로 늘려(최대 max_open_seconds) 다시 엽니다.
+    """
+
+    ewma_alpha = 0.2
+    min_error_rate_samples = 10
+
+    def __init__(self, failure_threshold, error_rate_threshold, open_seconds, max_open_seconds):
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self._hosts = {}  # 호스트 -> 상태 dict
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = {
+                'error_rate': 0.0, 'latency': None, 'samples': 0, 'failures': 0,
+                'circuit': 'closed', 'open_for': 0.0, 'retry_at': 0.0,
+            }
+        return state
+
+    def retry_in(self, url):
+        """요청을 보낼 수 있을 때까지 남은 초. 회로가 닫혀 있거나 시험 요청을 보낼 때가 됐으면 0입니다."""
+        state = self._hosts.get(urlparse(url).netloc or url)
+        if state is None or state['circuit'] == 'closed':
+            return 0.0
+        return max(state['retry_at'] - time.monotonic(), 0.0)
+
+    def available(self, url):
+        return self.retry_in(url) <= 0
+
+    def check(self, url):
+        """상태를 바꾸지 않고 확인만 합니다. 장애 중이면 HostUnavailable을 올립니다 (대기열에서 기다리기 전에 바로 실패할 때 사용)."""
+        retry_in = self.retry_in(url)
+        if retry_in > 0:
+            raise HostUnavailable(urlparse(url).netloc or url, retry_in)
+
+    def acquire(self, host):
+        """요청 직전에 부릅니다. 회로가 열려 있으면 HostUnavailable, 시험 요청 차례면 half-open으로 바꿉니다."""
+        state = self._state(host)
+        if state['circuit'] == 'closed':
+            return
+        now = time.monotonic()
+        if now < state['retry_at']:
+            raise HostUnavailable(host, state['retry_at'] - now)
+        # 시험 요청 하나만 보내고, 결과가 오기 전까지 (또는 open_for가 지나기 전까지) 나머지는 계속 막음
+        state['circuit'] = 'half_open'
+        state['retry_at'] = now + state['open_for']
+
+    def record(self, host, ok, latency=None):
+        state = self._state(host)
+        state['samples'] += 1
+        state['error_rate'] += self.ewma_alpha * ((0.0 if ok else 1.0) - state['error_rate'])
+        if latency is not None:
+            state['latency'] = latency if state['latency'] is None else state['latency'] + self.ewma_alpha * (latency - state['latency'])
+        if ok:
+            state['failures'] = 0
+            if state['circuit'] != 'closed':
+                logger.info("호스트 %s 복구. 요청을 다시 보냅니다.", host)
+                state['circuit'] = 'closed'
+                state['open_for'] = 0.0
+            return
+        state['failures'] += 1
+        if state['circuit'] == 'half_open':
+            self._open(host, state, min(state['open_for'] * 2, self.max_open_seconds))
+        elif state['circuit'] == 'closed' and (
+                state['failures'] >= self.failure_threshold or
+                (state['samples'] >= self.min_error_rate_samples and state['error_rate'] >= self.error_rate_threshold)):
+            self._open(host, state, self.open_seconds)
+
+    def _open(self, host, state, open_for):
+        state['circuit'] = 'open'
+        state['open_for'] = open_for
+        state['retry_at'] = time.monotonic() + open_for
+        logger.warning("호스트 %s 장애 감지 (연속 실패 %s회, 오류율 %.0f%%). %.0f초 동안 요청을 보내지 않습니다.",
+                       host, state['failures'], state['error_rate'] * 100, open_for)
+
+    def track(self, url):
+        """요청 하나를 감싸는 with 블록을 반환합니다. 들어갈 때 회로를 확인하고, 나올 때 결과와 지연을 기록합니다."""
+        return HostRequest(self, urlparse(url).netloc or url)
+
+    def samples(self, field):
+        """지표용: 호스트별 값 (circuit는 0=closed, 1=half_open, 2=open)."""
+        circuit_values = {'closed': 0, 'half_open': 1, 'open': 2}
+        return [
+            ({'host': host}, circuit_values[state['circuit']] if field == 'circuit' else state[field])
+            for host, state in list(self._hosts.items())
+            if state[field] is not None
+        ]
+
+
+class HostRequest:
+    """HostHealthTracker.track()이 돌려주는 with 블록. 작업이 취소되면 아무것도 기록하지 않습니다.
+
+    예외 없이 끝나도 응답 상태가 장애에 해당하면 (재시도할 429 등) check_status()로 실패로 기록할 수 있습니다.
+    """
+
+    def __init__(self, tracker, host):
+        self.tracker = tracker
+        self.host = host
+        self.started = None
+        self.failed = False
+
+    def check_status(self, status):
+        if is_host_failure_status(status):
+            self.failed = True
+        return status
+
+    def __enter__(self):
+        self.tracker.acquire(self.host)
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and not issubclass(exc_type, Exception):
+            return False
+        ok = not self.failed and (exc is None or not is_host_failure(exc))
+        self.tracker.record(self.host, ok, time.monotonic() - self.started)
+        return False
+
+
+host_health = HostHealthTracker(HOST_FAILURE_THRESHOLD, HOST_ERROR_RATE_THRESHOLD, HOST_OPEN_SECONDS, HOST_MAX_OPEN_SECONDS)
+metrics.gauge('nyanrss_host_circuit_state', "호스트별 회로 상태 (0=closed, 1=half_open, 2=open)", lambda: host_health.samples('circuit'))
+metrics.gauge('nyanrss_host_error_rate', "호스트별 오류율 EWMA", lambda: host_health.samples('error_rate'))
+metrics.gauge('nyanrss_host_latency_seconds', "호스트별 응답 시간 EWMA", lambda: host_health.samples('latency'))
+
 
-def clean_html(raw_html):
-    if not raw_html: return ""
-    processed_html = re.sub('<br\s*/?>', '\n', raw_html, flags=re.IGNORECASE)
-    cleanr = re.compile('<.*?>')
-    cleantext = re.sub(cleanr, '', processed_html)
-    cleantext = ' '.join(cleantext.split())
-    return cleantext.strip()
+class RateLimiter:
+    """분당 요청 수와 분당 토큰 수를 함께 제한하는 토큰 버킷. 429의 Retry-After 동안은 모든 요청을 멈춥니다."""
 
-async def summarize_article(content, image_base64=None, image_media_type=None):
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_allowance = float(requests_per_minute)
+        self._token_allowance = float(tokens_per_minute)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        if self.requests_per_minute > 0:
+            self._request_allowance = min(self.requests_per_minute, self._request_allowance + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute > 0:
+            self._token_allowance = min(self.tokens_per_minute, self._token_allowance + elapsed * self.tokens_per_minute / 60)
+
+    def _wait_time(self, tokens):
+        wait = max(self._paused_until - time.monotonic(), 0)
+        if self.requests_per_minute > 0 and self._request_allowance < 1:
+            wait = max(wait, (1 - self._request_allowance) * 60 / self.requests_per_minute)
+        if self.tokens_per_minute > 0:
+            # 한 요청이 버킷 용량보다 크면 가득 찰 때까지만 기다림
+            needed = min(tokens, self.tokens_per_minute)
+            if self._token_allowance < needed:
+                wait = max(wait, (needed - self._token_allowance) * 60 / self.tokens_per_minute)
+        return wait
+
+    async def acquire(self, tokens):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = self._wait_time(tokens)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.requests_per_minute > 0:
+                self._request_allowance -= 1
+            if self.tokens_per_minute > 0:
+                self._token_allowance -= tokens
+
+    def adjust_tokens(self, delta):
+        """실제 사용량(usage)과 추정치의 차이를 버킷에 반영합니다."""
+        if self.tokens_per_minute > 0:
+            self._token_allowance -= delta
+
+    def pause(self, seconds):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def estimate_payload_tokens(payload):
+    """요청 토큰 수를 대략 추정합니다 (텍스트 4글자당 1토큰, 이미지 1장당 1000토큰, 응답 여유분 포함)."""
+    tokens = 400
+    for message in payload.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            tokens += len(content) // 4
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                tokens += len(part.get("text", "")) // 4
+            elif part.get("type") == "image_url":
+                tokens += 1000
+    return tokens
+
+def parse_retry_after(value, default=5.0):
+    """Retry-After 헤더(초 또는 HTTP 날짜)를 초 단위로 바꿉니다."""
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max((retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+openrouter_limiter = RateLimiter(OPENROUTER_REQUESTS_PER_MINUTE, OPENROUTER_TOKENS_PER_MINUTE)
+openrouter_session = None
+openrouter_semaphore = None
+webhook_session = None
+
+async def get_openrouter_session():
+    """keep-alive 연결을 재사용하는 OpenRouter 전용 세션을 처음 사용할 때 만듭니다."""
+    global openrouter_session, openrouter_semaphore
+    if openrouter_session is None or openrouter_session.closed:
+        connector = aiohttp.TCPConnector(limit=SUMMARY_CONCURRENCY, ttl_dns_cache=300)
+        openrouter_session = aiohttp.ClientSession(connector=connector)
+        openrouter_semaphore = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+    return openrouter_session
+
+async def get_webhook_session():
+    """Discord 웹훅 전송용 keep-alive 세션을 처음 사용할 때 만듭니다."""
+    global webhook_session
+    if webhook_session is None or webhook_session.closed:
+        connector = aiohttp.TCPConnector(ttl_dns_cache=300)
+        webhook_session = aiohttp.ClientSession(connector=connector, headers={'User-Agent': USER_AGENT})
+    return webhook_session
+
+async def close_http_sessions():
+    """공유 HTTP 세션을 닫습니다. 종료 시 호출합니다."""
+    await fetch_pool.close()
+    for session in (openrouter_session, webhook_session):
+        if session is not None and not session.closed:
+            await session.close()
+
+async def read_openrouter_stream(api_response, on_delta):
+    """OpenRouter SSE 응답을 읽으며 조각이 올 때마다 on_delta(지금까지의 전체 텍스트)를 부릅니다.
+
+    일반 응답과 같은 모양의 dict(choices, usage)를 반환하고, 스트림 도중 오류가 오면 choices 없이 error만 담습니다.
+    """
+    text = ''
+    usage = None
+    async for line in api_response.content:
+        line = line.strip()
+        # 빈 줄과 ': OPENROUTER PROCESSING' 같은 주석 줄은 건너뜀
+        if not line.startswith(b'data:'):
+            continue
+        data = line[5:].strip()
+        if data == b'[DONE]':
+            break
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            continue
+        if chunk.get('error'):
+            return {'choices': [], 'error': chunk['error']}
+        usage = chunk.get('usage') or usage
+        for choice in chunk.get('choices') or []:
+            delta = (choice.get('delta') or {}).get('content')
+            if delta:
+                text += delta
+                on_delta(text)
+    return {'choices': [{'message': {'content': text}}], 'usage': usage or {}}
+
+async def request_openrouter(payload, on_delta=None):
+    """OpenRouter chat completion을 호출하고 JSON 응답을 반환합니다.
+
+    동시 요청은 SUMMARY_CONCURRENCY개로, 속도는 openrouter_limiter로 제한합니다.
+    429는 Retry-After만큼 기다렸다가 OPENROUTER_MAX_RETRIES번까지 다시 시도하고, 그 밖의 HTTP 오류는 OpenRouterHTTPError로 올립니다.
+    OpenRouter 회로가 열려 있으면 요청 없이 HostUnavailable을 올립니다.
+    on_delta를 주면 스트리밍으로 요청해 생성되는 텍스트를 그때그때 넘깁니다.
+    """
+    api_headers = {
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "Content-Type": "application/json",
+    }
+    if on_delta is not None:
+        payload = dict(payload, stream=True)
+    session = await get_openrouter_session()
+    estimated_tokens = estimate_payload_tokens(payload)
+
+    for attempt in range(OPENROUTER_MAX_RETRIES + 1):
+        # 장애 중이면 레이트 리밋 대기 없이 바로 실패
+        host_health.check(OPENROUTER_API_URL)
+        await openrouter_limiter.acquire(estimated_tokens)
+        async with openrouter_semaphore:
+            with host_health.track(OPENROUTER_API_URL) as host_request:
+                async with session.post(
+                    OPENROUTER_API_URL,
+                    headers=api_headers,
+                    json=payload,
+                    timeout=aiohttp.ClientTimeout(total=60)
+                ) as api_response:
+                    OPENROUTER_REQUESTS.inc(status=api_response.status)
+                    if api_response.status == 429 and attempt < OPENROUTER_MAX_RETRIES:
+                        # 재시도하더라도 이번 요청은 호스트 실패로 기록
+                        host_request.check_status(api_response.status)
+                        retry_after = parse_retry_after(api_response.headers.get('Retry-After'))
+                        logger.warning("OpenRouter Rate Limit 감지. %.1f초 후 다시 시도합니다. (%s/%s)", retry_after, attempt + 1, OPENROUTER_MAX_RETRIES)
+                        openrouter_limiter.pause(retry_after)
+                        continue
+                    if api_response.status >= 400:
+                        raise OpenRouterHTTPError(api_response.status, await api_response.text())
+                    if on_delta is None:
+                        result = await api_response.json(content_type=None)
+                    else:
+                        result = await read_openrouter_stream(api_response, on_delta)
+
+        usage = result.get("usage") or {}
+        for kind in ('prompt', 'completion'):
+            if usage.get(f"{kind}_tokens"):
+                OPENROUTER_TOKENS.inc(usage[f"{kind}_tokens"], kind=kind)
+        if usage.get("total_tokens"):
+            openrouter_limiter.adjust_tokens(usage["total_tokens"] - estimated_tokens)
+        return result
+
+def completion_text(result):
+    """chat completion 응답의 첫 답 내용. 없으면 빈 문자열."""
+    choices = result.get("choices") or []
+    return ((choices[0].get("message") or {}).get("content") or "").strip() if choices else ""
+
+def summary_model_chain(content, image_base64=None):
+    """요약 요청을 보낼 모델 순서. SUMMARY_SHORT_ARTICLE_CHARS보다 짧은 본문(이미지 없음)은 보조 모델부터 씁니다."""
+    if (OPENROUTER_FALLBACK_MODELS and SUMMARY_SHORT_ARTICLE_CHARS > 0 and not image_base64
+            and len(content or "") < SUMMARY_SHORT_ARTICLE_CHARS):
+        return OPENROUTER_FALLBACK_MODELS + [OPENROUTER_MODEL]
+    return [OPENROUTER_MODEL] + OPENROUTER_FALLBACK_MODELS
+
+async def request_model_chain(payload, models, on_delta=None):
+    """같은 요청을 models 순서대로 보내고 (이긴 모델, 응답)을 반환합니다.
+
+    앞 요청이 실패하면 바로, SUMMARY_HEDGE_DELAY초 안에 답(스트리밍이면 첫 조각)이 없으면 다음 모델에도 겹쳐 보냅니다.
+    내용 있는 답이 먼저 온 쪽을 쓰고 나머지는 취소합니다. 모두 실패하면 빈 답이라도 받은 응답을, 그마저 없으면 마지막 오류를 올립니다.
+    스트리밍 조각은 먼저 조각을 보낸 모델 것만 넘기고, 그 모델이 실패하면 다음 모델이 이어받습니다.
+    """
+    remaining = list(models)
+    pending = {}  # task -> (모델, 보낸 시각)
+    stream = {'owner': None}
+    last_result = None
+    last_error = None
+
+    def forward(model):
+        def forward_delta(text):
+            if stream['owner'] is None:
+                stream['owner'] = model
+            if stream['owner'] == model:
+                on_delta(text)
+        return forward_delta if on_delta is not None else None
+
+    def launch():
+        model = remaining.pop(0)
+        pending[asyncio.ensure_future(request_openrouter(dict(payload, model=model), forward(model)))] = (model, time.monotonic())
+
+    launch()
+    try:
+        while pending:
+            hedge_delay = SUMMARY_HEDGE_DELAY if remaining and SUMMARY_HEDGE_DELAY > 0 and stream['owner'] is None else None
+            done, _ = await asyncio.wait(pending, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if stream['owner'] is not None:
+                    continue  # 기다리는 사이 스트리밍이 시작됨
+                logger.debug("요약 모델이 %.1f초 안에 답하지 않아 %s에도 요청합니다.", hedge_delay, remaining[0])
+                launch()
+                continue
+            for task in done:
+                model, sent_at = pending.pop(task)
+                if stream['owner'] == model:
+                    stream['owner'] = None
+                try:
+                    result = task.result()
+                except HostUnavailable:
+                    raise
+                except Exception as e:
+                    SUMMARY_MODEL_REQUESTS.inc(model=model, result='failed')
+                    logger.warning("요약 모델 %s 요청 실패 (%s): %s", model, type(e).__name__, e)
+                    last_error = e
+                    continue
+                SUMMARY_MODEL_SECONDS.observe(time.monotonic() - sent_at, model=model)
+                if completion_text(result):
+                    SUMMARY_MODEL_REQUESTS.inc(model=model, result='won')
+                    return model, result
+                SUMMARY_MODEL_REQUESTS.inc(model=model, result='empty')
+                last_result = (model, result)
+            if not pending and remaining:
+                launch()
+        if last_result is not None:
+            return last_result
+        raise last_error
+    finally:
+        for task, (model, _) in pending.items():
+            task.cancel()
+            SUMMARY_MODEL_REQUESTS.inc(model=model, result='cancelled')
+
+async def summarize_article(content, image_base64=None, image_media_type=None, on_delta=None):
+    """기사 본문/이미지를 요약합니다. on_delta를 주면 생성 중인 요약을 스트리밍으로 넘깁니다 (캐시 적중 시에는 부르지 않음).
+
+    모델은 summary_model_chain 순서로 request_model_chain이 고르며, 어느 모델이 답해도 같은 캐시 항목(기본 모델 기준)을 씁니다.
+    """
     if not OPENROUTER_API_KEY:
         return "OpenRouter API 키가 설정되지 않았습니다."
     if not content and not image_base64:
@@ -90,17 +1094,18 @@ async def summarize_article(content, image_base64=None, image_media_type=None):
     if content and len(content) < 30 and not image_base64:
         return "요약할 내용이 충분하지 않습니다."
 
+    cache = get_summary_cache()
+    cache_key = summary_cache_key(OPENROUTER_MODEL, content, image_base64)
+    cached_summary = await cache.get(cache_key)
+    if cached_summary is not None:
+        logger.debug("요약 캐시 적중 (적중률 %.1f%%)", cache.hit_rate() * 100)
+        return cached_summary
+
     try:
         user_content = []
 
         if content:
-            prompt = f"""너는 이제부터 기사 요약하는 고양이다냥! 다음 뉴스기사 내용과 이미지를 보고 한국어로 간결하게 5~7문장 이내로, 최대한 줄바꿈 없이, 반말(중요)로 요약해달라냥! 무조건 말 끝에 냥을 붙이고 고양이 이모티콘도 자주 쓰고 고양이답게 말투도 엄청 귀여워야 한다냥! 가능하다면 배경지식도 넣어서 요약해달라냥! 항상 요약은 냐옹!으로 시작하고 마지막에는 냥냥!으로 끝나야 한다냥!:
-
-        ---
-        {content[:1500] if content else "텍스트 내용 없음"}
-        ---
-
-        요약:"""
+            prompt = SUMMARY_PROMPT_TEMPLATE.format(content=content[:SUMMARY_CONTENT_LIMIT])
             user_content.append({"type": "text", "text": prompt})
 
         if image_base64:
@@ -112,516 +1117,3534 @@ async def summarize_article(content, image_base64=None, image_media_type=None):
             if not content:
                 user_content.insert(0, {
                     "type": "text",
-                    "text": "이 이미지를 보고 한국어로 간결하게 5~7문장 이내로, 최대한 줄바꿈 없이, 반말(중요)로 설명해달라냥! 무조건 말 끝에 냥을 붙이고 고양이 이모티콘도 자주 쓰고 고양이답게 말투도 엄청 귀여워야 한다냥! 항상 설명은 냐옹!으로 시작하고 마지막에는 냥냥!으로 끝나야 한다냥! 설명:"
+                    "text": IMAGE_ONLY_PROMPT
                 })
 
         if not user_content:
              return "API로 보낼 내용이 없습니다."
 
-        api_headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "Content-Type": "application/json",
-        }
-
         payload = {
-            "model": OPENROUTER_MODEL,
             "messages": [
                 {"role": "user", "content": user_content}
             ],
         }
 
-        def _call_api():
-            return requests.post(
-                OPENROUTER_API_URL,
-                headers=api_headers,
-                json=payload,
-                timeout=60
-            )
-
-        loop = asyncio.get_running_loop()
-        api_response = await loop.run_in_executor(None, _call_api)
-        api_response.raise_for_status()
-
-        result = api_response.json()
+        models = summary_model_chain(content, image_base64)
+        model, result = await request_model_chain(payload, models, on_delta)
+        if model != models[0]:
+            logger.debug("요약 모델 %s 대신 %s의 답을 사용합니다.", models[0], model)
 
         if not result.get("choices"):
-            print("경고: OpenRouter API 응답에 choices가 없습니다.")
+            logger.warning("OpenRouter API 응답에 choices가 없습니다.")
             if result.get("error"):
-                print(f"   API 에러: {result['error']}")
+                logger.error("API 에러: %s", result['error'])
             return "기사 요약 중 문제가 발생했습니다. (No choices)"
 
         summary = result["choices"][0]["message"]["content"].strip()
 
         if not summary:
-            print("경고: OpenRouter API가 빈 요약을 반환했습니다.")
+            logger.warning("OpenRouter API가 빈 요약을 반환했습니다.")
             return "기사 내용을 요약할 수 없습니다."
 
         summary = summary.replace('\u2018', "'").replace('\u2019', "'")
 
+        await cache.put(cache_key, summary)
         return summary
-    except requests.exceptions.HTTPError as e:
-        print(f"OpenRouter API HTTP 오류 발생: {e.response.status_code} - {e.response.text[:200]}")
-        if e.response.status_code == 400 and "image" in e.response.text.lower():
-             print("   -> 이미지 관련 API 오류일 수 있습니다. 이미지 형식이나 크기를 확인하세요.")
-             return f"이미지 처리 중 API 오류가 발생했습니다: HTTP {e.response.status_code}"
-        return f"기사 요약 중 API 오류가 발생했습니다: HTTP {e.response.status_code}"
+    except HostUnavailable:
+        # 요약을 미룰지는 호출하는 쪽에서 판단
+        raise
+    except OpenRouterHTTPError as e:
+        logger.error("OpenRouter API HTTP 오류 발생: %s - %s", e.status, e.text[:200])
+        if e.status == 400 and "image" in e.text.lower():
+             logger.warning("이미지 관련 API 오류일 수 있습니다. 이미지 형식이나 크기를 확인하세요.")
+             return f"이미지 처리 중 API 오류가 발생했습니다: HTTP {e.status}"
+        return f"기사 요약 중 API 오류가 발생했습니다: HTTP {e.status}"
     except Exception as e:
-        print(f"OpenRouter API 호출 중 오류 발생 ({type(e).__name__}): {e}")
+        logger.error("OpenRouter API 호출 중 오류 발생 (%s): %s", type(e).__name__, e)
         return f"기사 요약 중 API 오류가 발생했습니다: {type(e).__name__}"
 
-async def load_sent_articles(channel_id_str):
-    async with yaml_lock:
-        if os.path.exists(sent_articles_file):
-            try:
-                with open(sent_articles_file, "r", encoding='utf-8') as f:
-                    all_sent_data = yaml.safe_load(f) or {}
-                sent_articles = all_sent_data.get(channel_id_str, [])
-                if not isinstance(sent_articles, list):
-                    print(f"경고: 채널 {channel_id_str}의 sent_articles 데이터가 리스트가 아닙니다. 초기화합니다.")
-                    return []
-                print(f"채널 {channel_id_str}: 기존 {len(sent_articles)}개 기사 링크 로드됨")
-                return sent_articles
-            except yaml.YAMLError as e:
-                print(f"YAML 파일 파싱 오류 ({sent_articles_file}): {e}. 파일을 백업하고 새로 시작합니다.")
-                try:
-                    os.rename(sent_articles_file, f"{sent_articles_file}.bak_{int(time.time())}")
-                except OSError as backup_err:
-                    print(f"   오류: YAML 파일 백업 실패: {backup_err}")
-                return []
-            except Exception as e:
-                print(f"YAML 파일 로드 오류: {e}")
-                return []
-        else:
-            print("sent_articles.yaml 파일을 찾을 수 없어 새로 생성합니다.")
-            return []
-
-async def save_sent_article(channel_id_str, article_link):
-    async with yaml_lock:
+def parse_batch_summaries(text):
+    """일괄 요약 응답의 JSON에서 {기사 번호: 요약}을 꺼냅니다. 형식이 틀리면 빈 dict."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip('`')
+        if text.lower().startswith("json"):
+            text = text[4:]
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end <= start:
+        return {}
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    items = data.get("summaries") if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        return {}
+    summaries = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
         try:
-            all_sent_data = {}
-            if os.path.exists(sent_articles_file):
-                try:
-                    with open(sent_articles_file, "r", encoding='utf-8') as f:
-                        all_sent_data = yaml.safe_load(f) or {}
-                        if not isinstance(all_sent_data, dict):
-                            print(f"경고: {sent_articles_file} 파일 내용이 딕셔너리가 아닙니다. 새로 생성합니다.")
-                            all_sent_data = {}
-                except yaml.YAMLError as e:
-                       print(f"YAML 파일 파싱 오류 ({sent_articles_file}) 저장 시: {e}. 파일을 백업하고 새로 시작합니다.")
-                       try:
-                           os.rename(sent_articles_file, f"{sent_articles_file}.bak_{int(time.time())}")
-                       except OSError as backup_err:
-                           print(f"   오류: YAML 파일 백업 실패: {backup_err}")
-                       all_sent_data = {}
-
-            channel_key = str(channel_id_str)
-            channel_sent_list = all_sent_data.get(channel_key, [])
-            if not isinstance(channel_sent_list, list):
-                print(f"경고: 파일 저장 중 채널 {channel_key} 데이터가 리스트가 아님. 재생성.")
-                channel_sent_list = []
-
-            if article_link not in channel_sent_list:
-                   channel_sent_list.append(article_link)
-
-            if len(channel_sent_list) > max_keep:
-                original_count = len(channel_sent_list)
-                channel_sent_list = channel_sent_list[-max_keep:]
-                print(f"채널 {channel_key}: 오래된 기사 링크 정리 (파일 저장 시). {original_count} -> {len(channel_sent_list)}개 유지.")
-
-            all_sent_data[channel_key] = channel_sent_list
-
-            with open(sent_articles_file, "w", encoding='utf-8') as f:
-                yaml.dump(all_sent_data, f, default_flow_style=False, sort_keys=False, allow_unicode=True)
-            print(f"채널 {channel_key}: 기사 '{article_link}' 전송 완료 및 YAML 저장됨.")
-
-        except Exception as e:
-            print(f"sent_articles.yaml 파일 저장 중 오류 발생 (개별 저장): {e}")
+            article_number = int(item.get("id"))
+        except (TypeError, ValueError):
+            continue
+        summary = str(item.get("summary") or "").strip()
+        if summary:
+            summaries[article_number] = summary.replace('\u2018', "'").replace('\u2019', "'")
+    return summaries
 
-def normalize_url(url):
-    """URL을 정규화하여 중복을 방지합니다."""
-    # URL 파라미터와 프래그먼트 제거
-    normalized = url.split('?')[0].split('#')[0]
-    # 끝의 슬래시 제거
-    normalized = normalized.rstrip('/')
-    return normalized
+async def summarize_articles_batch(contents):
+    """텍스트만 있는 기사 여러 개를 한 번의 요청으로 요약합니다.
 
-def normalize_title(title):
-    """제목을 정규화하여 유사도 비교에 사용합니다."""
-    # HTML 엔티티 치환
-    title = title.replace('&#8216;', "'").replace('&#8217;', "'")
-    title = title.replace('&amp;', '&').replace('&lt;', '<').replace('&gt;', '>')
-    # 특수문자 제거하고 소문자로 변환
-    normalized = re.sub(r'[^\w\s]', ' ', title.lower())
-    # 여러 공백을 하나로 합치고 앞뒤 공백 제거
-    normalized = ' '.join(normalized.split())
-    return normalized
+    contents와 같은 순서의 리스트를 반환하며, 모델이 답하지 않은 기사는 None입니다 (호출 측에서 개별 요약으로 대체).
+    """
+    summaries = [None] * len(contents)
+    if not OPENROUTER_API_KEY:
+        return summaries
 
-def calculate_title_similarity(title1, title2):
-    """두 제목의 유사도를 계산합니다 (0.0 ~ 1.0)."""
-    if len(title1) < 5 or len(title2) < 5:
-        return 0.0
-    
-    words1 = set(title1.split())
-    words2 = set(title2.split())
-    
-    if not words1 or not words2:
-        return 0.0
-    
-    # 자카드 유사도 계산
-    intersection = words1 & words2
-    union = words1 | words2
-    
-    return len(intersection) / len(union)
+    cache = get_summary_cache()
+    cache_keys = [summary_cache_key(OPENROUTER_MODEL, content) for content in contents]
+    missing = []
+    for index, cache_key in enumerate(cache_keys):
+        summaries[index] = await cache.get(cache_key)
+        if summaries[index] is None:
+            missing.append(index)
+    if len(missing) < 2:
+        return summaries
 
-async def fetch_feed(channel, site_colors, current_rss_feeds):
-    channel_id_str = str(channel.id)
-    sent_articles = await load_sent_articles(channel_id_str)
-    sent_articles_set = set(sent_articles)
-    
-    # 현재 세션에서 처리된 기사들을 추적 (중복 방지)
-    current_session_processed = set()
-    current_session_titles = {}  # URL -> 정규화된 제목
+    articles_text = "\n\n".join(
+        f"[기사 {number}]\n---\n{contents[index][:SUMMARY_CONTENT_LIMIT]}\n---"
+        for number, index in enumerate(missing, start=1)
+    )
+    payload = {
+        "model": OPENROUTER_MODEL,
+        "messages": [
+            {"role": "user", "content": [{"type": "text", "text": SUMMARY_BATCH_PROMPT.format(articles=articles_text)}]}
+        ],
+        "response_format": {"type": "json_object"},
+    }
 
-    new_articles_processed_count = 0
+    try:
+        logger.debug("OpenRouter API로 기사 %s개 일괄 요약 요청 중...", len(missing))
+        summary_start_time = time.monotonic()
+        result = await request_openrouter(payload)
+        choices = result.get("choices") or []
+        reply = choices[0]["message"]["content"] if choices else ""
+        answered = parse_batch_summaries(reply or "")
+        logger.debug("일괄 요약 완료 (%s/%s개). 소요 시간: %.2f초", len(answered), len(missing), time.monotonic() - summary_start_time)
+    except HostUnavailable:
+        return summaries
+    except Exception as e:
+        logger.warning("OpenRouter 일괄 요약 중 오류 발생 (%s): %s. 개별 요약으로 대체합니다.", type(e).__name__, e)
+        return summaries
 
-    for rss_feed_url in current_rss_feeds:
-        if not rss_feed_url: continue
+    for number, index in enumerate(missing, start=1):
+        summary = answered.get(number)
+        if summary:
+            summaries[index] = summary
+            await cache.put(cache_keys[index], summary)
+    return summaries
 
-        print(f"채널 {channel_id_str}: '{rss_feed_url}' 피드 파싱 중...")
-        feed_start_time = time.monotonic()
-        try:
-            feed = feedparser.parse(rss_feed_url, agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36 NyanRSS/1.0')
-            if feed.bozo and isinstance(feed.bozo_exception, (feedparser.CharacterEncodingOverride, feedparser.NonXMLContentType)):
-                   print(f"   경고: '{rss_feed_url}' 파싱 경고: {feed.bozo_exception}")
-            elif feed.bozo:
-                   raise feed.bozo_exception
-        except Exception as e:
-            print(f"   오류: '{rss_feed_url}' 피드 파싱 중 심각한 오류: {e}")
-            continue
-        parse_duration = time.monotonic() - feed_start_time
-        print(f"   파싱 완료 ({len(feed.entries)}개 항목). 소요 시간: {parse_duration:.2f}초")
+def open_state_db(path):
+    """상태 저장용 SQLite 연결을 엽니다. 여러 저장소가 같은 파일을 WAL 모드로 공유합니다."""
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
 
-        if not feed.entries:
-            print(f"   '{rss_feed_url}' 피드에 항목이 없습니다.")
-            continue
 
-        for entry in feed.entries:
-            article_id = getattr(entry, 'link', None)
-            if not article_id:
-                   article_id = getattr(entry, 'id', None)
-            if not article_id:
-                   print(f"   경고: 링크 또는 ID 없는 항목 발견. 건너뜁니다. (제목: {getattr(entry, 'title', 'N/A')})")
-                   continue
+class FeedStateStore:
+    """피드별 상태(ETag, Last-Modified, 본문 해시 등)를 재시작 후에도 유지하는 저장소.
 
-            # URL 정규화
-            normalized_url = normalize_url(article_id)
-            
-            # 이미 처리된 기사인지 확인 (원본 URL과 정규화된 URL 모두 확인)
-            if (article_id in sent_articles_set or 
-                normalized_url in sent_articles_set or
-                article_id in current_session_processed or 
-                normalized_url in current_session_processed):
-                print(f"   이미 처리된 항목: {article_id}")
-                continue
+    메모리 상태는 이벤트 루프에서 바로 바꾸고, SQLite 저장은 기본 executor에서 합니다 (샤딩 모드에서는 다른 프로세스와 같은 파일을 씀).
+    """
 
-            # 제목 기반 중복 체크
-            article_title = getattr(entry, 'title', '제목 없음').strip()
-            normalized_title = normalize_title(article_title)
-            
-            # 현재 세션에서 유사한 제목이 있는지 확인
-            is_duplicate = False
-            for processed_url, processed_title in current_session_titles.items():
-                similarity = calculate_title_similarity(normalized_title, processed_title)
-                if similarity > 0.8:  # 80% 이상 유사하면 중복으로 간주
-                    print(f"   유사한 제목의 기사 이미 처리됨 (유사도: {similarity:.2f}): {article_title}")
-                    is_duplicate = True
-                    break
-            
-            if is_duplicate:
-                continue
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = open_state_db(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS feed_state ("
+            " feed_url TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._states = {}
+        for feed_url, state_json in self._conn.execute("SELECT feed_url, state FROM feed_state"):
+            try:
+                self._states[feed_url] = json.loads(state_json)
+            except ValueError:
+                logger.warning("'%s' 피드 상태를 읽을 수 없어 초기화합니다.", feed_url)
 
-            new_articles_processed_count += 1
-            print(f"   >> 새 기사 발견: '{article_title}' ({rss_feed_url})")
-            
-            # 현재 세션 처리 목록에 추가
-            current_session_processed.add(article_id)
-            current_session_processed.add(normalized_url)
-            current_session_titles[article_id] = normalized_title
-
-            article_content = getattr(entry, 'summary', getattr(entry, 'description', ""))
-            article_content_text = clean_html(article_content)
-
-            image_url = None
-            if hasattr(entry, 'enclosures'):
-                for enclosure in entry.enclosures:
-                    if enclosure.get('type', '').startswith('image/'):
-                        image_url = enclosure.get('href')
-                        if image_url:
-                            print(f"       이미지 발견 (enclosure): {image_url[:50]}...")
-                            break
-            if not image_url and hasattr(entry, 'media_thumbnail') and entry.media_thumbnail:
-                if isinstance(entry.media_thumbnail, list) and len(entry.media_thumbnail) > 0:
-                    thumb_info = entry.media_thumbnail[0]
-                    if isinstance(thumb_info, dict) and 'url' in thumb_info:
-                        image_url = thumb_info['url']
-                        if image_url:
-                            print(f"       이미지 발견 (media_thumbnail): {image_url[:50]}...")
-            if not image_url and hasattr(entry, 'media_content') and entry.media_content:
-                if isinstance(entry.media_content, list) and len(entry.media_content) > 0:
-                    for media_item in entry.media_content:
-                        if isinstance(media_item, dict) and 'url' in media_item:
-                            potential_url = media_item['url']
-                            is_image = False
-                            if media_item.get('type', '').startswith('image/'): is_image = True
-                            elif media_item.get('medium') == 'image': is_image = True
-                            elif potential_url and media_item.get('width') and int(media_item['width']) > 200:
-                                   is_image = True
-
-                            if is_image and potential_url:
-                                image_url = potential_url
-                                print(f"       이미지 발견 (media_content): {image_url[:50]}...")
-                                break
-
-            image_base64 = None
-            image_media_type = None
-            if image_url:
-                try:
-                    print(f"       이미지 다운로드 시도: {image_url}")
-                    img_headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36 NyanRSS/1.0'}
-                    img_response = requests.get(image_url, headers=img_headers, stream=True, timeout=10)
-                    img_response.raise_for_status()
-                    image_media_type = img_response.headers.get('Content-Type', 'image/jpeg').split(';')[0].strip()
-                    image_base64 = base64.b64encode(img_response.content).decode('utf-8')
-                    print(f"       이미지 로드 성공: {image_media_type}, {len(img_response.content)} bytes")
-                except requests.exceptions.RequestException as req_err:
-                    print(f"       오류: 이미지 다운로드 실패 ({image_url}): {req_err}")
-                    image_url = None
-                except Exception as img_err:
-                    print(f"       오류: 이미지 처리 중 예상치 못한 오류 ({image_url}): {img_err}")
-                    image_url = None
-
-            summary = "요약 정보를 가져올 수 없었습니다."
-            if article_content_text or image_base64:
-                print("       OpenRouter API로 요약 요청 중...")
-                summary_start_time = time.monotonic()
-                summary = await summarize_article(article_content_text, image_base64, image_media_type)
-                summary_duration = time.monotonic() - summary_start_time
-                print(f"       요약 완료. 소요 시간: {summary_duration:.2f}초")
-            else:
-                print("       요약할 내용이나 이미지가 없어 API 호출을 건너뜁니다.")
-                summary = "기사 본문 내용이나 이미지가 없어 요약할 수 없습니다."
+    def get(self, feed_url):
+        return self._states.get(feed_url, {})
 
+    def reload(self, feed_url):
+        """다른 프로세스가 바꿨을 수 있는 피드 상태를 파일에서 다시 읽습니다."""
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM feed_state WHERE feed_url = ?", (feed_url,)).fetchone()
+        if row is not None:
             try:
-                embed_color = Color.blue()
-                parsed_uri = urlparse(rss_feed_url)
-                base_url = f"{parsed_uri.scheme}://{parsed_uri.netloc}"
-                hex_color_str = site_color_map.get(rss_feed_url) or site_color_map.get(base_url)
+                self._states[feed_url] = json.loads(row[0])
+            except ValueError:
+                logger.warning("'%s' 피드 상태를 읽을 수 없어 기존 상태를 유지합니다.", feed_url)
+        return self.get(feed_url)
 
-                if hex_color_str:
-                    try:
-                        color_value = int(hex_color_str.lstrip('#'), 16)
-                        embed_color = Color(color_value)
-                    except ValueError:
-                        print(f"   경고: '{rss_feed_url}'에 대한 HEX 코드 '{hex_color_str}' 변환 실패. 기본 색상 사용.")
-
-                embed = Embed(
-                    title=f"{EMOJI} {article_title}",
-                    url=article_id,
-                    color=embed_color
-                )
+    async def update(self, feed_url, **changes):
+        state = dict(self._states.get(feed_url, {}))
+        state.update(changes)
+        self._states[feed_url] = state
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._store, feed_url)
+        except sqlite3.Error as e:
+            logger.warning("'%s' 피드 상태 저장 중 오류 발생: %s", feed_url, e)
+        return state
 
-                summary_to_display = summary
-                max_summary_length = 1024
-                if len(summary) > max_summary_length:
-                    cutoff = max_summary_length - len("... (내용 축약됨)")
-                    summary_to_display = f"{summary[:cutoff]}... (내용 축약됨)"
-                    print("       경고: 요약 내용이 너무 길어 Embed 필드에서 잘렸습니다.")
+    def _store(self, feed_url):
+        with self._lock:
+            # 저장이 겹쳐도 늦게 끝난 쪽이 예전 상태를 덮어쓰지 않도록 잠금 안에서 최신 상태를 씀
+            state = self._states.get(feed_url, {})
+            self._conn.execute(
+                "INSERT OR REPLACE INTO feed_state (feed_url, state, updated_at) VALUES (?, ?, ?)",
+                (feed_url, json.dumps(state, ensure_ascii=False), time.time())
+            )
 
-                if summary:
-                    embed.add_field(name="AI 냥냥 요약!", value=summary_to_display, inline=False)
+    def close(self):
+        with self._lock:
+            self._conn.close()
 
-                if image_url:
-                    embed.set_image(url=image_url)
-                    print(f"최종 선택된 이미지 URL (Embed용): {image_url}")
-                else:
-                    print("       이 항목에서 이미지를 찾지 못했거나 로드에 실패했습니다.")
 
-                published_dt = None
-                if hasattr(entry, 'published_parsed') and entry.published_parsed:
-                    try:
-                        published_dt = datetime.datetime(*entry.published_parsed[:6], tzinfo=datetime.timezone.utc)
-                        kst = datetime.timezone(datetime.timedelta(hours=9))
-                        published_dt_kst = published_dt.astimezone(kst)
-                        embed.timestamp = published_dt_kst
-                    except Exception as e:
-                        print(f"       발행 시각 변환 오류: {e}")
-                        embed.timestamp = utils.utcnow()
-                else:
-                    embed.timestamp = utils.utcnow()
+class PipelineJournal:
+    """처리 중인 기사의 파이프라인 상태를 남기는 선행 기록(write-ahead journal).
 
-                feed_title = getattr(feed.feed, 'title', rss_feed_url)
-                embed.set_footer(text=f"{feed_title}에서 불러온 정보다냥!")
+    발견 시 기사 정보와 전달 대상 채널 ID를, 요약이 끝나면 요약을 기록하고, 모든 채널 전달이 끝나면 지웁니다.
+    채널별 전달 완료는 전송 기록 저장소가 담당하므로, 재시작 후 남은 항목을 다시 보면 어디까지 끝났는지 알 수 있습니다.
+    항목마다 기록한 워커 ID를 남겨, 여러 프로세스가 같은 파일을 써도 멈춘 워커의 항목만 넘겨받습니다.
+    """
 
-                await channel.send(embed=embed)
-                print("       >> Embed 전송 성공.")
+    journaled_fields = ('id', 'normalized_url', 'title', 'feed_url', 'feed_title', 'content',
+                        'image_url', 'published_parsed', 'summary')
 
-                # 전송 성공 후에만 저장 (메모리와 파일 동기화 보장)
-                await save_sent_article(channel_id_str, article_id)
-                sent_articles_set.add(article_id)
-                sent_articles_set.add(normalized_url)  # 정규화된 URL도 추가
+    def __init__(self, path, worker_id):
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._conn = open_state_db(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pipeline_journal ("
+            " article_id TEXT PRIMARY KEY,"
+            " stage TEXT NOT NULL,"
+            " article TEXT NOT NULL,"
+            " channel_ids TEXT NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " worker_id TEXT NOT NULL DEFAULT '')"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(pipeline_journal)")]
+        if 'worker_id' not in columns:
+            self._conn.execute("ALTER TABLE pipeline_journal ADD COLUMN worker_id TEXT NOT NULL DEFAULT ''")
 
-                await asyncio.sleep(1.5)
+    def _write(self, article, stage):
+        record = journal_record(article, self.journaled_fields)
+        channel_ids = [state['id_str'] for state in article['pending_states']]
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pipeline_journal (article_id, stage, article, channel_ids, updated_at, worker_id)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (article['id'], stage, json.dumps(record, ensure_ascii=False), json.dumps(channel_ids), time.time(),
+                 self.worker_id)
+            )
 
-            except discord.Forbidden:
-                print("   오류: 채널에 메시지(Embed)를 보낼 권한이 없습니다.")
-            except discord.HTTPException as e:
-                print(f"   오류: 채널 메시지(Embed) 전송 중 Discord API 오류: {e.status} - {e.text}")
-                if e.status == 429:
+    def record_discovered(self, article):
+        self._write(article, 'discovered')
+
+    def record_summarized(self, article):
+        self._write(article, 'summarized')
+
+    def forget(self, article_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM pipeline_journal WHERE article_id = ?", (article_id,))
+
+    def adopt(self, keep_workers=()):
+        """keep_workers가 아닌 워커(지난 실행이나 멈춘 워커)가 남긴 항목을 이 워커 몫으로 넘겨받습니다.
+
+        넘겨받은 항목을 (단계, 기사 정보, 채널 ID 목록)으로 기록 순서대로 반환합니다.
+        """
+        keep = list(keep_workers)
+        condition = f"worker_id NOT IN ({','.join('?' * len(keep))})" if keep else "1"
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    f"SELECT stage, article, channel_ids FROM pipeline_journal WHERE {condition} ORDER BY updated_at", keep
+                ).fetchall()
+                self._conn.execute(f"UPDATE pipeline_journal SET worker_id = ? WHERE {condition}", [self.worker_id] + keep)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        entries = []
+        for stage, article_json, channel_ids_json in rows:
+            try:
+                entries.append((stage, json.loads(article_json), json.loads(channel_ids_json)))
+            except ValueError:
+                logger.warning("읽을 수 없는 파이프라인 기록을 건너뜁니다.")
+        return entries
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_pipeline_journal():
+    """파이프라인 기록을 처음 사용할 때 엽니다."""
+    global pipeline_journal
+    if pipeline_journal is None:
+        pipeline_journal = PipelineJournal(state_db_file, SHARD_WORKER_ID)
+    return pipeline_journal
+
+async def journal_write(method, *args):
+    """파이프라인 기록을 기본 executor에서 씁니다. 기록에 실패해도 기사 처리는 계속합니다 (재시작 때 그 기사만 이어받지 못함)."""
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, method, *args)
+    except sqlite3.Error as e:
+        logger.error("파이프라인 기록 중 오류 발생: %s", e)
+
+def journal_record(article, fields):
+    """기사에서 JSON으로 저장할 필드만 골라냅니다."""
+    record = {field: article.get(field) for field in fields}
+    if record.get('published_parsed') is not None:
+        record['published_parsed'] = list(record['published_parsed'])
+    return record
+
+
+def ring_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """가상 노드를 둔 일관된 해시 링. 워커가 늘거나 줄어도 그 워커 몫의 키만 다른 워커로 옮겨갑니다."""
+
+    def __init__(self, nodes, virtual_nodes):
+        self.nodes = tuple(sorted(nodes))
+        points = sorted((ring_hash(f"{node}#{index}"), node) for node in self.nodes for index in range(virtual_nodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key):
+        if not self._hashes:
+            return None
+        return self._owners[bisect.bisect(self._hashes, ring_hash(key)) % len(self._hashes)]
+
+
+class ShardCoordinator:
+    """여러 봇 프로세스가 같은 SQLite 파일로 피드와 채널을 나눠 맡도록 조정합니다.
+
+    워커는 lease_ttl/3마다 하트비트를 남기고, 살아 있는 워커로 만든 해시 링에서 자기 몫인 피드/채널만 처리합니다.
+    처리하는 동안에는 임대(lease)를 잡아 두 워커가 같은 대상을 동시에 처리하지 않게 하고,
+    워커가 멈추면 하트비트와 임대가 만료된 뒤 링의 다음 워커가 넘겨받습니다.
+    heartbeat/owns/claim/release/close를 같은 의미로 구현하면 다른 공유 저장소로 바꿀 수 있습니다.
+    """
+
+    ingest_roles = ('all', 'ingest')
+    deliver_roles = ('all', 'deliver')
+
+    def __init__(self, path, worker_id, role, lease_ttl, virtual_nodes=64):
+        self.worker_id = worker_id
+        self.role = role
+        self.lease_ttl = lease_ttl
+        self.virtual_nodes = virtual_nodes
+        self.rings = {'feed': HashRing((), virtual_nodes), 'channel': HashRing((), virtual_nodes)}
+        self._workers = frozenset()
+        self._held = set()  # 이 워커가 잡고 있는 임대 (하트비트 때 연장)
+        self._lock = threading.Lock()
+        self._conn = open_state_db(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shard_workers ("
+            " worker_id TEXT PRIMARY KEY,"
+            " role TEXT NOT NULL,"
+            " heartbeat_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shard_leases ("
+            " resource TEXT PRIMARY KEY,"
+            " worker_id TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+
+    def heartbeat(self):
+        """하트비트를 남기고 잡은 임대를 연장한 뒤, 살아 있는 워커로 해시 링을 다시 만듭니다. 링 구성이 바뀌면 True."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO shard_workers (worker_id, role, heartbeat_at) VALUES (?, ?, ?)",
+                    (self.worker_id, self.role, now)
+                )
+                self._conn.executemany(
+                    "UPDATE shard_leases SET expires_at = ? WHERE resource = ? AND worker_id = ?",
+                    [(now + self.lease_ttl, resource, self.worker_id) for resource in self._held]
+                )
+                self._conn.execute("DELETE FROM shard_workers WHERE heartbeat_at < ?", (now - self.lease_ttl,))
+                self._conn.execute("DELETE FROM shard_leases WHERE expires_at < ?", (now,))
+                rows = self._conn.execute("SELECT worker_id, role FROM shard_workers").fetchall()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._workers = frozenset(worker_id for worker_id, _ in rows)
+        changed = False
+        for ring, roles in (('feed', self.ingest_roles), ('channel', self.deliver_roles)):
+            nodes = tuple(sorted(worker_id for worker_id, role in rows if role in roles))
+            if nodes != self.rings[ring].nodes:
+                self.rings[ring] = HashRing(nodes, self.virtual_nodes)
+                changed = True
+        return changed
+
+    def live_workers(self):
+        """마지막 하트비트 때 살아 있던 워커 ID 집합."""
+        return self._workers
+
+    def owns(self, ring, key):
+        return self.rings[ring].owner(str(key)) == self.worker_id
+
+    def claim(self, ring, key):
+        """해시 링에서 자기 몫이면 임대를 잡거나 연장합니다.
+
+        다른 워커의 임대가 아직 유효하면 링이 바뀌었더라도 만료될 때까지 넘겨받지 않습니다.
+        """
+        if not self.owns(ring, key):
+            return False
+        resource = f"{ring}:{key}"
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT worker_id, expires_at FROM shard_leases WHERE resource = ?", (resource,)
+                ).fetchone()
+                held_elsewhere = row is not None and row[0] != self.worker_id and row[1] > now
+                if not held_elsewhere:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO shard_leases (resource, worker_id, expires_at) VALUES (?, ?, ?)",
+                        (resource, self.worker_id, now + self.lease_ttl)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            if held_elsewhere:
+                return False
+            if row is not None and row[0] != self.worker_id:
+                logger.info("샤딩: 만료된 임대 '%s'를 워커 %s에게서 넘겨받았습니다.", resource, row[0])
+            self._held.add(resource)
+        return True
+
+    def release(self, ring, key):
+        resource = f"{ring}:{key}"
+        with self._lock:
+            self._held.discard(resource)
+            self._conn.execute(
+                "DELETE FROM shard_leases WHERE resource = ? AND worker_id = ?", (resource, self.worker_id)
+            )
+
+    def close(self):
+        """정상 종료 시 하트비트와 임대를 지워 다른 워커가 만료를 기다리지 않고 바로 넘겨받게 합니다."""
+        with self._lock:
+            self._conn.execute("DELETE FROM shard_leases WHERE worker_id = ?", (self.worker_id,))
+            self._conn.execute("DELETE FROM shard_workers WHERE worker_id = ?", (self.worker_id,))
+            self._conn.close()
+
+
+class DeliveryOutbox:
+    """수집 전용 워커가 요약까지 마친 기사를 전달 워커에게 넘기는 SQLite 대기열. 채널마다 한 행을 둡니다."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = open_state_db(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS delivery_outbox ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " channel_id TEXT NOT NULL,"
+            " article_id TEXT NOT NULL,"
+            " article TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " UNIQUE (channel_id, article_id))"
+        )
+
+    def put(self, channel_id_str, article):
+        record = journal_record(article, PipelineJournal.journaled_fields)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO delivery_outbox (channel_id, article_id, article, created_at) VALUES (?, ?, ?, ?)",
+                (channel_id_str, article['id'], json.dumps(record, ensure_ascii=False), time.time())
+            )
+
+    def channels(self):
+        """전달을 기다리는 행이 있는 채널 ID 목록."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT channel_id FROM delivery_outbox")]
+
+    def pending(self, channel_id_str, limit):
+        """채널의 대기 행을 (순번, 기사 정보)로 넣은 순서대로 반환합니다."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, article FROM delivery_outbox WHERE channel_id = ? ORDER BY seq LIMIT ?",
+                (channel_id_str, limit)
+            ).fetchall()
+        entries = []
+        for seq, article_json in rows:
+            try:
+                entries.append((seq, json.loads(article_json)))
+            except ValueError:
+                logger.warning("읽을 수 없는 outbox 행(%s)을 지웁니다.", seq)
+                self.remove(seq)
+        return entries
+
+    def remove(self, seq):
+        with self._lock:
+            self._conn.execute("DELETE FROM delivery_outbox WHERE seq = ?", (seq,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_shard_coordinator():
+    """SHARD_ROLE이 설정되어 있으면 샤딩 조정자를 처음 사용할 때 만듭니다. 샤딩하지 않으면 None."""
+    global shard_coordinator
+    if shard_coordinator is None and SHARD_ROLE:
+        shard_coordinator = ShardCoordinator(state_db_file, SHARD_WORKER_ID, SHARD_ROLE, SHARD_LEASE_TTL, SHARD_VIRTUAL_NODES)
+    return shard_coordinator
+
+def get_delivery_outbox():
+    """전달 outbox를 처음 사용할 때 엽니다."""
+    global delivery_outbox
+    if delivery_outbox is None:
+        delivery_outbox = DeliveryOutbox(state_db_file)
+    return delivery_outbox
+
+
+class SummaryCache:
+    """내용 해시 기반 요약 캐시. 최근 항목은 메모리 LRU에, 전체는 SQLite에 두고 TTL/개수 제한으로 정리합니다.
+
+    메모리 LRU는 이벤트 루프에서만 다루고, SQLite 조회/저장/정리는 기본 executor에서 합니다.
+    적중 시 사용 시각은 메모리에 모았다가 저장이나 정리 때 한 번에 씁니다. SQLite 오류는 캐시 미스로 처리합니다.
+    """
+
+    def __init__(self, path, max_entries, ttl, memory_entries=512, prune_every=100):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.prune_every = prune_every
+        self.hits = 0
+        self.misses = 0
+        self._memory = collections.OrderedDict()
+        self._touched = {}  # 캐시 키 -> 아직 쓰지 않은 사용 시각
+        self._puts_since_prune = 0
+        self._lock = threading.Lock()
+        self._conn = open_state_db(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summary_cache ("
+            " cache_key TEXT PRIMARY KEY,"
+            " summary TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_summary_cache_last_used ON summary_cache (last_used)"
+        )
+
+    def _remember(self, cache_key, summary, created_at):
+        self._memory[cache_key] = (summary, created_at)
+        self._memory.move_to_end(cache_key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _take_touched(self):
+        touched, self._touched = self._touched, {}
+        return touched
+
+    async def get(self, cache_key):
+        now = time.time()
+        entry = self._memory.get(cache_key)
+        if entry is None:
+            try:
+                entry = await asyncio.get_running_loop().run_in_executor(None, self._load, cache_key)
+            except sqlite3.Error as e:
+                logger.warning("요약 캐시 조회 중 오류 발생: %s", e)
+        if entry is None or now - entry[1] > self.ttl:
+            self.misses += 1
+            return None
+        self._remember(cache_key, *entry)
+        self._touched[cache_key] = now
+        self.hits += 1
+        return entry[0]
+
+    async def put(self, cache_key, summary):
+        now = time.time()
+        self._remember(cache_key, summary, now)
+        self._puts_since_prune += 1
+        prune = self._puts_since_prune >= self.prune_every
+        if prune:
+            self._puts_since_prune = 0
+        touched = self._take_touched()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._store, cache_key, summary, now, touched, prune)
+        except sqlite3.Error as e:
+            logger.warning("요약 캐시 저장 중 오류 발생: %s", e)
+
+    def _load(self, cache_key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, created_at FROM summary_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def _store(self, cache_key, summary, now, touched, prune):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summary_cache (cache_key, summary, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (cache_key, summary, now, now)
+            )
+            self._write_touched(touched)
+        if prune:
+            self.prune()
+
+    def _write_touched(self, touched):
+        if touched:
+            self._conn.executemany(
+                "UPDATE summary_cache SET last_used = ? WHERE cache_key = ?",
+                [(used_at, cache_key) for cache_key, used_at in touched.items()]
+            )
+
+    def prune(self):
+        with self._lock:
+            expired = self._conn.execute(
+                "DELETE FROM summary_cache WHERE created_at < ?", (time.time() - self.ttl,)
+            ).rowcount
+            overflow = self._conn.execute(
+                "DELETE FROM summary_cache WHERE cache_key NOT IN ("
+                " SELECT cache_key FROM summary_cache ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,)
+            ).rowcount
+        if expired or overflow:
+            logger.info("요약 캐시 정리: 만료 %s개, 용량 초과 %s개 삭제 (적중률 %.1f%%)", expired, overflow, self.hit_rate() * 100)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self):
+        with self._lock:
+            try:
+                self._write_touched(self._take_touched())
+            except sqlite3.Error as e:
+                logger.warning("요약 캐시 사용 시각 저장 중 오류 발생: %s", e)
+            self._conn.close()
+
+
+def summary_cache_key(model, content, image_base64=None):
+    """(모델, 프롬프트 템플릿, 잘린 본문, 이미지 다이제스트)로 요약 캐시 키를 만듭니다."""
+    template_digest = hashlib.sha256((SUMMARY_PROMPT_TEMPLATE + SUMMARY_BATCH_PROMPT + IMAGE_ONLY_PROMPT).encode('utf-8')).hexdigest()
+    image_digest = hashlib.sha256(image_base64.encode('ascii')).hexdigest() if image_base64 else ""
+    key_material = json.dumps(
+        [model, template_digest, (content or "")[:SUMMARY_CONTENT_LIMIT], image_digest],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(key_material.encode('utf-8')).hexdigest()
+
+
+class SqliteSentArticleStore:
+    """SQLite 기반 전송 기록 저장소. 채널별 기록은 처음 필요할 때 메모리 set으로 올려 O(1)로 조회합니다.
+
+    add()는 executor 스레드에서 불리므로 메모리 set의 생성/교체/삭제도 SQLite와 같은 잠금 안에서 합니다.
+    """
+
+    def __init__(self, path, keep=max_keep, trim_every=200):
+        self.path = path
+        self.keep = keep
+        self.trim_every = trim_every
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._last_seq = {}
+        self._inserts_since_trim = {}
+        self._conn = open_state_db(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sent_articles ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " channel_id TEXT NOT NULL,"
+            " link TEXT NOT NULL,"
+            " sent_at REAL NOT NULL,"
+            " UNIQUE (channel_id, link))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sent_articles_channel_seq ON sent_articles (channel_id, seq)"
+        )
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM sent_articles LIMIT 1").fetchone() is None
+
+    def load_channel(self, channel_id_str):
+        cached = self._cache.get(channel_id_str)
+        if cached is not None:
+            return cached
+        with self._lock:
+            return self._load_channel_locked(channel_id_str)
+
+    def _load_channel_locked(self, channel_id_str):
+        # 잠금을 기다리는 동안 다른 스레드가 먼저 불러왔을 수 있음
+        cached = self._cache.get(channel_id_str)
+        if cached is not None:
+            return cached
+        rows = self._conn.execute(
+            "SELECT seq, link FROM sent_articles WHERE channel_id = ?", (channel_id_str,)
+        ).fetchall()
+        links = set()
+        for _, link in rows:
+            links.add(link)
+            links.add(normalize_url(link))
+        self._cache[channel_id_str] = links
+        self._last_seq[channel_id_str] = max((seq for seq, _ in rows), default=0)
+        logger.debug("채널 %s: 기존 %s개 기사 링크 로드됨 (sqlite)", channel_id_str, len(rows))
+        return links
+
+    def contains(self, channel_id_str, *links):
+        sent = self.load_channel(channel_id_str)
+        return any(link in sent for link in links)
+
+    def refresh(self, channel_id_str):
+        """이미 불러온 채널에 다른 프로세스가 그 뒤로 저장한 기록을 더합니다."""
+        with self._lock:
+            sent = self._cache.get(channel_id_str)
+            if sent is None:
+                return
+            rows = self._conn.execute(
+                "SELECT seq, link FROM sent_articles WHERE channel_id = ? AND seq > ?",
+                (channel_id_str, self._last_seq.get(channel_id_str, 0))
+            ).fetchall()
+            for seq, link in rows:
+                sent.add(link)
+                sent.add(normalize_url(link))
+                self._last_seq[channel_id_str] = max(self._last_seq.get(channel_id_str, 0), seq)
+
+    def add(self, channel_id_str, article_link):
+        with self._lock:
+            sent = self._load_channel_locked(channel_id_str)
+            sent.add(article_link)
+            sent.add(normalize_url(article_link))
+            self._conn.execute(
+                "INSERT OR IGNORE INTO sent_articles (channel_id, link, sent_at) VALUES (?, ?, ?)",
+                (channel_id_str, article_link, time.time())
+            )
+            count = self._inserts_since_trim.get(channel_id_str, 0) + 1
+            self._inserts_since_trim[channel_id_str] = count
+            if count >= self.trim_every:
+                self._trim_locked(channel_id_str)
+
+    def import_links(self, channel_id_str, links):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO sent_articles (channel_id, link, sent_at) VALUES (?, ?, ?)",
+                [(channel_id_str, link, now) for link in links]
+            )
+            self._conn.execute("COMMIT")
+            self._cache.pop(channel_id_str, None)
+
+    def _trim_locked(self, channel_id_str):
+        self._inserts_since_trim[channel_id_str] = 0
+        cursor = self._conn.execute(
+            "DELETE FROM sent_articles WHERE channel_id = ? AND seq NOT IN ("
+            " SELECT seq FROM sent_articles WHERE channel_id = ? ORDER BY seq DESC LIMIT ?)",
+            (channel_id_str, channel_id_str, self.keep)
+        )
+        if cursor.rowcount > 0:
+            logger.debug("채널 %s: 오래된 기사 링크 %s개 정리. 최근 %s개 유지.", channel_id_str, cursor.rowcount, self.keep)
+            self._cache.pop(channel_id_str, None)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class AppendLogSentArticleStore:
+    """추가 전용 로그 기반 전송 기록 저장소. 로그가 보관량의 두 배를 넘으면 압축(compaction)합니다.
+
+    add()는 executor 스레드에서 불리므로 조회용 set도 잠금 안에서만 만들고 바꿉니다.
+    """
+
+    def __init__(self, path, keep=max_keep):
+        self.path = path
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._channels = None
+        self._lookup = {}
+        self._log_lines = 0
+
+    def _ensure_loaded(self):
+        if self._channels is not None:
+            return
+        channels = {}
+        lines = 0
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding='utf-8') as f:
+                for line in f:
+                    channel_id_str, sep, link = line.rstrip('\n').partition('\t')
+                    if not sep or not link:
+                        continue
+                    links = channels.setdefault(channel_id_str, {})
+                    links.pop(link, None)
+                    links[link] = None
+                    lines += 1
+        self._channels = channels
+        self._log_lines = lines
+
+    def is_empty(self):
+        with self._lock:
+            self._ensure_loaded()
+            return not self._channels
+
+    def load_channel(self, channel_id_str):
+        cached = self._lookup.get(channel_id_str)
+        if cached is not None:
+            return cached
+        with self._lock:
+            return self._load_channel_locked(channel_id_str)
+
+    def _load_channel_locked(self, channel_id_str):
+        cached = self._lookup.get(channel_id_str)
+        if cached is not None:
+            return cached
+        self._ensure_loaded()
+        links = self._channels.get(channel_id_str, {})
+        lookup = set(links)
+        lookup.update(normalize_url(link) for link in links)
+        self._lookup[channel_id_str] = lookup
+        logger.debug("채널 %s: 기존 %s개 기사 링크 로드됨 (log)", channel_id_str, len(links))
+        return lookup
+
+    def contains(self, channel_id_str, *links):
+        sent = self.load_channel(channel_id_str)
+        return any(link in sent for link in links)
+
+    def refresh(self, channel_id_str):
+        # 로그 파일은 한 프로세스만 쓰므로 다시 읽을 것이 없음 (샤딩 모드는 sqlite 사용)
+        pass
+
+    def add(self, channel_id_str, article_link):
+        with self._lock:
+            sent = self._load_channel_locked(channel_id_str)
+            sent.add(article_link)
+            sent.add(normalize_url(article_link))
+            links = self._channels.setdefault(channel_id_str, {})
+            if article_link in links:
+                return
+            links[article_link] = None
+            with open(self.path, "a", encoding='utf-8') as f:
+                f.write(f"{channel_id_str}\t{article_link}\n")
+            self._log_lines += 1
+            if self._log_lines > 2 * self.keep * max(len(self._channels), 1):
+                self._compact()
+
+    def import_links(self, channel_id_str, links):
+        with self._lock:
+            self._ensure_loaded()
+            channel_links = self._channels.setdefault(channel_id_str, {})
+            with open(self.path, "a", encoding='utf-8') as f:
+                for link in links:
+                    channel_links.pop(link, None)
+                    channel_links[link] = None
+                    f.write(f"{channel_id_str}\t{link}\n")
+                    self._log_lines += 1
+            self._lookup.pop(channel_id_str, None)
+
+    def _compact(self):
+        # 채널별로 최근 keep개만 남겨 임시 파일에 쓴 뒤 원자적으로 교체
+        lines = 0
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            for channel_id_str, links in self._channels.items():
+                kept = list(links)[-self.keep:]
+                if len(kept) < len(links):
+                    self._channels[channel_id_str] = dict.fromkeys(kept)
+                    self._lookup.pop(channel_id_str, None)
+                for link in kept:
+                    f.write(f"{channel_id_str}\t{link}\n")
+                lines += len(kept)
+        os.replace(tmp_path, self.path)
+        logger.info("%s 압축 완료: %s -> %s줄", self.path, self._log_lines, lines)
+        self._log_lines = lines
+
+    def close(self):
+        pass
+
+
+def migrate_sent_articles_yaml(store):
+    """기존 sent_articles.yaml 기록을 새 저장소로 한 번만 옮기고 원본은 .migrated로 이름을 바꿉니다."""
+    if not os.path.exists(sent_articles_file):
+        return 0
+    try:
+        with open(sent_articles_file, "r", encoding='utf-8') as f:
+            all_sent_data = yaml.safe_load(f) or {}
+    except yaml.YAMLError as e:
+        logger.error("YAML 파일 파싱 오류 (%s): %s. 마이그레이션을 건너뜁니다.", sent_articles_file, e)
+        return 0
+    if not isinstance(all_sent_data, dict):
+        logger.warning("%s 파일 내용이 딕셔너리가 아닙니다. 마이그레이션을 건너뜁니다.", sent_articles_file)
+        return 0
+
+    migrated = 0
+    for channel_key, links in all_sent_data.items():
+        if not isinstance(links, list):
+            logger.warning("채널 %s의 sent_articles 데이터가 리스트가 아닙니다. 건너뜁니다.", channel_key)
+            continue
+        links = [str(link) for link in links if link][-max_keep:]
+        store.import_links(str(channel_key), links)
+        migrated += len(links)
+
+    try:
+        os.rename(sent_articles_file, f"{sent_articles_file}.migrated")
+    except OSError as e:
+        logger.error("%s 이름 변경 실패 (다음 실행 때 다시 가져옵니다): %s", sent_articles_file, e)
+    logger.info("%s에서 %s개 기사 링크를 %s 저장소로 옮겼습니다.", sent_articles_file, migrated, SENT_STORE_BACKEND)
+    return migrated
+
+def get_feed_state_store():
+    """피드 상태 저장소를 처음 사용할 때 엽니다."""
+    global feed_state_store
+    if feed_state_store is None:
+        feed_state_store = FeedStateStore(state_db_file)
+    return feed_state_store
+
+def get_summary_cache():
+    """요약 캐시를 처음 사용할 때 엽니다."""
+    global summary_cache
+    if summary_cache is None:
+        summary_cache = SummaryCache(state_db_file, SUMMARY_CACHE_MAX_ENTRIES, SUMMARY_CACHE_TTL)
+    return summary_cache
+
+class ImageCache:
+    """처리한(축소/재압축한) 이미지를 디스크에 두는 LRU 캐시.
+
+    URL -> 원본 해시 매핑과 원본 해시 -> 처리된 파일을 따로 두어, 같은 URL은 다시 받지 않고
+    URL이 달라도 내용이 같으면 다시 변환하지 않습니다. 전체 크기가 max_bytes를 넘으면 오래 안 쓴 파일부터 지웁니다.
+    """
+
+    def __init__(self, path, directory, max_bytes, ttl):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = open_state_db(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS image_cache_urls ("
+            " url TEXT PRIMARY KEY,"
+            " content_hash TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS image_cache_files ("
+            " content_hash TEXT PRIMARY KEY,"
+            " media_type TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_image_cache_files_last_used ON image_cache_files (last_used)"
+        )
+        os.makedirs(directory, exist_ok=True)
+
+    def _file_path(self, content_hash):
+        return os.path.join(self.directory, content_hash)
+
+    def _read(self, content_hash):
+        """원본 해시로 처리된 이미지를 읽어 (bytes, media type)을 반환합니다. 없으면 None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT media_type FROM image_cache_files WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+        if not row:
+            return None
+        try:
+            with open(self._file_path(content_hash), 'rb') as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self._conn.execute("DELETE FROM image_cache_files WHERE content_hash = ?", (content_hash,))
+            return None
+        with self._lock:
+            self._conn.execute(
+                "UPDATE image_cache_files SET last_used = ? WHERE content_hash = ?", (time.time(), content_hash)
+            )
+        return data, row[0]
+
+    def get_by_url(self, url):
+        """TTL 안에 받은 적 있는 URL이면 처리된 이미지를 반환합니다."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, fetched_at FROM image_cache_urls WHERE url = ?", (url,)
+            ).fetchone()
+        if not row or time.time() - row[1] > self.ttl:
+            return None
+        return self._read(row[0])
+
+    def get_by_content(self, url, content_hash):
+        """다른 URL에서 같은 원본을 이미 처리했으면 그 결과를 이 URL에도 연결해 반환합니다."""
+        cached = self._read(content_hash)
+        if cached:
+            self._link(url, content_hash)
+        return cached
+
+    def _link(self, url, content_hash):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO image_cache_urls (url, content_hash, fetched_at) VALUES (?, ?, ?)",
+                (url, content_hash, time.time())
+            )
+
+    def put(self, url, content_hash, data, media_type):
+        temp_path = self._file_path(content_hash) + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, self._file_path(content_hash))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO image_cache_files (content_hash, media_type, size, last_used) VALUES (?, ?, ?, ?)",
+                (content_hash, media_type, len(data), time.time())
+            )
+        self._link(url, content_hash)
+        self.evict()
+
+    def evict(self):
+        """용량을 넘으면 오래 안 쓴 파일부터 지우고, 만료되었거나 파일이 사라진 URL 매핑을 정리합니다."""
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM image_cache_files").fetchone()[0]
+            victims = []
+            if total > self.max_bytes:
+                for content_hash, size in self._conn.execute(
+                        "SELECT content_hash, size FROM image_cache_files ORDER BY last_used"):
+                    victims.append(content_hash)
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+                self._conn.executemany(
+                    "DELETE FROM image_cache_files WHERE content_hash = ?", [(h,) for h in victims]
+                )
+            self._conn.execute(
+                "DELETE FROM image_cache_urls WHERE fetched_at < ?"
+                " OR content_hash NOT IN (SELECT content_hash FROM image_cache_files)",
+                (time.time() - self.ttl,)
+            )
+        for content_hash in victims:
+            try:
+                os.remove(self._file_path(content_hash))
+            except OSError:
+                pass
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_image_cache():
+    """이미지 캐시를 처음 사용할 때 엽니다."""
+    global image_cache
+    if image_cache is None:
+        image_cache = ImageCache(state_db_file, IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_TTL)
+    return image_cache
+
+MINHASH_PRIME = (1 << 61) - 1
+
+
+class NearDuplicateIndex:
+    """MinHash 서명과 LSH 밴드 버킷으로 최근 기사 중 비슷한 글을 찾는 인덱스.
+
+    서명은 SQLite에 저장되어 재시작 후에도 유지되고, window초가 지난 항목은 정리됩니다.
+    조회는 같은 밴드 버킷에 들어간 후보만 비교하므로 전체 기사 수에 비례하지 않습니다.
+    인덱스는 이벤트 루프에서 바로 고치고, 파일 변경은 모아 두었다가 flush()에서 기본 executor로 한 번에 씁니다.
+    """
+
+    def __init__(self, path, kind, threshold, window, num_perm=64, bands=16):
+        self.kind = kind
+        self.threshold = threshold
+        self.window = window
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = random.Random(f"nyanrss-minhash-{num_perm}")
+        self._perms = [(rng.randrange(1, MINHASH_PRIME), rng.randrange(0, MINHASH_PRIME)) for _ in range(num_perm)]
+        self._entries = {}  # 기사 ID -> (서명, 추가 시각, 비교용 텍스트)
+        self._buckets = collections.defaultdict(set)
+        self._adds_since_evict = 0
+        self._writes = []  # 아직 파일에 쓰지 않은 변경 (SQL, 인자)
+        self._discarded = {}  # 이 프로세스가 뺀 기사 ID -> 뺀 시각. 파일을 다시 읽어도 되살리지 않음
+        self._flush_lock = asyncio.Lock()
+        self._lock = threading.Lock()
+        self._conn = open_state_db(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS near_duplicates ("
+            " kind TEXT NOT NULL,"
+            " article_id TEXT NOT NULL,"
+            " signature BLOB NOT NULL,"
+            " text TEXT,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (kind, article_id))"
+        )
+        self._conn.execute("DELETE FROM near_duplicates WHERE kind = ? AND created_at < ?", (kind, time.time() - window))
+        self._synced_at = 0.0
+        self._apply_rows(self._read_new_rows())
+
+    def _read_new_rows(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT article_id, signature, text, created_at FROM near_duplicates WHERE kind = ? AND created_at >= ?",
+                (self.kind, self._synced_at)
+            ).fetchall()
+
+    def _apply_rows(self, rows):
+        for article_id, signature_blob, text, created_at in rows:
+            self._synced_at = max(self._synced_at, created_at)
+            if article_id not in self._entries and article_id not in self._discarded:
+                self._insert(article_id, struct.unpack(f"<{self.num_perm}Q", signature_blob), created_at, text)
+
+    async def refresh(self):
+        """마지막으로 읽은 뒤 다른 프로세스가 추가한 항목을 파일에서 읽어 옵니다."""
+        rows = await asyncio.get_running_loop().run_in_executor(None, self._read_new_rows)
+        self._apply_rows(rows)
+
+    async def flush(self):
+        """모아 둔 추가/삭제를 한 트랜잭션으로 파일에 씁니다. 쓰는 순서가 바뀌지 않도록 한 번에 하나씩 씁니다."""
+        async with self._flush_lock:
+            if not self._writes:
+                return
+            writes, self._writes = self._writes, []
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, writes)
+            except sqlite3.Error as e:
+                logger.warning("유사 기사 인덱스(%s) 저장 중 오류 발생: %s", self.kind, e)
+
+    def _write(self, writes):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for sql, params in writes:
+                    self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def signature(self, tokens):
+        hashes = [int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little') for token in tokens]
+        return tuple(min((a * h + b) % MINHASH_PRIME for h in hashes) for a, b in self._perms)
+
+    def _band_keys(self, signature):
+        return [(band, hash(signature[band * self.rows:(band + 1) * self.rows])) for band in range(self.bands)]
+
+    def _insert(self, article_id, signature, created_at, text):
+        self._entries[article_id] = (signature, created_at, text)
+        for band_key in self._band_keys(signature):
+            self._buckets[band_key].add(article_id)
+
+    def query(self, tokens, exclude=None, verify=None):
+        """가장 비슷한 기존 기사 (기사 ID, 유사도)를 반환합니다. 임계값 미만이면 None.
+
+        verify(저장된 텍스트)가 주어지면 추정치 대신 그 함수로 정확한 유사도를 계산합니다.
+        """
+        if not tokens:
+            return None, None
+        signature = self.signature(tokens)
+        candidates = set()
+        for band_key in self._band_keys(signature):
+            candidates.update(self._buckets.get(band_key, ()))
+        candidates.discard(exclude)
+
+        best = None
+        cutoff = time.time() - self.window
+        for candidate in candidates:
+            candidate_signature, created_at, text = self._entries[candidate]
+            if created_at < cutoff:
+                continue
+            if verify is not None and text is not None:
+                similarity = verify(text)
+            else:
+                similarity = sum(1 for x, y in zip(signature, candidate_signature) if x == y) / self.num_perm
+            if similarity > self.threshold and (best is None or similarity > best[1]):
+                best = (candidate, similarity)
+        return best, signature
+
+    def add(self, article_id, signature, text=None):
+        if not signature:
+            return
+        self._remove(article_id)
+        self._discarded.pop(article_id, None)
+        now = time.time()
+        self._insert(article_id, signature, now, text)
+        self._writes.append((
+            "INSERT OR REPLACE INTO near_duplicates (kind, article_id, signature, text, created_at) VALUES (?, ?, ?, ?, ?)",
+            (self.kind, article_id, struct.pack(f"<{self.num_perm}Q", *signature), text, now)
+        ))
+        self._adds_since_evict += 1
+        if self._adds_since_evict >= 200:
+            self.evict()
+
+    def discard(self, article_id):
+        if not self._remove(article_id):
+            return
+        self._discarded[article_id] = time.time()
+        self._writes.append(("DELETE FROM near_duplicates WHERE kind = ? AND article_id = ?", (self.kind, article_id)))
+
+    def _remove(self, article_id):
+        entry = self._entries.pop(article_id, None)
+        if entry is None:
+            return False
+        for band_key in self._band_keys(entry[0]):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(article_id)
+                if not bucket:
+                    del self._buckets[band_key]
+        return True
+
+    def evict(self):
+        self._adds_since_evict = 0
+        cutoff = time.time() - self.window
+        expired = [article_id for article_id, (_, created_at, _) in self._entries.items() if created_at < cutoff]
+        for article_id in expired:
+            self._remove(article_id)
+        self._discarded = {article_id: at for article_id, at in self._discarded.items() if at >= cutoff}
+        self._writes.append(("DELETE FROM near_duplicates WHERE kind = ? AND created_at < ?", (self.kind, cutoff)))
+        if expired:
+            logger.debug("유사 기사 인덱스(%s): 오래된 항목 %s개 정리", self.kind, len(expired))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def title_tokens(normalized_title):
+    """제목 유사도 비교용 단어 집합 (calculate_title_similarity와 같은 기준)."""
+    if len(normalized_title) < 5:
+        return set()
+    return set(normalized_title.split())
+
+def body_shingles(content_text, size=3):
+    """본문 유사도 비교용 단어 3-gram 집합."""
+    words = normalize_title(content_text).split()
+    if len(words) < size * 3:
+        return set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def get_near_duplicate_indexes():
+    """제목/본문 유사 기사 인덱스를 처음 사용할 때 엽니다."""
+    global title_index, body_index
+    if title_index is None:
+        title_index = NearDuplicateIndex(state_db_file, 'title', TITLE_SIMILARITY_THRESHOLD, NEAR_DUPLICATE_WINDOW)
+        body_index = NearDuplicateIndex(state_db_file, 'body', BODY_SIMILARITY_THRESHOLD, NEAR_DUPLICATE_WINDOW)
+    return title_index, body_index
+
+async def flush_near_duplicate_indexes():
+    """유사 기사 인덱스에 모아 둔 변경을 파일에 씁니다."""
+    for index in get_near_duplicate_indexes():
+        await index.flush()
+
+def get_sent_store():
+    """설정된 백엔드로 전송 기록 저장소를 처음 사용할 때 만듭니다."""
+    global sent_store
+    if sent_store is None:
+        if SENT_STORE_BACKEND == "log":
+            sent_store = AppendLogSentArticleStore(sent_log_file)
+        else:
+            sent_store = SqliteSentArticleStore(state_db_file)
+        # 예전 YAML 기록 이전은 오래 걸릴 수 있으므로 실행 시에는 이벤트 루프가 돌기 전에 부름 (__main__ 참고)
+        migrate_sent_articles_yaml(sent_store)
+    return sent_store
+
+async def save_sent_article(channel_id_str, article_link):
+    store = get_sent_store()
+    try:
+        loop = asyncio.get_running_loop()
+        persist_start_time = time.monotonic()
+        await loop.run_in_executor(None, store.add, channel_id_str, article_link)
+        record_stage_latency('persist', time.monotonic() - persist_start_time)
+        logger.debug("채널 %s: 기사 '%s' 전송 기록 저장됨.", channel_id_str, article_link)
+    except Exception as e:
+        logger.error("전송 기록 저장 중 오류 발생 (%s): %s", SENT_STORE_BACKEND, e)
+
+def normalize_url(url):
+    """URL을 정규화하여 중복을 방지합니다."""
+    # URL 파라미터와 프래그먼트 제거
+    normalized = url.split('?')[0].split('#')[0]
+    # 끝의 슬래시 제거
+    normalized = normalized.rstrip('/')
+    return normalized
+
+def normalize_title(title):
+    """제목을 정규화하여 유사도 비교에 사용합니다."""
+    # HTML 엔티티 치환
+    title = title.replace('&#8216;', "'").replace('&#8217;', "'")
+    title = title.replace('&amp;', '&').replace('&lt;', '<').replace('&gt;', '>')
+    # 특수문자 제거하고 소문자로 변환
+    normalized = re.sub(r'[^\w\s]', ' ', title.lower())
+    # 여러 공백을 하나로 합치고 앞뒤 공백 제거
+    normalized = ' '.join(normalized.split())
+    return normalized
+
+def calculate_title_similarity(title1, title2):
+    """두 제목의 유사도를 계산합니다 (0.0 ~ 1.0)."""
+    if len(title1) < 5 or len(title2) < 5:
+        return 0.0
+    
+    words1 = set(title1.split())
+    words2 = set(title2.split())
+    
+    if not words1 or not words2:
+        return 0.0
+    
+    # 자카드 유사도 계산
+    intersection = words1 & words2
+    union = words1 | words2
+    
+    return len(intersection) / len(union)
+
+class ResponseTooLarge(Exception):
+    """응답 본문이 허용 크기를 넘었을 때 올리는 예외."""
+
+    def __init__(self, url, limit):
+        super().__init__(f"응답이 {limit} bytes를 넘습니다: {url}")
+        self.url = url
+        self.limit = limit
+
+
+class FetchPool:
+    """피드/이미지용 비동기 HTTP 풀. 호스트별 연결 재사용, 전역 동시성 제한, 요청별 타임아웃을 담당합니다."""
+
+    def __init__(self, concurrency, per_host_limit):
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self._session = None
+        self._semaphore = None
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.concurrency,
+                limit_per_host=self.per_host_limit,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, headers={'User-Agent': USER_AGENT})
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def get(self, url, timeout, headers=None, max_bytes=None):
+        """GET 요청 후 (상태 코드, 응답 헤더, 본문 bytes)를 반환합니다. 4xx/5xx는 예외로 올립니다.
+
+        max_bytes를 주면 본문을 조금씩 읽다가 넘는 순간 ResponseTooLarge로 중단합니다.
+        결과는 host_health에 기록하며, 장애 중인 호스트면 요청 없이 HostUnavailable을 올립니다.
+        """
+        session = await self._get_session()
+        async with self._semaphore:
+            with host_health.track(url):
+                async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    response.raise_for_status()
+                    if max_bytes is None:
+                        body = await response.read()
+                        return response.status, response.headers, body
+                    if response.content_length is not None and response.content_length > max_bytes:
+                        raise ResponseTooLarge(url, max_bytes)
+                    chunks = []
+                    received = 0
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        received += len(chunk)
+                        if received > max_bytes:
+                            raise ResponseTooLarge(url, max_bytes)
+                        chunks.append(chunk)
+                    return response.status, response.headers, b''.join(chunks)
+
+    async def post(self, url, data, timeout):
+        """폼 데이터를 POST하고 (상태 코드, 응답 본문 문자열)을 반환합니다. 상태 코드는 호출하는 쪽에서 판단합니다."""
+        session = await self._get_session()
+        async with self._semaphore:
+            with host_health.track(url) as host_request:
+                async with session.post(url, data=data, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    return host_request.check_status(response.status), await response.text()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+fetch_pool = FetchPool(FETCH_CONCURRENCY, FETCH_PER_HOST_LIMIT)
+parse_executor = None
+
+def get_parse_executor():
+    """피드 파싱용 워커 풀을 처음 사용할 때 만듭니다."""
+    global parse_executor
+    if parse_executor is None:
+        parse_executor = ThreadPoolExecutor(max_workers=FEED_PARSE_WORKERS, thread_name_prefix="feed-parse")
+    return parse_executor
+
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+RSS1_NS = 'http://purl.org/rss/1.0/'
+CONTENT_NS = 'http://purl.org/rss/1.0/modules/content/'
+DC_NS = 'http://purl.org/dc/elements/1.1/'
+MEDIA_NS = 'http://search.yahoo.com/mrss/'
+SY_NS = 'http://purl.org/rss/1.0/modules/syndication/'
+
+def split_xml_tag(tag):
+    """'{네임스페이스}이름' 형태의 태그를 (네임스페이스, 이름)으로 나눕니다."""
+    if tag.startswith('{'):
+        namespace, local = tag[1:].split('}', 1)
+        return namespace, local
+    return '', tag
+
+def parse_feed_date(text):
+    """RFC 822 또는 ISO 8601 날짜 문자열을 UTC time.struct_time으로 바꿉니다. 실패하면 None."""
+    if not text:
+        return None
+    text = text.strip()
+    try:
+        parsed = email.utils.parsedate_tz(text)
+        if parsed:
+            return time.gmtime(email.utils.mktime_tz(parsed))
+    except (TypeError, ValueError, OverflowError):
+        pass
+    try:
+        if text.endswith('Z'):
+            text = text[:-1] + '+00:00'
+        parsed_dt = datetime.datetime.fromisoformat(text)
+        if parsed_dt.tzinfo is None:
+            parsed_dt = parsed_dt.replace(tzinfo=datetime.timezone.utc)
+        return parsed_dt.astimezone(datetime.timezone.utc).utctimetuple()
+    except ValueError:
+        return None
+
+def streamed_media_item(element, entry):
+    """media:thumbnail / media:content / media:group 요소를 feedparser와 같은 형태로 항목에 추가합니다."""
+    _, local = split_xml_tag(element.tag)
+    if local == 'thumbnail' and element.get('url'):
+        entry.setdefault('media_thumbnail', []).append({'url': element.get('url')})
+    elif local == 'content' and element.get('url'):
+        entry.setdefault('media_content', []).append(dict(element.attrib))
+    elif local == 'group':
+        for child in element:
+            streamed_media_item(child, entry)
+
+def streamed_entry(item, is_atom):
+    """스트리밍 파서가 읽은 <item>/<entry> 요소를 feedparser 항목과 같은 모양의 FeedParserDict로 바꿉니다."""
+    entry = feedparser.FeedParserDict()
+    enclosures = []
+    content = None
+    for child in item:
+        namespace, local = split_xml_tag(child.tag)
+        text = (child.text or '').strip()
+        if namespace == MEDIA_NS:
+            streamed_media_item(child, entry)
+        elif local == 'title' and namespace in ('', ATOM_NS, RSS1_NS):
+            entry['title'] = ''.join(child.itertext()).strip()
+        elif local == 'link' and is_atom:
+            rel = child.get('rel', 'alternate')
+            href = child.get('href')
+            if rel == 'alternate' and href and 'link' not in entry:
+                entry['link'] = href
+            elif rel == 'enclosure' and href:
+                enclosures.append({'href': href, 'type': child.get('type', '')})
+        elif local == 'link' and namespace in ('', RSS1_NS) and text:
+            entry['link'] = text
+        elif local in ('guid', 'id') and text:
+            entry['id'] = text
+        elif local in ('description', 'summary') and namespace in ('', ATOM_NS, RSS1_NS):
+            entry['summary'] = ''.join(child.itertext())
+        elif (namespace == CONTENT_NS and local == 'encoded') or (is_atom and local == 'content'):
+            content = ''.join(child.itertext())
+        elif local in ('pubDate', 'published') or (namespace == DC_NS and local == 'date'):
+            entry['published_parsed'] = parse_feed_date(text)
+        elif local == 'updated':
+            entry['updated_parsed'] = parse_feed_date(text)
+        elif local == 'enclosure' and child.get('url'):
+            enclosures.append({'href': child.get('url'), 'type': child.get('type', '')})
+    if 'summary' not in entry and content:
+        entry['summary'] = content
+    if enclosures:
+        # FeedParserDict는 enclosures를 rel="enclosure"인 links에서 만들어 줌
+        entry['links'] = [dict(enclosure, rel='enclosure') for enclosure in enclosures]
+    if is_atom and 'link' not in entry and entry.get('id', '').startswith('http'):
+        entry['link'] = entry['id']
+    return entry
+
+def stream_feed_entries(body, feed_info):
+    """큰 피드를 앞에서부터 읽으며 항목을 하나씩 돌려주는 제너레이터.
+
+    전체 항목 목록을 만들지 않고, 다 읽은 <item>은 트리에서 떼어 메모리를 돌려줍니다.
+    항목 앞에 나오는 채널 정보(title, ttl, sy:*, atom:link)는 feed_info에 채웁니다.
+    """
+    stack = []
+    is_atom = False
+    for event, element in ET.iterparse(io.BytesIO(body), events=('start', 'end')):
+        namespace, local = split_xml_tag(element.tag)
+        if event == 'start':
+            if not stack and local == 'feed':
+                is_atom = True
+            stack.append(element)
+            continue
+
+        stack.pop()
+        parent = stack[-1] if stack else None
+        parent_local = split_xml_tag(parent.tag)[1] if parent is not None else None
+        if local in ('item', 'entry') and not any(split_xml_tag(e.tag)[1] in ('item', 'entry') for e in stack):
+            yield streamed_entry(element, is_atom)
+            parent.remove(element)
+        elif parent_local in ('channel', 'feed') and not any(split_xml_tag(e.tag)[1] in ('item', 'entry') for e in stack):
+            text = (element.text or '').strip()
+            if local == 'title' and namespace in ('', ATOM_NS, RSS1_NS):
+                feed_info['title'] = text
+            elif local == 'ttl':
+                feed_info['ttl'] = text
+            elif namespace == SY_NS and local in ('updatePeriod', 'updateFrequency'):
+                feed_info[f"sy_{local.lower()}"] = text
+            elif local == 'link' and element.get('href'):
+                feed_info.setdefault('links', []).append({'rel': element.get('rel', 'alternate'), 'href': element.get('href')})
+
+def start_streamed_parse(body, first_chunk):
+    """스트리밍 파싱을 시작해 첫 chunk를 미리 읽습니다. 첫 항목도 못 읽으면 ParseError를 올립니다 (feedparser로 대체)."""
+    feed_info = feedparser.FeedParserDict()
+    stream = stream_feed_entries(body, feed_info)
+    entries = list(itertools.islice(stream, first_chunk))
+    feed = feedparser.FeedParserDict(feed=feed_info, entries=entries, bozo=0)
+    feed['entry_stream'] = stream
+    return feed
+
+async def iterate_feed_entries(feed):
+    """피드 항목을 차례로 돌려줍니다. 스트리밍 파싱된 피드는 소비한 만큼만 워커 풀에서 이어서 파싱합니다.
+
+    이어서 읽은 항목은 feed.entries에 쌓지 않고, 발행 간격 추정에 쓸 최근 발행 시각만 feed['streamed_published']에 남깁니다.
+    도중에 XML 오류가 나면 feed['stream_error']에 남겨 호출한 쪽이 이번 폴링을 끝까지 읽지 못했음을 알 수 있게 합니다.
+    """
+    index = 0
+    while index < len(feed.entries):
+        yield feed.entries[index]
+        index += 1
+    stream = feed.get('entry_stream')
+    if stream is None:
+        return
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            chunk = await loop.run_in_executor(get_parse_executor(), lambda: list(itertools.islice(stream, STREAM_PARSE_CHUNK)))
+            if not chunk:
+                break
+            recent_published = feed.setdefault('streamed_published', [])
+            for entry in chunk:
+                published = entry.get('published_parsed') or entry.get('updated_parsed')
+                if published:
+                    if len(recent_published) < PUBLISH_INTERVAL_SAMPLES:
+                        heapq.heappush(recent_published, calendar.timegm(published))
+                    else:
+                        heapq.heappushpop(recent_published, calendar.timegm(published))
+                yield entry
+    except ET.ParseError as e:
+        feed['stream_error'] = e
+        logger.warning("스트리밍 파싱 중 오류로 나머지 항목을 읽지 못했습니다: %s", e)
+    finally:
+        stream.close()
+
+async def fetch_and_parse_feed(rss_feed_url, channels_key=None):
+    """피드를 조건부 GET으로 내려받고 워커 풀에서 파싱합니다.
+
+    (상태, feed, 검증값)을 반환합니다. 상태는 'ok', 'not_modified', 'unchanged', 'error', 'skipped'(호스트 장애 중) 중 하나이며,
+    검증값은 항목 처리가 끝난 뒤 commit_feed_validators로 저장합니다.
+    구독 채널 구성(channels_key)이 바뀌었으면 새 채널도 받을 수 있도록 검증값을 쓰지 않습니다.
+    """
+    feed_start_time = time.monotonic()
+    previous = get_feed_state_store().get(rss_feed_url)
+    if previous.get('channels_key') != channels_key:
+        previous = {}
+    request_headers = {}
+    if previous.get('etag'):
+        request_headers['If-None-Match'] = previous['etag']
+    if previous.get('last_modified'):
+        request_headers['If-Modified-Since'] = previous['last_modified']
+    try:
+        status, response_headers, body = await fetch_pool.get(rss_feed_url, timeout=FEED_FETCH_TIMEOUT, headers=request_headers)
+        record_stage_latency('fetch', time.monotonic() - feed_start_time)
+        if status == 304:
+            logger.debug("'%s' 변경 없음 (304). 파싱을 건너뜁니다.", rss_feed_url, extra={'feed': rss_feed_url})
+            return 'not_modified', None, None
+
+        validators = {
+            'etag': response_headers.get('ETag'),
+            'last_modified': response_headers.get('Last-Modified'),
+            'body_hash': hashlib.sha256(body).hexdigest(),
+            'channels_key': channels_key,
+        }
+        if validators['body_hash'] == previous.get('body_hash'):
+            logger.debug("'%s' 본문 동일. 파싱을 건너뜁니다.", rss_feed_url, extra={'feed': rss_feed_url})
+            await commit_feed_validators(rss_feed_url, validators)
+            return 'unchanged', None, None
+
+        loop = asyncio.get_running_loop()
+        parse_start_time = time.monotonic()
+        if STREAM_PARSE_MIN_BYTES > 0 and len(body) >= STREAM_PARSE_MIN_BYTES:
+            try:
+                feed = await loop.run_in_executor(get_parse_executor(), start_streamed_parse, body, STREAM_PARSE_CHUNK)
+                record_stage_latency('parse', time.monotonic() - parse_start_time)
+                logger.debug("'%s' 스트리밍 파싱 시작 (%s bytes).", rss_feed_url, len(body), extra={'feed': rss_feed_url})
+                return 'ok', feed, validators
+            except ET.ParseError as e:
+                logger.warning("'%s' 스트리밍 파싱 실패 (%s). 전체 파싱으로 대체합니다.", rss_feed_url, e, extra={'feed': rss_feed_url})
+
+        parser_headers = {key.lower(): value for key, value in response_headers.items()}
+        parser_headers.setdefault('content-location', rss_feed_url)
+        feed = await loop.run_in_executor(
+            get_parse_executor(),
+            functools.partial(feedparser.parse, body, response_headers=parser_headers)
+        )
+        record_stage_latency('parse', time.monotonic() - parse_start_time)
+        if feed.bozo and isinstance(feed.bozo_exception, (feedparser.CharacterEncodingOverride, feedparser.NonXMLContentType)):
+               logger.warning("'%s' 파싱 경고: %s", rss_feed_url, feed.bozo_exception, extra={'feed': rss_feed_url})
+        elif feed.bozo:
+               raise feed.bozo_exception
+    except HostUnavailable as e:
+        logger.info("'%s' 호스트 %s 장애 중이라 이번 폴링은 건너뜁니다 (%.0f초 뒤 재시도).", rss_feed_url, e.host, e.retry_in, extra={'feed': rss_feed_url})
+        return 'skipped', None, None
+    except asyncio.TimeoutError:
+        logger.error("'%s' 피드 다운로드 시간 초과 (%s초)", rss_feed_url, FEED_FETCH_TIMEOUT, extra={'feed': rss_feed_url})
+        return 'error', None, None
+    except Exception as e:
+        logger.error("'%s' 피드 파싱 중 심각한 오류: %s", rss_feed_url, e, extra={'feed': rss_feed_url})
+        return 'error', None, None
+    parse_duration = time.monotonic() - feed_start_time
+    logger.info("'%s' 파싱 완료 (%s개 항목). 소요 시간: %.2f초", rss_feed_url, len(feed.entries), parse_duration, extra={'feed': rss_feed_url})
+    return 'ok', feed, validators
+
+async def commit_feed_validators(rss_feed_url, validators, **scan_state):
+    """다음 요청에 보낼 ETag/Last-Modified와 본문 해시, 증분 스캔 상태를 저장합니다."""
+    if validators:
+        await get_feed_state_store().update(rss_feed_url, **validators, **scan_state)
+
+def find_entry_image_url(entry):
+    """RSS 항목에서 첨부할 이미지 URL을 찾습니다."""
+    image_url = None
+    if hasattr(entry, 'enclosures'):
+        for enclosure in entry.enclosures:
+            if enclosure.get('type', '').startswith('image/'):
+                image_url = enclosure.get('href')
+                if image_url:
+                    logger.debug("이미지 발견 (enclosure): %s...", image_url[:50])
+                    break
+    if not image_url and hasattr(entry, 'media_thumbnail') and entry.media_thumbnail:
+        if isinstance(entry.media_thumbnail, list) and len(entry.media_thumbnail) > 0:
+            thumb_info = entry.media_thumbnail[0]
+            if isinstance(thumb_info, dict) and 'url' in thumb_info:
+                image_url = thumb_info['url']
+                if image_url:
+                    logger.debug("이미지 발견 (media_thumbnail): %s...", image_url[:50])
+    if not image_url and hasattr(entry, 'media_content') and entry.media_content:
+        if isinstance(entry.media_content, list) and len(entry.media_content) > 0:
+            for media_item in entry.media_content:
+                if isinstance(media_item, dict) and 'url' in media_item:
+                    potential_url = media_item['url']
+                    is_image = False
+                    if media_item.get('type', '').startswith('image/'): is_image = True
+                    elif media_item.get('medium') == 'image': is_image = True
+                    elif potential_url and media_item.get('width') and int(media_item['width']) > 200:
+                           is_image = True
+
+                    if is_image and potential_url:
+                        image_url = potential_url
+                        logger.debug("이미지 발견 (media_content): %s...", image_url[:50])
+                        break
+    return image_url
+
+def shrink_image(image_bytes, media_type):
+    """이미지를 IMAGE_MAX_DIMENSION 안으로 줄이고 다시 압축합니다. (bytes, media type)을 반환합니다.
+
+    Pillow가 없거나 열 수 없는 형식이면 원본을 그대로 돌려줍니다. 워커 스레드에서 호출합니다.
+    """
+    if Image is None:
+        return image_bytes, media_type
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            resized = max(image.size) > IMAGE_MAX_DIMENSION
+            if resized:
+                image.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+            has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+            output = io.BytesIO()
+            if has_alpha:
+                image.convert('RGBA').save(output, format='PNG', optimize=True)
+                new_media_type = 'image/png'
+            else:
+                image.convert('RGB').save(output, format='JPEG', quality=IMAGE_JPEG_QUALITY, optimize=True)
+                new_media_type = 'image/jpeg'
+    except Exception as e:
+        logger.warning("이미지 변환 실패, 원본 사용: %s", e)
+        return image_bytes, media_type
+    processed = output.getvalue()
+    if not resized and len(processed) >= len(image_bytes):
+        return image_bytes, media_type
+    return processed, new_media_type
+
+image_downloads = {}  # 이미지 URL -> 진행 중인 다운로드 Future (같은 이미지 동시 요청을 하나로 합침)
+
+async def download_image(image_url):
+    """이미지를 다운로드하여 (base64, media type)을 반환합니다. 실패하면 (None, None).
+
+    처리된 이미지는 디스크 캐시에 두고, 같은 URL을 동시에 요청하면 다운로드 한 번의 결과를 나눠 씁니다.
+    """
+    in_flight = image_downloads.get(image_url)
+    if in_flight is not None:
+        return await asyncio.shield(in_flight)
+    in_flight = asyncio.get_running_loop().create_future()
+    image_downloads[image_url] = in_flight
+    result = (None, None)
+    try:
+        result = await load_image(image_url)
+        return result
+    finally:
+        image_downloads.pop(image_url, None)
+        in_flight.set_result(result)
+
+async def load_image(image_url):
+    """캐시를 확인하고, 없으면 크기 제한을 걸어 내려받아 줄인 뒤 캐시에 저장합니다."""
+    loop = asyncio.get_running_loop()
+    cache = get_image_cache()
+    try:
+        cached = await loop.run_in_executor(None, cache.get_by_url, image_url)
+        if cached:
+            IMAGE_CACHE_LOOKUPS.inc(result='url')
+            image_bytes, image_media_type = cached
+            logger.debug("이미지 캐시 사용: %s, %s bytes", image_media_type, len(image_bytes))
+            return base64.b64encode(image_bytes).decode('utf-8'), image_media_type
+
+        logger.debug("이미지 다운로드 시도: %s", image_url)
+        _, response_headers, raw_bytes = await fetch_pool.get(
+            image_url, timeout=IMAGE_FETCH_TIMEOUT, max_bytes=IMAGE_MAX_BYTES
+        )
+        raw_media_type = response_headers.get('Content-Type', 'image/jpeg').split(';')[0].strip()
+        content_hash = hashlib.sha256(raw_bytes).hexdigest()
+        cached = await loop.run_in_executor(None, cache.get_by_content, image_url, content_hash)
+        if cached:
+            IMAGE_CACHE_LOOKUPS.inc(result='content')
+            image_bytes, image_media_type = cached
+        else:
+            IMAGE_CACHE_LOOKUPS.inc(result='miss')
+            image_bytes, image_media_type = await loop.run_in_executor(
+                get_parse_executor(), shrink_image, raw_bytes, raw_media_type
+            )
+            await loop.run_in_executor(None, cache.put, image_url, content_hash, image_bytes, image_media_type)
+        logger.debug("이미지 로드 성공: %s, %s -> %s bytes", image_media_type, len(raw_bytes), len(image_bytes))
+        return base64.b64encode(image_bytes).decode('utf-8'), image_media_type
+    except HostUnavailable as e:
+        logger.debug("이미지 호스트 %s 장애 중. 이미지 없이 보냅니다 (%s)", e.host, image_url)
+    except ResponseTooLarge:
+        logger.warning("이미지가 너무 큼 (%s bytes 초과, %s)", IMAGE_MAX_BYTES, image_url)
+    except asyncio.TimeoutError:
+        logger.warning("이미지 다운로드 시간 초과 (%s)", image_url)
+    except aiohttp.ClientError as req_err:
+        logger.warning("이미지 다운로드 실패 (%s): %s", image_url, req_err)
+    except Exception as img_err:
+        logger.warning("이미지 처리 중 예상치 못한 오류 (%s): %s", image_url, img_err)
+    return None, None
+
+def build_embed(article, site_colors):
+    """기사 정보로 Discord Embed를 만듭니다. 모든 채널이 같은 Embed를 공유합니다."""
+    embed = Embed(
+        title=f"{EMOJI} {article['title']}",
+        url=article['id'],
+        color=site_colors.color_for(article['feed_url'])
+    )
+
+    summary = article['summary']
+    summary_to_display = summary
+    max_summary_length = 1024
+    if len(summary) > max_summary_length:
+        cutoff = max_summary_length - len("... (내용 축약됨)")
+        summary_to_display = f"{summary[:cutoff]}... (내용 축약됨)"
+        logger.warning("요약 내용이 너무 길어 Embed 필드에서 잘렸습니다.")
+
+    if summary:
+        embed.add_field(name="AI 냥냥 요약!", value=summary_to_display, inline=False)
+
+    if article['image_url']:
+        embed.set_image(url=article['image_url'])
+        logger.debug("최종 선택된 이미지 URL (Embed용): %s", article['image_url'])
+    else:
+        logger.debug("이 항목에서 이미지를 찾지 못했거나 로드에 실패했습니다.")
+
+    published_parsed = article['published_parsed']
+    if published_parsed:
+        try:
+            published_dt = datetime.datetime(*published_parsed[:6], tzinfo=datetime.timezone.utc)
+            kst = datetime.timezone(datetime.timedelta(hours=9))
+            published_dt_kst = published_dt.astimezone(kst)
+            embed.timestamp = published_dt_kst
+        except Exception as e:
+            logger.warning("발행 시각 변환 오류: %s", e)
+            embed.timestamp = utils.utcnow()
+    else:
+        embed.timestamp = utils.utcnow()
+
+    embed.set_footer(text=f"{article['feed_title']}에서 불러온 정보다냥!")
+    return embed
+
+def entry_html(entry):
+    """RSS 항목의 본문 HTML (summary, 없으면 description)."""
+    return getattr(entry, 'summary', getattr(entry, 'description', ""))
+
+def extract_entry_texts(rss_feed_url, items):
+    """(기사 ID, 본문 HTML) 목록을 (중복 검사용 본문 전체, 요약에 보낼 본문) 목록으로 바꿉니다.
+
+    상용구 문단과 이 피드에서 되풀이되는 문단은 빼고, 요약용 본문은 SUMMARY_TOKEN_BUDGET 안의 문장 끝에서 자릅니다.
+    CPU를 쓰는 작업이라 이벤트 루프가 아닌 파싱 워커 풀에서 여러 항목을 한 번에 처리합니다.
+    """
+    texts = []
+    for article_id, raw_html in items:
+        text = ' '.join(feed_boilerplate.filter(rss_feed_url, article_id, html_text_blocks(raw_html))) if raw_html else ''
+        texts.append((text, select_summary_text(text, SUMMARY_TOKEN_BUDGET)))
+    return texts
+
+def new_article(entry, feed, rss_feed_url, article_id, normalized_url, article_title, content_text):
+    """RSS 항목에서 파이프라인이 쓸 값만 꺼내 기사 정보를 만듭니다. 이후 단계는 entry를 다시 보지 않습니다."""
+    return {
+        'id': article_id,
+        'normalized_url': normalized_url,
+        'title': article_title,
+        'feed_url': rss_feed_url,
+        'feed_title': getattr(feed.feed, 'title', rss_feed_url),
+        'content': content_text,
+        'image_url': find_entry_image_url(entry),
+        'published_parsed': getattr(entry, 'published_parsed', None) or None,
+        'summary': None,
+    }
+
+async def enrich_article(article):
+    """보강 단계: 기사 이미지를 내려받습니다. 실패하면 이미지 없이 진행합니다."""
+    article['image_base64'] = None
+    article['image_media_type'] = None
+    if article['image_url']:
+        image_base64, image_media_type = await download_image(article['image_url'])
+        if image_base64:
+            article['image_base64'] = image_base64
+            article['image_media_type'] = image_media_type
+        else:
+            article['image_url'] = None
+
+def is_streamable_article(article):
+    """스트리밍 요약을 켰고 모든 대상 채널에 바로 보낼 수 있으면, 요약을 기다리지 않고 Embed부터 보냅니다."""
+    return (SUMMARY_STREAM_EDIT_INTERVAL > 0 and bool(OPENROUTER_API_KEY) and not article['summary']
+            and host_health.available(OPENROUTER_API_URL)
+            and (bool(article.get('image_base64')) or len(article['content']) >= 30)
+            and all(state['channel'] is not None for state in article['pending_states']))
+
+def is_batchable_article(article):
+    """이미지 없이 본문만 있는 기사는 일괄 요약에 넣을 수 있습니다."""
+    return not article.get('image_base64') and len(article['content']) >= 30
+
+async def summarize_prepared_article(article):
+    """요약 단계: 이미 요약이 있으면 (일괄 요약 등) 그대로 두고, 없으면 한 건씩 요약합니다."""
+    if article['summary']:
+        return
+    if article['content'] or article.get('image_base64'):
+        logger.debug("OpenRouter API로 요약 요청 중...")
+        summary_start_time = time.monotonic()
+        article['summary'] = await summarize_article(article['content'], article.get('image_base64'), article.get('image_media_type'))
+        summary_duration = time.monotonic() - summary_start_time
+        logger.debug("요약 완료. 소요 시간: %.2f초", summary_duration)
+    else:
+        logger.debug("요약할 내용이나 이미지가 없어 API 호출을 건너뜁니다.")
+        article['summary'] = "기사 본문 내용이나 이미지가 없어 요약할 수 없습니다."
+
+
+class ArticlePipeline:
+    """발견 → 보강(이미지) → 요약 → 전달 단계를 크기 제한 큐로 잇는 파이프라인.
+
+    단계마다 워커 수를 따로 두어 N+1번째 기사의 이미지/요약이 N번째 기사 전달과 겹쳐 진행되고,
+    큐가 가득 차면 앞 단계가 기다리므로 밀린 기사가 많아도 메모리가 일정하게 유지됩니다.
+    스트리밍 요약할 기사는 보강 단계에서 바로 채널 대기열에 넣고, 요약과 메시지 수정은 워커를 잡지 않는 백그라운드 작업으로 진행합니다.
+    """
+
+    def __init__(self, queue_size, enrich_workers, summarize_workers, deliver_workers):
+        self.queue_size = queue_size
+        self.enrich_workers = enrich_workers
+        self.summarize_workers = summarize_workers
+        self.deliver_workers = deliver_workers
+        self.enrich_queue = None
+        self.summarize_queue = None
+        self.deliver_queue = None
+        self._stream_slots = None
+        self._streams = set()
+        self._workers = []
+
+    def start(self):
+        if self._workers:
+            return
+        self.enrich_queue = asyncio.Queue(maxsize=self.queue_size)
+        self.summarize_queue = asyncio.Queue(maxsize=self.queue_size)
+        self.deliver_queue = asyncio.Queue(maxsize=self.queue_size)
+        self._stream_slots = asyncio.Semaphore(max(self.queue_size, 1))
+        for worker, count in ((self._enrich_worker, self.enrich_workers),
+                              (self._summarize_worker, self.summarize_workers),
+                              (self._deliver_worker, self.deliver_workers)):
+            for _ in range(max(count, 1)):
+                self._workers.append(asyncio.ensure_future(worker()))
+
+    def depths(self):
+        """단계별 대기 중인 기사 수."""
+        if not self._workers:
+            return {'enrich': 0, 'summarize': 0, 'deliver': 0, 'streaming': 0}
+        return {
+            'enrich': self.enrich_queue.qsize(),
+            'summarize': self.summarize_queue.qsize(),
+            'deliver': self.deliver_queue.qsize(),
+            'streaming': len(self._streams),
+        }
+
+    async def submit(self, article):
+        """발견 단계에서 기사를 넣습니다. 전달이 끝나면 성공 여부(bool)로 완료되는 future를 반환합니다."""
+        self.start()
+        article['done'] = asyncio.get_running_loop().create_future()
+        article['submitted_at'] = time.monotonic()
+        await journal_write(get_pipeline_journal().record_discovered, article)
+        await self.enrich_queue.put(article)
+        return article['done']
+
+    async def resume(self, article):
+        """재시작 전 기록에서 되살린 기사를 넣습니다. 요약이 이미 있으면 보강/요약을 건너뛰고 바로 전달 단계로 보냅니다."""
+        self.start()
+        article['done'] = asyncio.get_running_loop().create_future()
+        article['submitted_at'] = time.monotonic()
+        if article['summary']:
+            article['embed'] = build_embed(article, article['site_colors'])
+            await self.deliver_queue.put(article)
+        else:
+            await self.enrich_queue.put(article)
+        return article['done']
+
+    def _finish(self, article, delivered, result=None):
+        article.pop('image_base64', None)
+        article.pop('messages', None)
+        # 실패한 기사는 다음 폴링 때 다시 발견되므로 기록은 어느 쪽이든 지움
+        asyncio.ensure_future(journal_write(get_pipeline_journal().forget, article['id']))
+        ARTICLES_FINISHED.inc(result=result or ('delivered' if delivered else 'failed'))
+        if delivered:
+            record_stage_latency('total', time.monotonic() - article['submitted_at'])
+        done = article.get('done')
+        if done is not None and not done.done():
+            done.set_result(delivered)
+
+    async def _enrich_worker(self):
+        while True:
+            article = await self.enrich_queue.get()
+            stage_start_time = time.monotonic()
+            try:
+                await enrich_article(article)
+                record_stage_latency('enrich', time.monotonic() - stage_start_time)
+            except Exception as e:
+                logger.error("기사 보강 중 예상치 못한 오류 (%s): %s", article['id'], e)
+                article['image_url'] = None
+                article['image_base64'] = None
+            finally:
+                self.enrich_queue.task_done()
+            if is_streamable_article(article):
+                await self._start_stream(article)
+            else:
+                await self.summarize_queue.put(article)
+
+    async def _summarize_worker(self):
+        while True:
+            batch = [await self.summarize_queue.get()]
+            # 이미 대기 중인 본문 전용 기사를 모아 한 번에 요약 (기다리지는 않음)
+            if SUMMARY_BATCH_SIZE >= 2 and is_batchable_article(batch[0]):
+                while len(batch) < SUMMARY_BATCH_SIZE and not self.summarize_queue.empty():
+                    batch.append(self.summarize_queue.get_nowait())
+            stage_start_time = time.monotonic()
+            try:
+                batchable = [article for article in batch if is_batchable_article(article)]
+                if len(batchable) >= 2:
+                    try:
+                        summaries = await summarize_articles_batch([article['content'] for article in batchable])
+                    except Exception as e:
+                        # 요약이 채워지지 않은 기사는 아래에서 한 건씩 요약
+                        logger.error("일괄 요약 중 예상치 못한 오류 (%s): %s", type(e).__name__, e)
+                        summaries = []
+                    for article, summary in zip(batchable, summaries):
+                        article['summary'] = summary
+                for article in batch:
+                    try:
+                        await summarize_prepared_article(article)
+                        await journal_write(get_pipeline_journal().record_summarized, article)
+                        record_stage_latency('summarize', time.monotonic() - stage_start_time)
+                        article['embed'] = build_embed(article, article['site_colors'])
+                    except HostUnavailable as e:
+                        # 요약 없이 보내지 않고 미룸. 전달 실패로 끝내면 다음 폴링 때 다시 발견됨
+                        logger.info("OpenRouter 장애로 '%s' 요약을 다음 폴링으로 미룹니다 (%.0f초 뒤 재시도).", article['title'], e.retry_in)
+                        self._finish(article, False, result='deferred')
+                        continue
+                    except Exception as e:
+                        logger.error("기사 요약 중 예상치 못한 오류 (%s): %s", article['id'], e)
+                        self._finish(article, False)
+                        continue
+                    article.pop('image_base64', None)
+                    await self.deliver_queue.put(article)
+            finally:
+                for _ in batch:
+                    self.summarize_queue.task_done()
+
+    async def _start_stream(self, article):
+        """요약을 기다리지 않고 자리표시 Embed를 채널 대기열에 넣은 뒤, 요약과 메시지 수정은 백그라운드에서 진행합니다.
+
+        동시에 스트리밍하는 기사는 큐 크기까지만 두어, 밀린 기사가 많으면 보강 단계가 여기서 기다립니다.
+        """
+        await self._stream_slots.acquire()
+        try:
+            article['messages'] = {}  # 채널 ID -> 기사가 올라간 메시지 기록 (ChannelDelivery가 채움)
+            article['embed'] = build_embed(dict(article, summary=SUMMARY_STREAM_PLACEHOLDER), article['site_colors'])
+            futures = [await deliver_article(state, article) for state in article['pending_states']]
+        except Exception as e:
+            logger.error("기사 전달 중 예상치 못한 오류 (%s): %s", article['id'], e)
+            self._stream_slots.release()
+            self._finish(article, False)
+            return
+        task = asyncio.ensure_future(self._stream_article(article, futures))
+        self._streams.add(task)
+        task.add_done_callback(self._stream_done)
+
+    def _stream_done(self, task):
+        self._streams.discard(task)
+        self._stream_slots.release()
+
+    async def _stream_article(self, article, futures):
+        """요약이 생성되는 대로 SUMMARY_STREAM_EDIT_INTERVAL초마다 이미 올라간 메시지를 고치고, 전송이 모두 끝나면 기사를 마칩니다.
+
+        아직 전송 전인 채널은 대기열에 있는 Embed만 바꾸면 되므로 수정 요청 없이 최신 내용으로 올라갑니다.
+        중간 수정은 기다리지 않으며, 앞선 수정이 레이트 리밋에 걸려 아직 끝나지 않았으면 그 회차는 건너뜁니다.
+        """
+        stage_start_time = time.monotonic()
+
+        async def sync_messages():
+            await asyncio.gather(*(
+                get_channel_delivery(state['channel']).edit(sent)
+                for state in article['pending_states']
+                for sent in [article['messages'].get(state['id_str'])]
+                if sent is not None
+            ))
+
+        partial = {'text': None, 'shown': None}
+        summary_task = asyncio.ensure_future(summarize_article(
+            article['content'], article.get('image_base64'), article.get('image_media_type'),
+            on_delta=lambda text: partial.update(text=text)
+        ))
+        summary_task.add_done_callback(lambda _: record_stage_latency('summarize', time.monotonic() - stage_start_time))
+        syncing = None
+        try:
+            while not summary_task.done():
+                await asyncio.wait([summary_task], timeout=SUMMARY_STREAM_EDIT_INTERVAL)
+                if (not summary_task.done() and partial['text'] != partial['shown']
+                        and (syncing is None or syncing.done())):
+                    partial['shown'] = partial['text']
+                    article['embed'] = build_embed(dict(article, summary=f"{partial['text'].rstrip()} ..."), article['site_colors'])
+                    syncing = asyncio.ensure_future(sync_messages())
+
+            try:
+                article['summary'] = summary_task.result()
+            except HostUnavailable:
+                # Embed는 이미 올라갔으므로 미루지 않고 안내 문구로 마무리
+                article['summary'] = "요약 서버에 장애가 있어 요약하지 못했습니다."
+            except Exception as e:
+                logger.error("기사 요약 중 예상치 못한 오류 (%s): %s", article['id'], e)
+                article['summary'] = "기사 요약 중 오류가 발생했습니다."
+            article.pop('image_base64', None)
+            article['embed'] = build_embed(article, article['site_colors'])
+            await journal_write(get_pipeline_journal().record_summarized, article)
+            results = await asyncio.gather(*futures)
+            if syncing is not None:
+                await syncing
+            await sync_messages()
+        except Exception as e:
+            logger.error("스트리밍 요약 중 예상치 못한 오류 (%s): %s", article['id'], e)
+            self._finish(article, False)
+            return
+        finally:
+            summary_task.cancel()
+            if syncing is not None:
+                syncing.cancel()
+        self._finish(article, all(results))
+
+    async def _deliver_worker(self):
+        while True:
+            article = await self.deliver_queue.get()
+            try:
+                # 채널 대기열에 넣기만 하고 전송 완료는 기다리지 않음 (채널 대기열이 가득 차면 여기서 기다림)
+                futures = [await deliver_article(state, article) for state in article['pending_states']]
+                if futures:
+                    asyncio.gather(*futures).add_done_callback(
+                        lambda results, article=article: self._finish(
+                            article, not results.cancelled() and results.exception() is None and all(results.result())
+                        )
+                    )
+                else:
+                    self._finish(article, True)
+            except Exception as e:
+                logger.error("기사 전달 중 예상치 못한 오류 (%s): %s", article['id'], e)
+                self._finish(article, False)
+            finally:
+                self.deliver_queue.task_done()
+
+article_pipeline = ArticlePipeline(PIPELINE_QUEUE_SIZE, ENRICH_WORKERS, SUMMARIZE_WORKERS, DELIVER_WORKERS)
+
+def load_channel_states(channels):
+    """채널별 전달 상태를 만듭니다. 전송 기록은 저장소에서 처음 조회할 때 불러옵니다."""
+    return [
+        {
+            'channel': channel,
+            'id_str': str(channel.id),
+            'delivered_count': 0,
+        }
+        for channel in channels
+    ]
+
+def delivery_channel_ids():
+    """전달 대상 채널 ID. 웹훅 모드에서 DISCORD_CHANNEL_IDS를 비워 두면 등록된 웹훅의 채널 전부입니다."""
+    if DELIVERY_MODE == 'webhook' and not DISCORD_CHANNEL_IDS:
+        return list(webhook_channels)
+    return list(DISCORD_CHANNEL_IDS)
+
+def target_channel_states(channel_ids):
+    """전달 대상 채널 ID로 채널 상태를 만듭니다. 수집 전용 워커는 Discord 채널 객체 없이 ID만 담습니다."""
+    if SHARD_ROLE == 'ingest':
+        return [{'channel': None, 'id_str': str(channel_id), 'delivered_count': 0} for channel_id in channel_ids]
+    return load_channel_states(resolve_channels(channel_ids))
+
+def is_article_sent(channel_state, article_id, normalized_url):
+    """원본 URL과 정규화된 URL 모두로 채널 전송 기록을 확인합니다."""
+    return get_sent_store().contains(channel_state['id_str'], article_id, normalized_url)
+
+class RateLimitBucket:
+    """Discord 레이트 리밋 버킷 상태. 응답 헤더나 429의 retry_after로 갱신하고, 남은 요청이 없으면 초기화 시각까지 기다립니다.
+
+    웹훅 모드에서는 응답 헤더로 실제 한도를 배웁니다. 게이트웨이(discord.py) 모드에서는 discord.py가 라우트별 버킷과
+    429 재시도를 직접 처리하고 헤더를 내주지 않으므로, 이 버킷은 기본 한도(5회/5초)로 보내는 속도를 고정하는 역할만 합니다.
+    """
+
+    def __init__(self, limit=5, per=5.0):
+        # 헤더를 받기 전에는 Discord 채널 메시지 기본 한도(5회/5초)를 가정
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset_at = 0.0
+
+    def update(self, limit=None, remaining=None, reset_after=None):
+        if limit is not None:
+            self.limit = limit
+        if remaining is not None:
+            self.remaining = remaining
+        if reset_after is not None:
+            self.reset_at = time.monotonic() + reset_after
+
+    def update_from_headers(self, headers):
+        """X-RateLimit-Limit/Remaining/Reset-After 헤더를 반영합니다."""
+        try:
+            self.update(
+                limit=int(headers['X-RateLimit-Limit']) if 'X-RateLimit-Limit' in headers else None,
+                remaining=int(headers['X-RateLimit-Remaining']) if 'X-RateLimit-Remaining' in headers else None,
+                reset_after=float(headers['X-RateLimit-Reset-After']) if 'X-RateLimit-Reset-After' in headers else None,
+            )
+        except ValueError:
+            pass
+
+    def on_rate_limited(self, retry_after):
+        self.update(remaining=0, reset_after=retry_after)
+
+    async def wait(self):
+        now = time.monotonic()
+        if now >= self.reset_at:
+            self.remaining = max(self.remaining, self.limit)
+            self.reset_at = now + self.per
+        elif self.remaining <= 0:
+            await asyncio.sleep(self.reset_at - now)
+            self.remaining = self.limit
+            self.reset_at = time.monotonic() + self.per
+        self.remaining -= 1
+
+
+class WebhookChannel:
+    """Discord 웹훅 하나를 채널처럼 쓰는 전송 대상. 게이트웨이 연결 없이 공유 HTTP 세션으로 보냅니다.
+
+    응답의 레이트 리밋 헤더는 bucket에 반영하고, 실패는 discord.py와 같은 예외로 올려 ChannelDelivery가 그대로 처리합니다.
+    """
+
+    def __init__(self, url, channel_id, name):
+        self.url = url
+        self.id = channel_id
+        self.name = name
+        self.bucket = RateLimitBucket()
+        self.edit_bucket = RateLimitBucket()  # 메시지 수정(PATCH)은 전송과 버킷이 다름
+
+    async def send(self, embeds):
+        data = await self._request('POST', self.url, embeds, self.bucket, params={'wait': 'true'})
+        return WebhookMessage(self, data['id'])
+
+    async def edit_message(self, message_id, embeds):
+        await self._request('PATCH', f"{self.url}/messages/{message_id}", embeds, self.edit_bucket)
+
+    async def _request(self, method, url, embeds, bucket, params=None):
+        session = await get_webhook_session()
+        payload = {'embeds': [embed.to_dict() for embed in embeds]}
+        async with session.request(method, url, params=params, json=payload,
+                                   timeout=aiohttp.ClientTimeout(total=FEED_FETCH_TIMEOUT)) as response:
+            bucket.update_from_headers(response.headers)
+            if response.status < 300:
+                return await response.json()
+            try:
+                data = await response.json(content_type=None)
+            except ValueError:
+                data = await response.text()
+            if response.status == 429:
+                error = discord.HTTPException(response, data)
+                retry_after = data.get('retry_after') if isinstance(data, dict) else None
+                error.retry_after = float(retry_after) if retry_after is not None else parse_retry_after(response.headers.get('Retry-After'))
+                raise error
+            if response.status == 403:
+                raise discord.Forbidden(response, data)
+            if response.status == 404:
+                raise discord.NotFound(response, data)
+            raise discord.HTTPException(response, data)
+
+
+class WebhookMessage:
+    """웹훅으로 보낸 메시지. discord.Message처럼 edit(embeds=...)로 고칠 수 있습니다."""
+
+    def __init__(self, webhook, message_id):
+        self.webhook = webhook
+        self.id = message_id
+
+    async def edit(self, embeds):
+        await self.webhook.edit_message(self.id, embeds)
+
+
+webhook_channels = {}  # 채널 ID -> WebhookChannel
+
+async def load_webhook_channels(webhook_urls):
+    """웹훅 정보를 조회해 각 웹훅이 가리키는 채널 ID로 전송 대상을 등록합니다."""
+    session = await get_webhook_session()
+    for url in webhook_urls:
+        try:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=FEED_FETCH_TIMEOUT)) as response:
+                response.raise_for_status()
+                info = await response.json()
+        except Exception as e:
+            logger.error("웹훅 정보를 가져오지 못했습니다 (%s): %s", urlparse(url).path.rsplit('/', 1)[0], e)
+            continue
+        channel_id = int(info['channel_id'])
+        if channel_id in webhook_channels:
+            logger.warning("채널 %s에 웹훅이 여러 개 있습니다. 마지막 웹훅을 사용합니다.", channel_id)
+        webhook_channels[channel_id] = WebhookChannel(url, channel_id, info.get('name') or str(channel_id))
+    logger.info("웹훅 %s개 로드: 채널 %s", len(webhook_channels), list(webhook_channels))
+    return webhook_channels
+
+
+class ChannelDelivery:
+    """채널 하나의 전송 대기열.
+
+    레이트 리밋 버킷이 허락하는 만큼 바로 보내고, 여러 기사가 쌓여 있으면 Embed를 최대 10개(총 6000자)까지 한 메시지로 묶습니다.
+    실패한 전송은 버리지 않고 DELIVERY_MAX_RETRIES번까지 다시 시도합니다.
+    스트리밍 요약 중인 기사(article['messages']가 있음)도 다른 기사와 묶어 보내고, 나중에 고칠 수 있게 메시지 기록을 기사에 남깁니다.
+    메시지 수정은 전송과 다른 레이트 리밋 버킷(edit_bucket)을 써서 새 기사 전송을 늦추지 않습니다.
+    """
+
+    max_embeds_per_message = 10
+    max_embed_chars_per_message = 6000
+
+    def __init__(self, channel, queue_size):
+        self.channel = channel
+        self.id_str = str(channel.id)
+        # 웹훅은 응답 헤더로 직접 버킷을 갱신하므로 그 버킷을 함께 씀. 게이트웨이 채널은 고정 속도로만 보냄
+        self.bucket = getattr(channel, 'bucket', None) or RateLimitBucket()
+        self.edit_bucket = getattr(channel, 'edit_bucket', None) or RateLimitBucket()
+        self._pending = collections.deque()
+        self._delayed = 0  # 백오프 뒤 다시 넣을 기사 수
+        self._blocked_until = 0.0  # 권한이 없어 전송을 멈춘 채널의 재개 시각
+        self._space = asyncio.Semaphore(queue_size)
+        self._ready = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def put(self, channel_state, article):
+        """기사를 대기열에 넣습니다. 대기열이 가득 차면 자리가 날 때까지 기다립니다. 전송 결과 future를 반환합니다."""
+        await self._space.acquire()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append({'state': channel_state, 'article': article, 'future': future, 'attempts': 0,
+                              'solo': False})
+        self._ready.set()
+        return future
+
+    def depth(self):
+        """전송을 기다리는 기사 수 (재시도 백오프 중인 기사 포함)."""
+        return len(self._pending) + self._delayed
+
+    def _take_batch(self):
+        batch = [self._pending.popleft()]
+        if batch[0]['solo']:
+            return batch
+        total_chars = len(batch[0]['article']['embed'])
+        while self._pending and len(batch) < self.max_embeds_per_message:
+            item = self._pending[0]
+            item_chars = len(item['article']['embed'])
+            if item['solo'] or total_chars + item_chars > self.max_embed_chars_per_message:
+                break
+            batch.append(self._pending.popleft())
+            total_chars += item_chars
+        return batch
+
+    def _resolve(self, item, delivered):
+        self._space.release()
+        if not item['future'].done():
+            item['future'].set_result(delivered)
+
+    def _retry_later(self, batch, split=False):
+        for item in reversed(batch):
+            if split:
+                item['solo'] = True
+            self._pending.appendleft(item)
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            if time.monotonic() < self._blocked_until:
+                # 권한이 돌아올 때까지는 보내 보지 않고 실패로 돌려 다음 폴링에서 다시 처리하게 함
+                while self._pending:
+                    self._resolve(self._pending.popleft(), False)
+                continue
+            await self.bucket.wait()
+            batch = self._take_batch()
+            embeds = [item['article']['embed'] for item in batch]
+            send_start_time = time.monotonic()
+            try:
+                message = await self.channel.send(embeds=embeds)
+            except discord.Forbidden:
+                DISCORD_MESSAGES.inc(result='forbidden')
+                logger.error("채널 %s에 메시지(Embed)를 보낼 권한이 없습니다. %s초 동안 전송을 멈춥니다.",
+                             self.id_str, DELIVERY_FORBIDDEN_BACKOFF)
+                # 보내지 못한 기사는 전송 기록에 남기지 않고 실패로 돌려, 권한이 돌아온 뒤 다시 보내게 함
+                self._blocked_until = time.monotonic() + DELIVERY_FORBIDDEN_BACKOFF
+                for item in batch:
+                    self._resolve(item, False)
+                continue
+            except discord.HTTPException as e:
+                DISCORD_MESSAGES.inc(result='error')
+                logger.error("채널 %s 메시지(Embed) 전송 중 Discord API 오류: %s - %s", self.id_str, e.status, e.text)
+                if e.status == 429:
+                    DISCORD_RATE_LIMITED.inc()
                     retry_after = getattr(e, 'retry_after', 5.0)
-                    print(f"   Discord Rate Limit 감지. {retry_after:.1f}초 대기 후 계속합니다.")
-                    await asyncio.sleep(retry_after)
+                    logger.warning("Discord Rate Limit 감지. %.1f초 후 다시 보냅니다.", retry_after)
+                    self.bucket.on_rate_limited(retry_after)
+                    self._retry_later(batch)
+                    continue
+                if e.status == 400 and len(batch) > 1:
+                    # 묶음 중 하나가 문제일 수 있으므로 하나씩 다시 보냄
+                    self._retry_later(batch, split=True)
+                    continue
+                self._handle_failure(batch)
+                continue
             except Exception as e:
-                print(f"   오류: 메시지(Embed) 전송 또는 처리 중 예상치 못한 오류: {e}")
+                DISCORD_MESSAGES.inc(result='error')
+                logger.error("채널 %s 메시지(Embed) 전송 중 예상치 못한 오류: %s", self.id_str, e)
+                self._handle_failure(batch)
+                continue
 
-            if new_articles_processed_count > 0 and new_articles_processed_count % 5 == 0:
-                   print(f"   5개 항목 처리 후 잠시 대기...")
-                   await asyncio.sleep(30)
+            record_stage_latency('deliver', time.monotonic() - send_start_time)
+            DISCORD_MESSAGES.inc(result='ok')
+            logger.debug("채널 %s: Embed %s개 전송 성공.", self.id_str, len(batch))
+            sent = None
+            if any('messages' in item['article'] for item in batch):
+                # 한 메시지에 묶인 기사들이 같이 쓰는 기록. 고칠 때는 Embed 전체를 다시 보냄
+                sent = {'message': message, 'articles': [item['article'] for item in batch], 'embeds': embeds,
+                        'lock': asyncio.Lock()}
+            for item in batch:
+                if 'submitted_at' in item['article']:
+                    record_stage_latency('first_post', time.monotonic() - item['article']['submitted_at'])
+                if 'messages' in item['article']:
+                    item['article']['messages'][self.id_str] = sent
+                # 전송 성공 후에만 저장 (메모리와 파일 동기화 보장)
+                await save_sent_article(self.id_str, item['article']['id'])
+                item['state']['delivered_count'] += 1
+                self._resolve(item, True)
 
-    print(f"채널 {channel_id_str}: 총 {new_articles_processed_count}개의 새 기사 처리 완료.")
+    async def edit(self, sent):
+        """보낸 메시지를 거기 묶인 기사들의 지금 Embed로 고칩니다. 바뀐 것이 없거나 고치는 데 성공하면 True를 반환합니다."""
+        async with sent['lock']:
+            for attempt in range(DELIVERY_MAX_RETRIES + 1):
+                if all(article['embed'] is embed for article, embed in zip(sent['articles'], sent['embeds'])):
+                    return True
+                await self.edit_bucket.wait()
+                # 기다리는 사이 바뀐 내용까지 한 번에 반영
+                embeds = [article['embed'] for article in sent['articles']]
+                try:
+                    await sent['message'].edit(embeds=embeds)
+                except discord.HTTPException as e:
+                    if e.status == 429 and attempt < DELIVERY_MAX_RETRIES:
+                        DISCORD_RATE_LIMITED.inc()
+                        self.edit_bucket.on_rate_limited(getattr(e, 'retry_after', 5.0))
+                        continue
+                    DISCORD_MESSAGE_EDITS.inc(result='error')
+                    logger.warning("채널 %s 메시지 수정 중 Discord API 오류: %s - %s", self.id_str, e.status, e.text)
+                    return False
+                except Exception as e:
+                    DISCORD_MESSAGE_EDITS.inc(result='error')
+                    logger.warning("채널 %s 메시지 수정 중 예상치 못한 오류: %s", self.id_str, e)
+                    return False
+                sent['embeds'] = embeds
+                DISCORD_MESSAGE_EDITS.inc(result='ok')
+                return True
+            return False
 
-@client.event
-async def on_ready():
-    global DISCORD_CHANNEL_IDS, RSS_FEED_URLS, site_color_map
+    def _handle_failure(self, batch):
+        """실패한 기사를 재시도 횟수만큼 백오프 뒤 대기열에 다시 넣습니다. 기다리는 동안에도 다른 기사는 계속 보냅니다."""
+        retry = []
+        for item in batch:
+            item['attempts'] += 1
+            if item['attempts'] > DELIVERY_MAX_RETRIES:
+                logger.error("채널 %s에 '%s' 전송을 %s번 재시도했지만 실패했습니다.", self.id_str, item['article']['title'], DELIVERY_MAX_RETRIES)
+                self._resolve(item, False)
+            else:
+                retry.append(item)
+        if retry:
+            backoff = min(2 ** retry[0]['attempts'], 60)
+            logger.warning("채널 %s: %s초 후 %s개 기사 전송을 다시 시도합니다.", self.id_str, backoff, len(retry))
+            self._delayed += len(retry)
+            asyncio.get_running_loop().call_later(backoff, self._requeue, retry)
 
-    print(f"봇 로그인: {client.user.name} (ID: {client.user.id})")
+    def _requeue(self, batch):
+        self._delayed -= len(batch)
+        self._retry_later(batch)
+        self._ready.set()
 
-    if not load_initial_config():
-        print("초기 설정 로드 실패. 봇을 종료합니다.")
-        await client.close()
+channel_deliveries = {}
+
+def get_channel_delivery(channel):
+    """채널별 전송 대기열을 처음 사용할 때 만듭니다."""
+    delivery = channel_deliveries.get(channel.id)
+    if delivery is None:
+        delivery = ChannelDelivery(channel, CHANNEL_QUEUE_SIZE)
+        channel_deliveries[channel.id] = delivery
+    else:
+        delivery.channel = channel
+    return delivery
+
+async def deliver_article(channel_state, article):
+    """이미 만들어진 Embed를 채널 전송 대기열에 넣습니다. 전송 결과(bool)로 완료되는 future를 반환합니다.
+
+    Discord 연결이 없는 수집 전용 워커에서는 전달 워커가 가져가도록 outbox에 넘기고 바로 완료합니다.
+    """
+    if channel_state['channel'] is None:
+        # outbox는 다른 프로세스와 같이 쓰므로 잠금을 기다리는 동안 이벤트 루프를 막지 않게 executor에서 씀
+        await asyncio.get_running_loop().run_in_executor(None, get_delivery_outbox().put, channel_state['id_str'], article)
+        channel_state['delivered_count'] += 1
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(True)
+        return future
+    return await get_channel_delivery(channel_state['channel']).put(channel_state, article)
+
+def prune_recent_articles():
+    """처리 중 중복 판단 창(RECENT_ARTICLE_WINDOW)을 벗어난 URL 기록을 정리합니다."""
+    cutoff = time.monotonic() - RECENT_ARTICLE_WINDOW
+    for key in [key for key, seen_at in recent_processed.items() if seen_at < cutoff]:
+        del recent_processed[key]
+
+def pending_channel_states(rss_feed_url, article_id, normalized_url, channel_states):
+    """아직 이 기사를 받지 않은 채널 목록을 반환합니다. 처리 중이거나 모든 채널에 보낸 기사면 건너뛴 이유를 세고 빈 목록."""
+    if article_id in recent_processed or normalized_url in recent_processed:
+        logger.debug("이미 처리된 항목: %s", article_id, extra={'feed': rss_feed_url})
+        ARTICLES_SKIPPED.inc(reason='recent')
+        return []
+    pending_states = [state for state in channel_states if not is_article_sent(state, article_id, normalized_url)]
+    if not pending_states:
+        logger.debug("이미 처리된 항목: %s", article_id, extra={'feed': rss_feed_url})
+        ARTICLES_SKIPPED.inc(reason='sent')
+    return pending_states
+
+def discover_entry(entry, feed, rss_feed_url, article_id, channel_states, site_colors, title_index, body_index, content_texts):
+    """발견 단계: 항목 하나를 중복 검사하고, 새 기사면 파이프라인에 넣을 기사 정보를 반환합니다. 중복이면 None.
+
+    content_texts는 extract_entry_texts가 미리 만든 (본문 전체, 요약용 본문)입니다.
+    """
+    # URL 정규화
+    normalized_url = normalize_url(article_id)
+
+    # 아직 이 기사를 받지 않은 채널만 전달 대상 (본문 추출을 기다리는 동안 다른 피드가 잡았을 수 있어 다시 확인)
+    pending_states = pending_channel_states(rss_feed_url, article_id, normalized_url, channel_states)
+    if not pending_states:
+        return None
+
+    # 제목 기반 중복 체크
+    article_title = getattr(entry, 'title', '제목 없음').strip()
+    normalized_title = normalize_title(article_title)
+
+    # 최근 기사 중 제목이나 본문이 비슷한 기사가 있는지 확인 (피드/주기/재시작과 무관)
+    title_match, title_signature = title_index.query(
+        title_tokens(normalized_title), exclude=article_id,
+        verify=lambda processed_title: calculate_title_similarity(normalized_title, processed_title)
+    )
+    if title_match:
+        logger.debug("유사한 제목의 기사 이미 처리됨 (유사도: %.2f): %s", title_match[1], article_title, extra={'feed': rss_feed_url})
+        ARTICLES_SKIPPED.inc(reason='similar_title')
+        return None
+
+    # 중복 검사는 본문 전체로 하고, 요약에는 토큰 예산 안에서 고른 문장만 보냄
+    article_content_text, summary_text = content_texts
+    body_match, body_signature = body_index.query(body_shingles(article_content_text), exclude=article_id)
+    if body_match:
+        logger.debug("유사한 본문의 기사 이미 처리됨 (추정 유사도: %.2f): %s", body_match[1], article_title, extra={'feed': rss_feed_url})
+        ARTICLES_SKIPPED.inc(reason='similar_body')
+        return None
+
+    logger.info("새 기사 발견: '%s' (%s) -> %s개 채널", article_title, rss_feed_url, len(pending_states), extra={'feed': rss_feed_url})
+
+    # 최근 처리 목록에 추가 (다른 피드가 동시에 같은 기사를 잡지 않도록 await 전에 기록)
+    now = time.monotonic()
+    recent_processed[article_id] = now
+    recent_processed[normalized_url] = now
+    title_index.add(article_id, title_signature, normalized_title)
+    body_index.add(article_id, body_signature)
+    article = new_article(entry, feed, rss_feed_url, article_id, normalized_url, article_title, summary_text)
+    article['pending_states'] = pending_states
+    article['site_colors'] = site_colors
+    ARTICLES_DISCOVERED.inc()
+    return article
+
+async def process_feed(rss_feed_url, channel_states, site_colors):
+    """피드 하나를 가져와 새 기사를 찾고 (발견 단계), 파이프라인에 넣어 아직 받지 않은 채널들에 전달합니다.
+
+    (가져오기 상태, feed)를 반환합니다. 스케줄러가 다음 폴링 간격을 정할 때 사용합니다.
+    """
+    channels_key = ','.join(sorted(state['id_str'] for state in channel_states))
+    fetch_status, feed, validators = await fetch_and_parse_feed(rss_feed_url, channels_key)
+    FEED_FETCHES.inc(status=fetch_status)
+    if fetch_status != 'ok':
+        return fetch_status, None
+    await maybe_subscribe_websub(rss_feed_url, feed)
+    await process_feed_document(rss_feed_url, feed, validators, channel_states, site_colors, channels_key)
+    return fetch_status, feed
+
+async def process_feed_document(rss_feed_url, feed, validators, channel_states, site_colors, channels_key):
+    """파싱된 피드(폴링 결과 또는 WebSub push)의 항목을 발견 단계에 넣고 전달이 끝날 때까지 기다립니다.
+
+    모두 전달되면 검증값과 증분 스캔 상태를 저장합니다. push처럼 검증값이 없으면 상태는 저장하지 않습니다.
+    """
+    prune_recent_articles()
+    title_index, body_index = get_near_duplicate_indexes()
+    if shard_coordinator is not None:
+        # 다른 워커가 그사이 처리/전송한 기사도 중복으로 보도록 공유 파일에서 새 항목을 읽음
+        await title_index.refresh()
+        await body_index.refresh()
+        for state in channel_states:
+            get_sent_store().refresh(state['id_str'])
+    new_articles_processed_count = 0
+
+    # 증분 모드: 지난번에 본 항목 ID/발행 시각을 기준으로, 이미 확인한 구간이 연속으로 나오면 스캔을 멈춤
+    scan_state = get_feed_state_store().get(rss_feed_url)
+    incremental = INCREMENTAL_SAFETY_WINDOW > 0 and scan_state.get('channels_key') == channels_key
+    known_ids = set(scan_state.get('seen_ids', [])) if incremental else set()
+    known_newest = scan_state.get('newest_published') if incremental else None
+    newest_published = known_newest
+    consecutive_known = 0
+    scanned_ids = []
+
+    # 전달에 실패한 기사가 있으면 검증값을 저장하지 않아 다음 폴링 때 다시 처리
+    feed_complete = True
+    pending_deliveries = []
+    # 본문 추출은 후보 항목을 EXTRACT_BATCH_SIZE개씩 모아 파싱 워커 풀에서 처리
+    candidates = []
+    loop = asyncio.get_running_loop()
+
+    async def discover_candidates():
+        nonlocal new_articles_processed_count
+        batch = candidates[:]
+        candidates.clear()
+        content_texts = await loop.run_in_executor(
+            get_parse_executor(), extract_entry_texts, rss_feed_url,
+            [(article_id, entry_html(entry)) for entry, article_id in batch]
+        )
+        for (entry, article_id), texts in zip(batch, content_texts):
+            dedup_start_time = time.monotonic()
+            article = discover_entry(entry, feed, rss_feed_url, article_id, channel_states, site_colors,
+                                     title_index, body_index, texts)
+            record_stage_latency('dedup', time.monotonic() - dedup_start_time)
+            if article:
+                new_articles_processed_count += 1
+                # 파이프라인 큐가 가득 차면 여기서 기다림 (backpressure)
+                pending_deliveries.append((article, await article_pipeline.submit(article)))
+        # 이번 묶음에서 추가한 서명을 한 트랜잭션으로 저장
+        await flush_near_duplicate_indexes()
+
+    entries = iterate_feed_entries(feed)
+    try:
+        async for entry in entries:
+            article_id = getattr(entry, 'link', None)
+            if not article_id:
+                   article_id = getattr(entry, 'id', None)
+            if not article_id:
+                   logger.warning("링크 또는 ID 없는 항목 발견. 건너뜁니다. (제목: %s)", getattr(entry, 'title', 'N/A'), extra={'feed': rss_feed_url})
+                   continue
+            scanned_ids.append(article_id)
+
+            published = entry.get('published_parsed') or entry.get('updated_parsed')
+            published_ts = calendar.timegm(published) if published else None
+            if published_ts is not None and (newest_published is None or published_ts > newest_published):
+                newest_published = published_ts
+            if incremental and (article_id in known_ids or (
+                    published_ts is not None and known_newest is not None and published_ts <= known_newest)):
+                consecutive_known += 1
+                if consecutive_known >= INCREMENTAL_SAFETY_WINDOW:
+                    logger.debug("이미 확인한 항목이 %s개 연속으로 나와 나머지 스캔을 건너뜁니다.", consecutive_known, extra={'feed': rss_feed_url})
+                    break
+            else:
+                consecutive_known = 0
+
+            # 이미 처리했거나 보낸 항목은 본문을 추출하지 않고 바로 건너뜀
+            if not pending_channel_states(rss_feed_url, article_id, normalize_url(article_id), channel_states):
+                continue
+            candidates.append((entry, article_id))
+            if len(candidates) >= EXTRACT_BATCH_SIZE:
+                await discover_candidates()
+        if candidates:
+            await discover_candidates()
+    finally:
+        await entries.aclose()
+
+    if not scanned_ids:
+        logger.info("'%s' 피드에 항목이 없습니다.", rss_feed_url, extra={'feed': rss_feed_url})
+
+    for article, delivered in pending_deliveries:
+        if not await delivered:
+            feed_complete = False
+            # 다음 폴링 때 다시 시도할 수 있도록 최근 처리 기록에서 제외
+            recent_processed.pop(article['id'], None)
+            recent_processed.pop(article['normalized_url'], None)
+            title_index.discard(article['id'])
+            body_index.discard(article['id'])
+    await flush_near_duplicate_indexes()
+
+    if feed.get('stream_error') is not None:
+        # 읽지 못한 항목이 있으므로 다음 폴링 때 처음부터 다시 보도록 검증값과 스캔 상태를 저장하지 않음
+        logger.warning("'%s' 피드를 끝까지 읽지 못해 이번 폴링 상태는 저장하지 않습니다.", rss_feed_url, extra={'feed': rss_feed_url})
+        feed_complete = False
+
+    if feed_complete:
+        seen_ids = list(dict.fromkeys(scanned_ids + list(scan_state.get('seen_ids', []))))[:INCREMENTAL_SEEN_IDS]
+        await commit_feed_validators(rss_feed_url, validators, seen_ids=seen_ids, newest_published=newest_published)
+    logger.info("'%s': %s개의 새 기사 처리 완료.", rss_feed_url, new_articles_processed_count, extra={'feed': rss_feed_url})
+
+async def fetch_feed(channels, site_colors, current_rss_feeds):
+    """모든 피드를 한 번씩 동시에 처리합니다. 스케줄러 없이 한 주기만 돌릴 때 사용합니다."""
+    channel_states = load_channel_states(channels)
+    if not channel_states:
         return
 
-    print(f"등록된 채널 ID: {DISCORD_CHANNEL_IDS}")
-    print(f"등록된 RSS 피드 수: {len(RSS_FEED_URLS)}")
-    print(f"로드된 사이트별 색상 수: {len(site_color_map)}")
-    print("-" * 20)
-    print("봇이 준비되었습니다. 10초 후 첫 RSS 피드 확인을 시작합니다.")
-    await asyncio.sleep(10)
+    feed_urls = [url for url in current_rss_feeds if url]
+    logger.info("피드 %s개 동시 처리 시작...", len(feed_urls))
+    results = await asyncio.gather(
+        *(process_feed(url, channel_states, site_colors) for url in feed_urls),
+        return_exceptions=True
+    )
+    for rss_feed_url, result in zip(feed_urls, results):
+        if isinstance(result, Exception):
+            logger.error("'%s' 피드 처리 중 예외 발생: %s - %s", rss_feed_url, type(result).__name__, result)
+
+    for state in channel_states:
+        logger.info("채널 %s: 총 %s개의 새 기사 전송 완료.", state['id_str'], state['delivered_count'])
+
+class WebSubSubscriptions:
+    """WebSub(PubSubHubbub) 구독 상태 저장소.
+
+    피드마다 허브/토픽 URL, 콜백 경로에 쓰는 추측하기 어려운 ID, 서명 검증용 secret, 상태와 임대 만료 시각을 둡니다.
+    상태는 requested(구독 요청 후 확인 대기), active, denied, unsubscribing 중 하나입니다.
+    콜백을 받는 프로세스와 구독한 프로세스가 다를 수 있으므로 메모리에 두지 않고 매번 파일에서 읽습니다.
+    샤딩 모드에서 다른 워커가 맡은 피드의 push는 websub_pushes에 넣어 두고, 그 피드를 맡은 워커가 꺼내 처리합니다.
+    """
+
+    fields = ('feed_url', 'callback_id', 'hub_url', 'topic_url', 'secret', 'state', 'lease_expires_at', 'requested_at')
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = open_state_db(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS websub_subscriptions ("
+            " feed_url TEXT PRIMARY KEY,"
+            " callback_id TEXT NOT NULL UNIQUE,"
+            " hub_url TEXT NOT NULL,"
+            " topic_url TEXT NOT NULL,"
+            " secret TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " lease_expires_at REAL,"
+            " requested_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS websub_pushes ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " feed_url TEXT NOT NULL,"
+            " body BLOB NOT NULL,"
+            " received_at REAL NOT NULL)"
+        )
+
+    def _select(self, where, params):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self.fields)} FROM websub_subscriptions WHERE {where}", params
+            ).fetchall()
+        return [dict(zip(self.fields, row)) for row in rows]
+
+    def get(self, feed_url):
+        rows = self._select("feed_url = ?", (feed_url,))
+        return rows[0] if rows else None
+
+    def by_callback(self, callback_id):
+        rows = self._select("callback_id = ?", (callback_id,))
+        return rows[0] if rows else None
+
+    def all(self):
+        return self._select("1", ())
+
+    def save(self, subscription):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO websub_subscriptions ({', '.join(self.fields)})"
+                f" VALUES ({', '.join('?' * len(self.fields))})",
+                [subscription.get(field) for field in self.fields]
+            )
+
+    def delete(self, feed_url):
+        with self._lock:
+            self._conn.execute("DELETE FROM websub_subscriptions WHERE feed_url = ?", (feed_url,))
+
+    def queue_push(self, feed_url, body):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO websub_pushes (feed_url, body, received_at) VALUES (?, ?, ?)", (feed_url, body, time.time())
+            )
+
+    def pushed_feeds(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT feed_url FROM websub_pushes").fetchall()]
+
+    def take_pushes(self, feed_url):
+        """피드에 넘겨진 push 내용을 받은 순서대로 꺼내고 지웁니다."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT seq, body FROM websub_pushes WHERE feed_url = ? ORDER BY seq", (feed_url,)
+                ).fetchall()
+                self._conn.execute("DELETE FROM websub_pushes WHERE feed_url = ? AND seq <= ?",
+                                   (feed_url, rows[-1][0] if rows else 0))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [body for _, body in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_websub_subscriptions():
+    """WebSub 구독 저장소를 처음 사용할 때 엽니다."""
+    global websub_subscriptions
+    if websub_subscriptions is None:
+        websub_subscriptions = WebSubSubscriptions(state_db_file)
+    return websub_subscriptions
+
+websub_requests = set()  # 허브에 요청을 보내는 중인 피드 URL
+websub_push_tasks = set()  # 처리 중이거나 차례를 기다리는 push 작업
+websub_push_last = {}  # 피드 URL -> 그 피드의 마지막 push 작업 (같은 피드는 받은 순서대로 처리)
+websub_push_slots = None
+
+async def run_websub_store(method, *args):
+    """WebSub 저장소 작업은 다른 프로세스의 잠금을 기다릴 수 있으므로 기본 executor에서 합니다."""
+    return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+def subscription_lease_remaining(subscription):
+    """활성 구독의 남은 임대 시간(초). 구독이 없거나 만료되었으면 None."""
+    if subscription is None or subscription['state'] != 'active' or not subscription['lease_expires_at']:
+        return None
+    remaining = subscription['lease_expires_at'] - time.time()
+    return remaining if remaining > 0 else None
+
+async def websub_lease_remaining(rss_feed_url):
+    """피드 구독의 남은 임대 시간(초). WebSub을 쓰지 않거나 구독이 없으면 None."""
+    if not WEBSUB_CALLBACK_URL:
+        return None
+    try:
+        subscription = await run_websub_store(get_websub_subscriptions().get, rss_feed_url)
+    except sqlite3.Error as e:
+        logger.warning("'%s' WebSub 구독 상태를 읽지 못했습니다: %s", rss_feed_url, e)
+        return None
+    return subscription_lease_remaining(subscription)
+
+def find_websub_links(feed):
+    """피드의 <link rel="hub">와 <link rel="self">에서 (허브 URL, 토픽 URL)을 찾습니다."""
+    hub_url = topic_url = None
+    for link in feed.feed.get('links', []):
+        rel, href = link.get('rel'), link.get('href')
+        if rel == 'hub' and hub_url is None:
+            hub_url = href
+        elif rel == 'self' and topic_url is None:
+            topic_url = href
+    return hub_url, topic_url
+
+async def maybe_subscribe_websub(rss_feed_url, feed):
+    """허브를 알리는 피드면 구독(또는 곧 끝나는 임대 갱신)을 요청합니다. 확인을 기다리는 요청은 1시간 뒤에 다시 보냅니다."""
+    if not WEBSUB_CALLBACK_URL:
+        return
+    hub_url, topic_url = find_websub_links(feed)
+    if not hub_url:
+        return
+    try:
+        subscription = await run_websub_store(get_websub_subscriptions().get, rss_feed_url)
+    except sqlite3.Error as e:
+        logger.warning("'%s' WebSub 구독 상태를 읽지 못했습니다: %s", rss_feed_url, e)
+        return
+    if subscription is not None and subscription['hub_url'] == hub_url:
+        remaining = subscription_lease_remaining(subscription)
+        if remaining is not None and remaining > websub_renew_margin():
+            return
+        if subscription['state'] in ('requested', 'denied') and time.time() - subscription['requested_at'] < 3600:
+            return
+    asyncio.ensure_future(request_websub(rss_feed_url, 'subscribe', hub_url, topic_url or rss_feed_url))
+
+def websub_renew_margin():
+    return max(WEBSUB_LEASE_SECONDS * 0.1, 600)
+
+async def request_websub(rss_feed_url, mode, hub_url, topic_url):
+    """허브에 구독/구독 해지를 요청합니다. 실제 적용은 허브가 콜백으로 확인(verification of intent)을 보낸 뒤입니다."""
+    if rss_feed_url in websub_requests:
+        return
+    websub_requests.add(rss_feed_url)
+    store = get_websub_subscriptions()
+    try:
+        subscription = await run_websub_store(store.get, rss_feed_url) or {
+            'feed_url': rss_feed_url,
+            'callback_id': secrets.token_urlsafe(16),
+            'secret': secrets.token_hex(32),
+        }
+        subscription.update(hub_url=hub_url, topic_url=topic_url, requested_at=time.time(),
+                            state='requested' if mode == 'subscribe' else 'unsubscribing')
+        await run_websub_store(store.save, subscription)
+        data = {
+            'hub.mode': mode,
+            'hub.topic': topic_url,
+            'hub.callback': f"{WEBSUB_CALLBACK_URL}/{subscription['callback_id']}",
+        }
+        if mode == 'subscribe':
+            data['hub.lease_seconds'] = str(WEBSUB_LEASE_SECONDS)
+            data['hub.secret'] = subscription['secret']
+        status, text = await fetch_pool.post(hub_url, data, timeout=FEED_FETCH_TIMEOUT)
+        if 200 <= status < 300:
+            logger.info("WebSub %s 요청 보냄: '%s' (허브 %s)", mode, rss_feed_url, hub_url, extra={'feed': rss_feed_url})
+        else:
+            logger.warning("WebSub 허브가 %s 요청을 거절했습니다 (%s): '%s' - %s", mode, status, rss_feed_url, text[:200],
+                           extra={'feed': rss_feed_url})
+    except Exception as e:
+        logger.warning("WebSub %s 요청 실패 ('%s'): %s", mode, rss_feed_url, e, extra={'feed': rss_feed_url})
+    finally:
+        websub_requests.discard(rss_feed_url)
+
+def websub_signature_valid(secret, body, header):
+    """X-Hub-Signature(sha1/sha256/sha384/sha512=hex)를 구독 secret으로 확인합니다."""
+    if not header or '=' not in header:
+        return False
+    method, signature = header.split('=', 1)
+    if method not in ('sha1', 'sha256', 'sha384', 'sha512'):
+        return False
+    expected = hmac.new(secret.encode('utf-8'), body, method).hexdigest()
+    return hmac.compare_digest(expected, signature.strip().lower())
+
+async def process_pushed_feed(rss_feed_url, body):
+    """허브가 보낸 피드 내용을 파싱해 폴링과 같은 발견 → 요약 → 전달 경로로 처리합니다."""
+    channel_states = target_channel_states(delivery_channel_ids())
+    if not channel_states:
+        logger.warning("'%s': push를 처리할 유효한 채널이 없습니다.", rss_feed_url)
+        return
+    loop = asyncio.get_running_loop()
+    parse_start_time = time.monotonic()
+    feed = await loop.run_in_executor(
+        get_parse_executor(),
+        functools.partial(feedparser.parse, body, response_headers={'content-location': rss_feed_url})
+    )
+    record_stage_latency('parse', time.monotonic() - parse_start_time)
+    if feed.bozo and not isinstance(feed.bozo_exception, (feedparser.CharacterEncodingOverride, feedparser.NonXMLContentType)):
+        logger.warning("'%s' push 내용 파싱 실패: %s", rss_feed_url, feed.bozo_exception, extra={'feed': rss_feed_url})
+        return
+    FEED_FETCHES.inc(status='push')
+    logger.info("'%s' WebSub push 수신 (%s개 항목)", rss_feed_url, len(feed.entries), extra={'feed': rss_feed_url})
+    await process_feed_document(rss_feed_url, feed, None, channel_states, site_color_map, None)
+
+async def run_websub_push(rss_feed_url, body, previous):
+    global websub_push_slots
+    if previous is not None:
+        await asyncio.wait([previous])
+    if websub_push_slots is None:
+        websub_push_slots = asyncio.Semaphore(POLL_CONCURRENCY)
+    async with websub_push_slots:
+        try:
+            await process_pushed_feed(rss_feed_url, body)
+        except Exception as e:
+            logger.error("'%s' push 처리 중 예외 발생: %s - %s", rss_feed_url, type(e).__name__, e)
+
+def dispatch_websub_push(rss_feed_url, body):
+    """push 내용을 이 프로세스에서 처리하도록 예약합니다.
+
+    같은 피드의 push는 받은 순서대로 하나씩, 전체는 POLL_CONCURRENCY개까지 동시에 처리합니다.
+    """
+    task = asyncio.ensure_future(run_websub_push(rss_feed_url, body, websub_push_last.get(rss_feed_url)))
+    websub_push_tasks.add(task)
+    websub_push_last[rss_feed_url] = task
+
+    def forget(task):
+        websub_push_tasks.discard(task)
+        if websub_push_last.get(rss_feed_url) is task:
+            del websub_push_last[rss_feed_url]
+
+    task.add_done_callback(forget)
+
+async def start_websub_server(host, port):
+    """WEBSUB_CALLBACK_URL 경로 아래 /{콜백 ID}로 허브의 확인 요청(GET)과 push(POST)를 받는 HTTP 서버를 띄웁니다."""
+    store = get_websub_subscriptions()
+
+    async def handle_verify(request):
+        try:
+            return await verify(request)
+        except sqlite3.Error as e:
+            # 허브는 확인에 실패하면 나중에 다시 보냄
+            logger.warning("WebSub 확인 요청 처리 중 저장소 오류 발생: %s", e)
+            return web.Response(status=503)
+
+    async def verify(request):
+        subscription = await run_websub_store(store.by_callback, request.match_info['callback_id'])
+        query = request.query
+        mode = query.get('hub.mode')
+        if subscription is None or query.get('hub.topic') != subscription['topic_url']:
+            return web.Response(status=404)
+        rss_feed_url = subscription['feed_url']
+        if mode == 'denied':
+            subscription.update(state='denied', requested_at=time.time())
+            await run_websub_store(store.save, subscription)
+            logger.warning("WebSub 허브가 '%s' 구독을 거부했습니다: %s. 폴링을 계속합니다.", rss_feed_url, query.get('hub.reason', ''),
+                           extra={'feed': rss_feed_url})
+            return web.Response(text='')
+        # 요청한 적 있는 동작만 확인해 줌 (남이 대신 구독/해지하지 못하도록)
+        expected_states = {'subscribe': ('requested', 'active'), 'unsubscribe': ('unsubscribing',)}
+        challenge = query.get('hub.challenge')
+        if not challenge or subscription['state'] not in expected_states.get(mode, ()):
+            return web.Response(status=404)
+        if mode == 'subscribe':
+            try:
+                lease_seconds = int(query.get('hub.lease_seconds', WEBSUB_LEASE_SECONDS))
+            except ValueError:
+                lease_seconds = WEBSUB_LEASE_SECONDS
+            subscription.update(state='active', lease_expires_at=time.time() + lease_seconds)
+            await run_websub_store(store.save, subscription)
+            logger.info("WebSub 구독 확인: '%s' (임대 %.1f일)", rss_feed_url, lease_seconds / 86400, extra={'feed': rss_feed_url})
+        else:
+            await run_websub_store(store.delete, rss_feed_url)
+            logger.info("WebSub 구독 해지 확인: '%s'", rss_feed_url, extra={'feed': rss_feed_url})
+        return web.Response(text=challenge)
+
+    async def handle_push(request):
+        try:
+            return await push(request)
+        except sqlite3.Error as e:
+            logger.warning("WebSub push 처리 중 저장소 오류 발생: %s", e)
+            return web.Response(status=503)
+
+    async def push(request):
+        subscription = await run_websub_store(store.by_callback, request.match_info['callback_id'])
+        if subscription is None:
+            WEBSUB_NOTIFICATIONS.inc(result='unknown')
+            # 410이면 허브가 이 콜백으로 더 보내지 않음
+            return web.Response(status=410)
+        body = await request.read()
+        rss_feed_url = subscription['feed_url']
+        # 서명이 틀려도 2xx로 답하고 내용만 무시함 (WebSub 규격)
+        if not websub_signature_valid(subscription['secret'], body, request.headers.get('X-Hub-Signature')):
+            WEBSUB_NOTIFICATIONS.inc(result='bad_signature')
+            logger.warning("'%s' push의 서명이 맞지 않아 무시합니다.", rss_feed_url, extra={'feed': rss_feed_url})
+            return web.Response(status=202)
+        if subscription['state'] != 'active' or rss_feed_url not in RSS_FEED_URLS:
+            WEBSUB_NOTIFICATIONS.inc(result='inactive')
+            return web.Response(status=202)
+        if shard_coordinator is not None and not shard_coordinator.owns('feed', rss_feed_url):
+            # 콜백 서버는 워커 하나만 열 수 있으므로, 다른 워커가 맡은 피드는 그 워커가 꺼내 가도록 공유 파일에 넘김
+            await run_websub_store(store.queue_push, rss_feed_url, body)
+            WEBSUB_NOTIFICATIONS.inc(result='handed_off')
+            return web.Response(status=202)
+        if len(websub_push_tasks) >= WEBSUB_PUSH_BACKLOG:
+            # 밀린 push가 너무 많으면 받지 않음 (허브가 나중에 다시 보내고, 안전망 폴링도 있음)
+            WEBSUB_NOTIFICATIONS.inc(result='busy')
+            return web.Response(status=503, headers={'Retry-After': '60'})
+        WEBSUB_NOTIFICATIONS.inc(result='accepted')
+        dispatch_websub_push(rss_feed_url, body)
+        return web.Response(status=202)
+
+    base_path = urlparse(WEBSUB_CALLBACK_URL).path.rstrip('/')
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app.router.add_get(f"{base_path}/{{callback_id}}", handle_verify)
+    app.router.add_post(f"{base_path}/{{callback_id}}", handle_push)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("WebSub 콜백 서버 시작: %s:%s (콜백 주소 %s)", host, port, WEBSUB_CALLBACK_URL)
+    return runner
 
+async def websub_renew_loop(interval=300):
+    """임대가 곧 끝나는 구독은 갱신하고, 설정에서 빠진 피드의 구독은 해지합니다."""
     while True:
-        print("-" * 20)
-        start_time = time.monotonic()
-        print(f"{datetime.datetime.now()} - RSS 피드 확인 주기 시작...")
+        await asyncio.sleep(interval)
+        try:
+            for subscription in await run_websub_store(get_websub_subscriptions().all):
+                rss_feed_url = subscription['feed_url']
+                if shard_coordinator is not None and not shard_coordinator.owns('feed', rss_feed_url):
+                    continue
+                if rss_feed_url not in RSS_FEED_URLS:
+                    if subscription['state'] != 'unsubscribing':
+                        await request_websub(rss_feed_url, 'unsubscribe', subscription['hub_url'], subscription['topic_url'])
+                    continue
+                remaining = subscription_lease_remaining(subscription)
+                if remaining is not None and remaining <= websub_renew_margin():
+                    await request_websub(rss_feed_url, 'subscribe', subscription['hub_url'], subscription['topic_url'])
+        except Exception as e:
+            logger.error("WebSub 구독 갱신 중 오류 발생: %s", e)
+
+async def websub_handoff_loop(coordinator):
+    """샤딩 모드: 콜백 서버를 연 워커가 넘겨 둔 push 중 이 워커가 맡은 피드의 것을 꺼내 처리합니다."""
+    store = get_websub_subscriptions()
+    while True:
+        await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+        try:
+            for rss_feed_url in await run_websub_store(store.pushed_feeds):
+                configured = rss_feed_url in RSS_FEED_URLS
+                if configured and not coordinator.owns('feed', rss_feed_url):
+                    continue
+                if configured and len(websub_push_tasks) >= WEBSUB_PUSH_BACKLOG:
+                    # 남은 push는 밀린 작업이 줄어든 뒤에 꺼냄
+                    break
+                bodies = await run_websub_store(store.take_pushes, rss_feed_url)
+                if not configured:
+                    # 설정에서 빠진 피드의 push는 버림
+                    continue
+                for body in bodies:
+                    dispatch_websub_push(rss_feed_url, body)
+        except Exception as e:
+            logger.error("넘겨받은 WebSub push 처리 중 오류 발생: %s", e)
+
+SYNDICATION_PERIODS = {
+    'hourly': 3600,
+    'daily': 86400,
+    'weekly': 604800,
+    'monthly': 2592000,
+    'yearly': 31536000,
+}
+
+def feed_hint_interval(feed):
+    """<ttl>과 sy:updatePeriod/sy:updateFrequency 힌트로 최소 폴링 간격(초)을 구합니다."""
+    hints = []
+    try:
+        ttl = feed.feed.get('ttl')
+        if ttl:
+            hints.append(int(ttl) * 60)
+    except (TypeError, ValueError):
+        pass
+    period = str(feed.feed.get('sy_updateperiod', '')).strip().lower()
+    if period in SYNDICATION_PERIODS:
+        try:
+            frequency = max(int(feed.feed.get('sy_updatefrequency') or 1), 1)
+        except (TypeError, ValueError):
+            frequency = 1
+        hints.append(SYNDICATION_PERIODS[period] / frequency)
+    return max(hints) if hints else None
+
+PUBLISH_INTERVAL_SAMPLES = 20
+
+def observed_publish_interval(feed):
+    """최근 항목들의 발행 시각으로 평균 발행 간격(초)을 추정합니다. 지금 시각까지 포함해 조용해진 피드는 간격이 늘어납니다."""
+    timestamps = list(feed.get('streamed_published', ()))
+    for entry in feed.entries:
+        published = entry.get('published_parsed') or entry.get('updated_parsed')
+        if published:
+            timestamps.append(calendar.timegm(published))
+    if not timestamps:
+        return None
+    timestamps = sorted(timestamps, reverse=True)[:PUBLISH_INTERVAL_SAMPLES]
+    now = time.time()
+    span = now - timestamps[-1]
+    if span <= 0:
+        return None
+    return span / len(timestamps)
+
+def next_poll_interval(previous_state, fetch_status, feed):
+    """가져오기 결과로 다음 폴링 간격과 연속 오류 수를 계산합니다."""
+    previous_interval = previous_state.get('poll_interval', DEFAULT_POLL_INTERVAL)
+    errors = previous_state.get('poll_errors', 0)
+
+    if fetch_status == 'error':
+        errors += 1
+        interval = DEFAULT_POLL_INTERVAL * (2 ** min(errors, 10))
+    elif fetch_status == 'skipped':
+        # 요청을 보내지 않았으므로 간격과 오류 수를 그대로 둠
+        interval = previous_interval
+    elif fetch_status in ('not_modified', 'unchanged'):
+        errors = 0
+        interval = previous_interval * 1.2
+    elif feed is not None:
+        errors = 0
+        publish_interval = observed_publish_interval(feed)
+        interval = publish_interval / 2 if publish_interval else DEFAULT_POLL_INTERVAL
+        hint = feed_hint_interval(feed)
+        if hint:
+            interval = max(interval, hint)
+    else:
+        interval = DEFAULT_POLL_INTERVAL
+
+    interval = min(max(interval, MIN_POLL_INTERVAL), MAX_POLL_INTERVAL)
+    return interval, errors
+
+
+class FeedScheduler:
+    """피드마다 다음 폴링 시각을 따로 두고 우선순위 큐 순서대로 실행합니다. 느린 피드가 다른 피드를 막지 않습니다."""
+
+    def __init__(self, handler, concurrency, coordinator=None):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.coordinator = coordinator
+        self._heap = []
+        self._generations = {}
+        self._running = set()
+        self._counter = itertools.count()
+        self._wakeup = None
+        self._semaphore = None
+
+    def __len__(self):
+        return len(self._generations)
+
+    def _push(self, feed_url, delay):
+        generation = next(self._counter)
+        self._generations[feed_url] = generation
+        heapq.heappush(self._heap, (time.monotonic() + delay, generation, feed_url))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def sync(self, feed_urls):
+        """설정의 피드 목록과 맞춥니다. 새 피드는 저장된 다음 폴링 시각(없으면 즉시)에, 빠진 피드는 큐에서 제외합니다."""
+        wanted = [url for url in feed_urls if url]
+        for feed_url in list(self._generations):
+            if feed_url not in wanted:
+                del self._generations[feed_url]
+                logger.info("스케줄러: '%s' 피드 제거", feed_url)
+        for feed_url in wanted:
+            if feed_url in self._generations:
+                continue
+            state = get_feed_state_store().get(feed_url)
+            delay = 0
+            if state.get('next_poll_at'):
+                delay = min(max(state['next_poll_at'] - time.time(), 0), state.get('poll_interval', DEFAULT_POLL_INTERVAL))
+            self._push(feed_url, delay)
+            logger.info("스케줄러: '%s' 피드 추가 (%.0f초 후 첫 확인)", feed_url, delay)
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            due, generation, feed_url = self._heap[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            if self._generations.get(feed_url) != generation or feed_url in self._running:
+                continue
+            shard_delay = await self._shard_delay(feed_url)
+            if shard_delay is None and self._generations.get(feed_url) != generation:
+                # 임대를 확인하는 사이 피드가 빠지거나 다시 예약됨
+                await self._release(feed_url)
+                continue
+            if shard_delay is not None:
+                self._push(feed_url, shard_delay)
+                continue
+            await self._semaphore.acquire()
+            self._running.add(feed_url)
+            asyncio.ensure_future(self._poll(feed_url))
+
+    async def _shard_delay(self, feed_url):
+        """샤딩 중이면 이 워커가 지금 피드를 맡을 수 있는지 확인합니다. 맡을 수 있으면 None, 아니면 다시 확인할 때까지의 초.
+
+        임대와 피드 상태는 다른 프로세스와 같이 쓰는 SQLite에 있으므로, 잠금을 기다리는 동안 이벤트 루프를 막지 않게 기본 executor에서 읽고 씁니다.
+        """
+        if self.coordinator is None:
+            return None
+        loop = asyncio.get_running_loop()
+        try:
+            claimed = await loop.run_in_executor(None, self.coordinator.claim, 'feed', feed_url)
+        except sqlite3.Error as e:
+            logger.warning("샤딩: '%s' 임대 확인 중 오류 발생: %s", feed_url, e)
+            return self.coordinator.lease_ttl / 3
+        if not claimed:
+            # 다른 워커 몫이거나 다른 워커가 처리 중: 워커 구성이 바뀌면 넘겨받을 수 있도록 임대 기간 뒤에 다시 확인
+            return self.coordinator.lease_ttl
+        # 이전 담당 워커가 남긴 검증값과 다음 폴링 시각을 이어받음
+        try:
+            state = await loop.run_in_executor(None, get_feed_state_store().reload, feed_url)
+        except sqlite3.Error as e:
+            logger.warning("샤딩: '%s' 피드 상태를 다시 읽지 못했습니다: %s", feed_url, e)
+            await self._release(feed_url)
+            return self.coordinator.lease_ttl / 3
+        wait = state.get('next_poll_at', 0) - time.time()
+        if wait > 1:
+            await self._release(feed_url)
+            return min(wait, state.get('poll_interval', DEFAULT_POLL_INTERVAL))
+        return None
+
+    async def _release(self, feed_url):
+        if self.coordinator is None:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.coordinator.release, 'feed', feed_url)
+        except sqlite3.Error as e:
+            # 놓지 못한 임대는 만료되면 다른 워커가 넘겨받음
+            logger.warning("샤딩: '%s' 임대를 놓지 못했습니다: %s", feed_url, e)
+
+    async def _poll(self, feed_url):
+        fetch_status, feed = 'error', None
+        try:
+            fetch_status, feed = await self.handler(feed_url)
+        except Exception as e:
+            logger.error("'%s' 피드 처리 중 예외 발생: %s - %s", feed_url, type(e).__name__, e)
+        finally:
+            self._semaphore.release()
+            self._running.discard(feed_url)
 
-        current_channel_ids_to_process = list(DISCORD_CHANNEL_IDS)
-        current_rss_feeds_to_process = list(RSS_FEED_URLS)
-        current_site_colors = dict(site_color_map)
+        store = get_feed_state_store()
+        interval, errors = next_poll_interval(store.get(feed_url), fetch_status, feed)
+        lease_remaining = await websub_lease_remaining(feed_url)
+        if lease_remaining is not None:
+            # push를 받는 피드는 안전망으로만 가끔 폴링하고, 임대가 끝나면 바로 평소 폴링으로 돌아감
+            interval = max(interval, min(WEBSUB_POLL_INTERVAL, lease_remaining))
+        await store.update(feed_url, poll_interval=interval, poll_errors=errors, next_poll_at=time.time() + interval)
+        await self._release(feed_url)
+        if feed_url in self._generations:
+            self._push(feed_url, interval)
+            logger.debug("'%s' 다음 확인까지 %.1f분 (%s, 연속 오류 %s회)", feed_url, interval / 60, fetch_status, errors)
 
-        if not current_channel_ids_to_process:
-            print("   처리할 채널이 없습니다. 대기합니다.")
+def resolve_channels(channel_ids):
+    """채널 ID 목록을 전송 가능한 텍스트 채널 객체(웹훅 모드에서는 WebhookChannel)로 바꿉니다."""
+    if DELIVERY_MODE == 'webhook':
+        missing = [channel_id for channel_id in channel_ids if channel_id not in webhook_channels]
+        if missing:
+            logger.warning("채널 ID %s에 등록된 웹훅이 없습니다. (DISCORD_WEBHOOK_URLS 확인)", missing)
+        return [webhook_channels[channel_id] for channel_id in channel_ids if channel_id in webhook_channels]
+    active_channels = []
+    for channel_id in channel_ids:
+        channel = client.get_channel(channel_id)
+        if channel and isinstance(channel, discord.TextChannel):
+            active_channels.append(channel)
+        elif channel:
+               logger.warning("채널 ID %s는 텍스트 채널이 아닙니다: %s", channel_id, type(channel))
         else:
-            active_tasks = []
-            for channel_id in current_channel_ids_to_process:
-                channel = client.get_channel(channel_id)
-                if channel and isinstance(channel, discord.TextChannel):
-                    print(f"   -> 채널 '{channel.name}' (ID: {channel.id}) 작업 생성 중...")
-                    task = asyncio.create_task(fetch_feed(channel, current_site_colors, current_rss_feeds_to_process), name=f"fetch_feed_{channel_id}")
-                    active_tasks.append(task)
-                elif channel:
-                       print(f"경고: 채널 ID {channel_id}는 텍스트 채널이 아닙니다: {type(channel)}")
-                else:
-                       print(f"경고: 채널 ID {channel_id}를 찾을 수 없거나 접근할 수 없습니다. (봇이 해당 서버에 있고 권한이 있는지 확인)")
+               logger.warning("채널 ID %s를 찾을 수 없거나 접근할 수 없습니다. (봇이 해당 서버에 있고 권한이 있는지 확인)", channel_id)
+    return active_channels
 
-            if active_tasks:
-                results = await asyncio.gather(*active_tasks, return_exceptions=True)
-                for i, result in enumerate(results):
-                       if isinstance(result, Exception):
-                           task_name = active_tasks[i].get_name()
-                           print(f"오류: 작업 '{task_name}' 실행 중 예외 발생: {type(result).__name__} - {result}")
+async def replay_pipeline_journal(keep_workers=()):
+    """재시작 전(또는 멈춘 워커)의 끝나지 않은 기사를 기록에서 되살려 파이프라인에 다시 넣습니다. 되살린 기사 수를 반환합니다.
 
-                print(f"   -> 모든 채널 작업 완료 ({len(active_tasks)}개)")
-            else:
-                print("   -> 처리할 유효한 채널이 없습니다.")
+    요약까지 끝난 기사는 바로 전달하고, 이미 전달된 채널은 전송 기록으로 걸러냅니다.
+    keep_workers에 있는 워커(아직 살아 있는 워커)의 기록은 건드리지 않습니다.
+    """
+    journal = get_pipeline_journal()
+    resumed = []
+    for stage, record, channel_ids in await asyncio.get_running_loop().run_in_executor(None, journal.adopt, keep_workers):
+        pending_states = []
+        for state in target_channel_states([int(channel_id) for channel_id in channel_ids]):
+            get_sent_store().refresh(state['id_str'])
+            if not is_article_sent(state, record['id'], record['normalized_url']):
+                pending_states.append(state)
+        if not pending_states:
+            await journal_write(journal.forget, record['id'])
+            continue
+        article = dict(record)
+        if stage != 'summarized':
+            article['summary'] = None
+        article['pending_states'] = pending_states
+        article['site_colors'] = site_color_map
+        now = time.monotonic()
+        recent_processed[article['id']] = now
+        recent_processed[article['normalized_url']] = now
+        logger.info("기록에서 복구: '%s' (%s) -> %s개 채널", article['title'], stage, len(pending_states))
+        resumed.append((article, await article_pipeline.resume(article)))
+
+    async def settle():
+        for article, delivered in resumed:
+            if not await delivered:
+                recent_processed.pop(article['id'], None)
+                recent_processed.pop(article['normalized_url'], None)
+                title_index.discard(article['id'])
+                body_index.discard(article['id'])
+        await flush_near_duplicate_indexes()
 
-        print(f"{datetime.datetime.now()} - .env 파일에서 설정 다시 로드 시도...")
+    if resumed:
+        title_index, body_index = get_near_duplicate_indexes()
+        asyncio.ensure_future(settle())
+    return len(resumed)
+
+async def poll_scheduled_feed(rss_feed_url):
+    """스케줄러가 호출하는 피드 처리 함수. 현재 설정의 채널과 색상으로 process_feed를 실행합니다."""
+    channel_states = target_channel_states(delivery_channel_ids())
+    if not channel_states:
+        logger.warning("'%s': 처리할 유효한 채널이 없습니다.", rss_feed_url)
+        return 'skipped', None
+    return await process_feed(rss_feed_url, channel_states, site_color_map)
+
+async def shard_heartbeat_loop(coordinator):
+    """SHARD_LEASE_TTL/3마다 하트비트를 남깁니다. 워커가 빠지면 그 워커가 남긴 기사를 넘겨받습니다."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(coordinator.lease_ttl / 3)
         try:
-            dotenv_path = load_dotenv(override=True, verbose=False)
-            if dotenv_path:
-                new_channel_ids_str = os.getenv('DISCORD_CHANNEL_IDS', '')
-                new_channel_ids = []
-                if new_channel_ids_str:
-                    try:
-                        new_channel_ids = list(map(int, new_channel_ids_str.split(',')))
-                    except ValueError:
-                        print("   오류: .env의 DISCORD_CHANNEL_IDS 형식이 잘못되었습니다 (숫자 목록이어야 함). 채널 ID 업데이트 실패.")
-                        new_channel_ids = list(DISCORD_CHANNEL_IDS)
-
-                if new_channel_ids != DISCORD_CHANNEL_IDS:
-                    print(f"   성공: DISCORD_CHANNEL_IDS 업데이트됨: {new_channel_ids}")
-                    DISCORD_CHANNEL_IDS = new_channel_ids
-                else:
-                    print("   정보: DISCORD_CHANNEL_IDS 변경 없음.")
+            if not await loop.run_in_executor(None, coordinator.heartbeat):
+                continue
+            logger.info("샤딩: 워커 구성 변경 (수집 %s개, 전달 %s개)",
+                        len(coordinator.rings['feed'].nodes), len(coordinator.rings['channel'].nodes))
+            if feed_scheduler is not None:
+                resumed_count = await replay_pipeline_journal(coordinator.live_workers())
+                if resumed_count:
+                    logger.info("샤딩: 멈춘 워커가 남긴 기사 %s개를 이어서 처리합니다.", resumed_count)
+        except Exception as e:
+            logger.error("샤딩 하트비트 중 오류 발생: %s", e)
 
-                new_rss_urls_str = os.getenv('RSS_FEED_URLS', '')
-                new_rss_urls = [url.strip() for url in new_rss_urls_str.split(',') if url.strip()]
-                if new_rss_urls != RSS_FEED_URLS:
-                    print(f"   성공: RSS_FEED_URLS 업데이트됨 (총 {len(new_rss_urls)}개)")
-                    RSS_FEED_URLS = new_rss_urls
-                else:
-                    print("   정보: RSS_FEED_URLS 변경 없음.")
-
-                new_site_colors_str = os.getenv('SITE_COLORS', '')
-                new_site_color_map = {}
-                if new_site_colors_str:
-                    pairs = new_site_colors_str.split(',')
-                    for pair in pairs:
-                        if ':' in pair:
-                            try:
-                                url, hex_color = pair.strip().rsplit(':', 1)
-                                if re.match(r'^#[0-9a-fA-F]{6}$', hex_color):
-                                    new_site_color_map[url.strip()] = hex_color.strip()
-                                else:
-                                    print(f"   경고: .env의 SITE_COLORS 업데이트 중 잘못된 HEX 코드 형식 발견 - '{pair.strip()}' 건너뜁니다.")
-                            except ValueError:
-                                print(f"   경고: .env의 SITE_COLORS 업데이트 중 형식 오류 - '{pair.strip()}' 건너뜁니다.")
-                        else:
-                            print(f"   경고: .env의 SITE_COLORS 업데이트 중 형식 오류 (콜론 없음) - '{pair.strip()}' 건너뜁니다.")
-
-                if new_site_color_map != site_color_map:
-                       print(f"   성공: SITE_COLORS 업데이트됨 (총 {len(new_site_color_map)}개)")
-                       site_color_map = new_site_color_map
-                else:
-                       print("   정보: SITE_COLORS 변경 없음.")
+async def outbox_delivery_loop(coordinator):
+    """전달 워커: outbox에서 자기 몫인 채널의 기사를 채널 전송 대기열에 넣고, 전송이 끝난 행을 지웁니다.
 
-            else:
-                 print("   정보: .env 파일을 찾을 수 없거나 로드되지 않았습니다. 기존 설정 유지.")
+    전송에 실패한 행은 남겨 두었다가 다음 확인 때 다시 넣습니다.
+    SQLite 작업(임대, outbox 읽기/지우기)은 다른 프로세스의 잠금을 기다릴 수 있으므로 모두 기본 executor에서 합니다.
+    """
+    loop = asyncio.get_running_loop()
+    outbox = get_delivery_outbox()
+    in_flight = {}  # outbox 순번 -> 채널 ID
+    held_channels = set()
+
+    async def remove(seq):
+        try:
+            await loop.run_in_executor(None, outbox.remove, seq)
+        except sqlite3.Error as e:
+            # 남은 행은 다음 확인 때 전송 기록으로 걸러짐
+            logger.error("outbox 행(%s) 삭제 중 오류 발생: %s", seq, e)
+        in_flight.pop(seq, None)
 
+    def settle(seq, result):
+        if not result.cancelled() and result.exception() is None and result.result():
+            # 행을 지울 때까지는 보내는 중으로 두어 다시 넣지 않음
+            asyncio.ensure_future(remove(seq))
+        else:
+            in_flight.pop(seq, None)
+
+    while True:
+        await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+        try:
+            claimed = set()
+            for channel_id_str in await loop.run_in_executor(None, outbox.channels):
+                if not await loop.run_in_executor(None, coordinator.claim, 'channel', channel_id_str):
+                    continue
+                claimed.add(channel_id_str)
+                channel_states = load_channel_states(resolve_channels([int(channel_id_str)]))
+                rows = await loop.run_in_executor(None, outbox.pending, channel_id_str, CHANNEL_QUEUE_SIZE + len(in_flight))
+                for seq, record in rows:
+                    if seq in in_flight:
+                        continue
+                    if not channel_states:
+                        # 이 봇이 볼 수 없는 채널은 재시도해도 보낼 수 없으므로 버림
+                        await remove(seq)
+                        continue
+                    state = channel_states[0]
+                    if is_article_sent(state, record['id'], record['normalized_url']):
+                        await remove(seq)
+                        continue
+                    article = dict(record)
+                    article['embed'] = build_embed(article, site_color_map)
+                    in_flight[seq] = channel_id_str
+                    future = await deliver_article(state, article)
+                    future.add_done_callback(functools.partial(settle, seq))
+            # 더 이상 맡지 않는 채널은 보내는 중인 기사가 없을 때 임대를 놓음
+            busy_channels = set(in_flight.values())
+            for channel_id_str in held_channels - claimed - busy_channels:
+                await loop.run_in_executor(None, coordinator.release, 'channel', channel_id_str)
+            held_channels = claimed | (held_channels & busy_channels)
         except Exception as e:
-            print(f"   오류: .env 파일 다시 로드 또는 처리 중 오류 발생: {e}. 기존 설정 유지.")
+            logger.error("outbox 전달 중 오류 발생: %s", e)
+
+def reload_config(dotenv_path):
+    """.env 파일을 다시 읽어 채널, 피드, 사이트 색상 설정 스냅샷을 바꿉니다. 바뀐 것이 있으면 True."""
+    logger.info(".env 파일이 바뀌어 설정을 다시 읽습니다.")
+    try:
+        values = dict(os.environ)
+        values.update((key, value) for key, value in dotenv_values(dotenv_path).items() if value is not None)
+        return apply_config_snapshot(build_config_snapshot(values, previous=config_snapshot))
+    except Exception as e:
+        logger.error(".env 파일 다시 로드 또는 처리 중 오류 발생: %s. 기존 설정 유지.", e)
+        return False
 
-        end_time = time.monotonic()
-        print(f"{datetime.datetime.now()} - RSS 피드 확인 주기 완료 (총 소요 시간: {end_time - start_time:.2f}초)")
 
-        wait_time = 600
-        print(f"다음 확인까지 {wait_time // 60}분 대기...")
-        await asyncio.sleep(wait_time)
+class ConfigWatcher:
+    """설정 파일의 수정 시각과 크기를 지켜봅니다. 바뀌었을 때만 설정을 다시 읽도록 알려 줍니다."""
+
+    def __init__(self, path):
+        self.path = path
+        self._signature = self._stat()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def changed(self):
+        signature = self._stat()
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        return signature is not None
+
+
+async def config_watch_loop(scheduler):
+    """CONFIG_WATCH_INTERVAL마다 .env 파일이 바뀌었는지 확인하고, 바뀌었으면 피드 목록 변경을 바로 스케줄러에 반영합니다."""
+    watcher = ConfigWatcher(find_dotenv())
+    if not watcher.path:
+        logger.info(".env 파일을 찾을 수 없어 설정 변경 감시를 하지 않습니다.")
+        return
+    while True:
+        await asyncio.sleep(CONFIG_WATCH_INTERVAL)
+        if watcher.changed() and reload_config(watcher.path) and scheduler is not None:
+            scheduler.sync(RSS_FEED_URLS)
+
+feed_scheduler = None
+workers_started = False
+
+@client.event
+async def on_ready():
+    global workers_started
+
+    logger.info("봇 로그인: %s (ID: %s)", client.user.name, client.user.id)
+
+    if workers_started:
+        logger.info("재연결됨. 기존 스케줄러를 계속 사용합니다.")
+        return
+    workers_started = True
+
+    if not load_initial_config():
+        logger.error("초기 설정 로드 실패. 봇을 종료합니다.")
+        await client.close()
+        return
+
+    await run_workers()
+
+async def run_workers():
+    """역할(SHARD_ROLE)에 맞게 지표 서버, 샤딩 하트비트, outbox 전달, WebSub 콜백, 기록 복구를 시작하고 피드 스케줄러를 실행합니다."""
+    global feed_scheduler, WEBSUB_CALLBACK_URL
+
+    logger.info("등록된 채널 ID: %s", DISCORD_CHANNEL_IDS)
+    logger.info("등록된 RSS 피드 수: %s", len(RSS_FEED_URLS))
+    logger.info("로드된 사이트별 색상 수: %s", len(site_color_map))
+    if METRICS_PORT > 0:
+        try:
+            await start_metrics_server(METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            logger.warning("지표 서버를 시작하지 못했습니다 (%s:%s): %s", METRICS_HOST, METRICS_PORT, e)
+
+    coordinator = get_shard_coordinator()
+    keep_workers = ()
+    if coordinator is not None:
+        await asyncio.get_running_loop().run_in_executor(None, coordinator.heartbeat)
+        logger.info("샤딩 모드: 워커 '%s' (역할: %s, 살아 있는 워커 %s개)",
+                    coordinator.worker_id, coordinator.role, len(coordinator.live_workers()))
+        asyncio.ensure_future(shard_heartbeat_loop(coordinator))
+        if coordinator.role in ShardCoordinator.deliver_roles:
+            asyncio.ensure_future(outbox_delivery_loop(coordinator))
+        if coordinator.role not in ShardCoordinator.ingest_roles:
+            # 전달 전용 워커는 피드를 폴링하지 않고 설정(채널, 사이트 색상)만 다시 읽음
+            await config_watch_loop(None)
+            return
+        keep_workers = coordinator.live_workers() - {coordinator.worker_id}
+        if WEBSUB_CALLBACK_URL:
+            # 콜백 서버를 열지 못한 워커도 자기 몫의 push는 넘겨받아 처리
+            asyncio.ensure_future(websub_handoff_loop(coordinator))
+
+    if WEBSUB_CALLBACK_URL:
+        try:
+            await start_websub_server(WEBSUB_HOST, WEBSUB_PORT)
+            asyncio.ensure_future(websub_renew_loop())
+        except OSError as e:
+            logger.warning("WebSub 콜백 서버를 시작하지 못했습니다 (%s:%s): %s. 폴링만 사용합니다.", WEBSUB_HOST, WEBSUB_PORT, e)
+            WEBSUB_CALLBACK_URL = ''
+    feed_scheduler = FeedScheduler(poll_scheduled_feed, POLL_CONCURRENCY, coordinator)
+    # 지난 실행에서 끝나지 않은 기사는 기다리지 않고 바로 이어서 처리
+    resumed_count = await replay_pipeline_journal(keep_workers)
+    if resumed_count:
+        logger.info("지난 실행에서 끝나지 않은 기사 %s개를 이어서 처리합니다.", resumed_count)
+    logger.info("봇이 준비되었습니다. 10초 후 피드별 스케줄 확인을 시작합니다.")
+    await asyncio.sleep(10)
+
+    feed_scheduler.sync(RSS_FEED_URLS)
+    asyncio.ensure_future(config_watch_loop(feed_scheduler))
+    await feed_scheduler.run()
+
+async def run_without_gateway():
+    """Discord 게이트웨이 없이 실행합니다. 웹훅으로 보내는 경우 먼저 웹훅이 가리키는 채널을 확인합니다."""
+    try:
+        if DELIVERY_MODE == 'webhook' and SHARD_ROLE != 'ingest':
+            if not await load_webhook_channels(DISCORD_WEBHOOK_URLS):
+                logger.error("사용할 수 있는 웹훅이 없습니다. 봇을 종료합니다.")
+                return
+        await run_workers()
+    finally:
+        await close_http_sessions()
 
 if __name__ == "__main__":
-    print("봇 시작 중...")
+    setup_logging()
+    logger.info("봇 시작 중...")
     if not load_initial_config():
-        print("필수 환경 변수 로드 실패. .env 파일을 확인하세요.")
+        logger.error("필수 환경 변수 로드 실패. .env 파일을 확인하세요.")
+        exit()
+    # 전송 기록 저장소와 유사 기사 인덱스를 열고 예전 YAML 기록을 옮기는 일은 이벤트 루프를 막지 않도록 시작 전에 끝냄
+    get_sent_store()
+    get_near_duplicate_indexes()
+    if SHARD_ROLE == 'ingest' or DELIVERY_MODE == 'webhook':
+        # 수집 전용 워커와 웹훅 모드는 게이트웨이에 연결하지 않음
+        try:
+            asyncio.run(run_without_gateway())
+        except KeyboardInterrupt:
+            logger.info("봇 종료.")
+        finally:
+            if shard_coordinator is not None:
+                shard_coordinator.close()
         exit()
     if not DISCORD_BOT_TOKEN:
-        print("오류: DISCORD_BOT_TOKEN이 설정되지 않았습니다.")
+        logger.error("DISCORD_BOT_TOKEN이 설정되지 않았습니다.")
         exit()
 
     try:
         client.run(DISCORD_BOT_TOKEN)
     except discord.LoginFailure:
-        print("오류: 잘못된 디스코드 봇 토큰입니다.")
-    except discord.PrivilegedIntentsRequired:
-        print("오류: Privileged Intents가 활성화되지 않았습니다.")
-        print("Discord 개발자 포털에서 봇의 Privileged Gateway Intents (특히 Message Content Intent)를 확인/활성화하세요.")
+        logger.error("잘못된 디스코드 봇 토큰입니다.")
     except Exception as e:
-        print(f"봇 실행 중 심각한 오류 발생: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("봇 실행 중 심각한 오류 발생: %s", e)
+    finally:
+        if shard_coordinator is not None:
+            shard_coordinator.close()